@@ -0,0 +1,241 @@
+"""Request admission control and load shedding.
+
+Two kinds of limits, applied by view decorators before any work is done:
+
+* ``rate_limited(rule)`` - token buckets. ``park`` (``/Park_car/`` and
+  ``/Park_car/auto``) has one bucket per client and one per parking lot,
+  so a burst on one popular lot is throttled without touching the others;
+  ``login`` has one per client. A request needs a token from every bucket:
+  without one it gets ``429`` and a ``Retry-After`` saying when the next
+  token is due, and the tokens it already took are given back.
+* ``concurrency_limited`` - at most ``ADMISSION_MAX_EXPENSIVE`` expensive
+  requests (session history, exports, analytics) run at once; the rest get
+  ``503`` immediately instead of queueing for database connections that the
+  cheap endpoints need. Streamed responses hold their slot until the stream
+  is closed.
+
+Buckets live in the process (``ADMISSION_BACKEND=memory``, the default: a
+bounded LRU of buckets, so with several workers each enforces its own share)
+or in Redis (``redis`` with ``ADMISSION_REDIS_URL``; one atomic script per
+check, shared by all workers). The concurrency limit is always per process.
+Clients are told apart by ``request.remote_addr``; behind a proxy, have it
+set from ``X-Forwarded-For`` (werkzeug's ``ProxyFix``).
+
+Everything is off unless ``ADMISSION_CONTROL`` is set. Decisions are counted
+on ``/metrics`` as ``admission_requests_total`` by rule, scope and result.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+EXTENSION = 'admission'
+
+_TOKEN_BUCKET_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or burst
+local stamp = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - stamp) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+_REFUND_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+  redis.call('HSET', KEYS[1], 'tokens', tostring(math.min(tonumber(ARGV[1]), tokens + 1)))
+end
+"""
+
+
+class Throttled(Exception):
+    """Raised when a rate limit is exceeded; answered with 429."""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many requests')
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """Raised when the expensive-request limit is reached; answered with 503."""
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+class TokenBuckets:
+    """In-process token buckets, at most ``maxsize`` of them (LRU)."""
+
+    backend = 'memory'
+
+    def __init__(self, maxsize=100000, clock=time.monotonic):
+        self._buckets = OrderedDict()  # key -> (tokens, stamp)
+        self._maxsize = maxsize
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take one token; return 0, or the seconds until one is available."""
+        now = self._clock()
+        with self._lock:
+            tokens, stamp = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def refund(self, key, burst):
+        """Give back a token taken by ``take``."""
+        with self._lock:
+            if key in self._buckets:
+                tokens, stamp = self._buckets[key]
+                self._buckets[key] = (min(burst, tokens + 1), stamp)
+
+
+class RedisTokenBuckets:
+    """The same buckets in Redis, updated atomically by a Lua script."""
+
+    backend = 'redis'
+
+    def __init__(self, client, prefix='admission:', clock=time.time):
+        self._script = client.register_script(_TOKEN_BUCKET_SCRIPT)
+        self._refund = client.register_script(_REFUND_SCRIPT)
+        self._prefix = prefix
+        self._clock = clock
+
+    def take(self, key, rate, burst):
+        return float(self._script(keys=[self._prefix + key], args=[rate, burst, self._clock()]))
+
+    def refund(self, key, burst):
+        self._refund(keys=[self._prefix + key], args=[burst])
+
+
+def create_buckets(config):
+    backend = config.get('ADMISSION_BACKEND', 'memory')
+    if backend == 'memory':
+        return TokenBuckets()
+    if backend == 'redis':
+        import redis  # optional dependency, only needed for this backend
+        return RedisTokenBuckets(redis.Redis.from_url(config['ADMISSION_REDIS_URL']))
+    raise ValueError(f'Unknown ADMISSION_BACKEND: {backend!r}')
+
+
+def _client_key():
+    return request.remote_addr or 'unknown'
+
+
+def _lot_key():
+    data = request.get_json(silent=True)
+    return data.get('parking_id') if isinstance(data, dict) else None
+
+
+# rule -> [(scope, key function, config prefix)], checked in order
+RULES = {
+    'park': [('client', _client_key, 'ADMISSION_PARK_CLIENT'),
+             ('lot', _lot_key, 'ADMISSION_PARK_LOT')],
+    'login': [('client', _client_key, 'ADMISSION_LOGIN_CLIENT')],
+}
+
+
+class Admission:
+
+    def __init__(self, config, metrics, buckets=None):
+        self._config = config
+        self.buckets = buckets or create_buckets(config)
+        self.max_expensive = config['ADMISSION_MAX_EXPENSIVE']
+        self._expensive = threading.BoundedSemaphore(self.max_expensive)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._requests = metrics.counter(
+            'admission_requests_total', 'Admission decisions by rule, scope and result.',
+            ['rule', 'scope', 'result'])
+        metrics.register(self.in_flight_metrics)
+
+    def in_flight_metrics(self):
+        return [('admission_expensive_in_flight', 'gauge',
+                 'Expensive requests running in this process.', [({}, self._in_flight)]),
+                ('admission_expensive_limit', 'gauge',
+                 'Expensive requests allowed at once in this process.',
+                 [({}, self.max_expensive)])]
+
+    def admit(self, rule):
+        """Take a token from every bucket of ``rule`` or raise ``Throttled``.
+
+        A throttled request gives back the tokens it took from the other
+        buckets, so a busy lot does not also use up its clients' budgets.
+        """
+        taken = []
+        for scope, key_of, prefix in RULES[rule]:
+            key = key_of()
+            if key is None:
+                continue
+            bucket, burst = f'{rule}:{scope}:{key}', self._config[f'{prefix}_BURST']
+            wait = self.buckets.take(bucket, self._config[f'{prefix}_RATE'], burst)
+            if wait:
+                for taken_bucket, taken_burst in taken:
+                    self.buckets.refund(taken_bucket, taken_burst)
+                self._requests.inc(rule=rule, scope=scope, result='throttled')
+                raise Throttled(wait)
+            taken.append((bucket, burst))
+        self._requests.inc(rule=rule, scope='all', result='admitted')
+
+    def enter_expensive(self):
+        if not self._expensive.acquire(blocking=False):
+            self._requests.inc(rule='expensive', scope='process', result='shed')
+            raise Overloaded('Too many expensive requests in progress')
+        with self._lock:
+            self._in_flight += 1
+        self._requests.inc(rule='expensive', scope='process', result='admitted')
+
+    def leave_expensive(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._expensive.release()
+
+
+def rate_limited(rule):
+    """Admit the view's requests through the token buckets of ``rule``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            admission = current_app.extensions[EXTENSION]
+            if admission is not None:
+                admission.admit(rule)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def concurrency_limited(view):
+    """Count the view against the expensive-request limit."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        admission = current_app.extensions[EXTENSION]
+        if admission is None:
+            return view(*args, **kwargs)
+        admission.enter_expensive()
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except BaseException:
+            admission.leave_expensive()
+            raise
+        if response.is_streamed:
+            response.call_on_close(admission.leave_expensive)
+        else:
+            admission.leave_expensive()
+        return response
+    return wrapper
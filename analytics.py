@@ -0,0 +1,288 @@
+"""Hourly occupancy, dwell time and turnover per lot and floor.
+
+Dashboards read ``occupancy_hourly``, a rollup with one row per lot, floor
+and hour, and never touch the session tables. The rollup is extended
+incrementally: ``refresh_hourly_rollup`` computes only the closed hours
+between the ``rollup_watermarks`` entry and the start of the current hour,
+a week per transaction, then advances the watermark. A closed hour never
+changes afterwards, because sessions only ever open or close at "now".
+
+For each window:
+
+* entries, exits and summed dwell time are grouped in SQL by lot, floor and
+  hour bucket (``GROUP BY`` on the entry or exit hour);
+* occupied slot-seconds need every session that overlaps the window split
+  across the hours it spans, which SQL cannot group. Those sessions are
+  streamed in chunks and swept into per-hour arrays: partial first and last
+  hours are added directly, whole hours in between go into a difference
+  array that is prefix-summed once at the end, so each session costs O(1)
+  however long it lasted.
+
+Both the hot and archived session tables are read when the window reaches
+back past the archive horizon. Run ``python analytics.py`` from cron, or
+let the endpoint refresh on read (``ANALYTICS_REFRESH_ON_READ``, at most
+``ANALYTICS_REFRESH_MAX_HOURS`` per request). The bucketing SQL exists for
+SQLite and MySQL only (``SUPPORTED_DIALECTS``).
+"""
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, or_, select, text
+from sqlalchemy.exc import IntegrityError
+
+from archive import sessions_tiers
+from models import Floor, OccupancyHourly, ParkingLot, RollupWatermark, Row, Slot, db
+from routing import use_primary
+
+ROLLUP_NAME = 'occupancy_hourly'
+HOUR = timedelta(hours=1)
+REFRESH_WINDOW = timedelta(days=7)
+READ_CHUNK = 5000
+MAX_REPORT_RANGE = timedelta(days=31)
+
+_refresh_lock = threading.Lock()
+
+
+def floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+# Hour bucket (as '%Y-%m-%d %H:00:00' text) and seconds between two
+# timestamps, per SQL dialect.
+_HOUR_BUCKET = {
+    'sqlite': lambda column: func.strftime('%Y-%m-%d %H:00:00', column),
+    'mysql': lambda column: func.date_format(column, '%Y-%m-%d %H:00:00'),
+}
+_SECONDS_BETWEEN = {
+    'sqlite': lambda start, end: (func.julianday(end) - func.julianday(start)) * 86400,
+    'mysql': lambda start, end: func.timestampdiff(text('SECOND'), start, end),
+}
+SUPPORTED_DIALECTS = tuple(sorted(_HOUR_BUCKET))
+
+
+def check_dialect(dialect):
+    """Raise ``ValueError`` unless the rollup can be computed on ``dialect``."""
+    if dialect not in SUPPORTED_DIALECTS:
+        raise ValueError(
+            f"The occupancy rollup supports {', '.join(SUPPORTED_DIALECTS)}, not {dialect}")
+
+
+def _with_floor(model):
+    """``model`` joined to its slot's floor; returns (from clause, floor_id)."""
+    joined = model.__table__ \
+        .outerjoin(Slot.__table__, Slot.slot_id == model.slot_id) \
+        .outerjoin(Row.__table__, Row.row_id == Slot.row_id)
+    return joined, func.coalesce(Row.floor_id, 0)
+
+
+def _grouped_events(model, column, start, end, dialect, dwell=False):
+    joined, floor_id = _with_floor(model)
+    bucket = _HOUR_BUCKET[dialect](column).label('bucket')
+    columns = [model.parking_id, floor_id, bucket, func.count()]
+    if dwell:
+        columns.append(func.sum(_SECONDS_BETWEEN[dialect](model.entry_time, model.exit_time)))
+    stmt = select(*columns).select_from(joined) \
+        .where(column >= start, column < end) \
+        .group_by(model.parking_id, floor_id, bucket)
+    for row in db.session.execute(stmt):
+        hour = datetime.strptime(row[2], '%Y-%m-%d %H:%M:%S')
+        yield (row[0] or 0, row[1], hour), row[3], (row[4] or 0) if dwell else 0
+
+
+def _occupied_seconds(models, start, end):
+    """{(parking_id, floor_id): array of occupied slot-seconds per hour}."""
+    hours = int((end - start) / HOUR)
+    seconds, whole = {}, {}
+    for model in models:
+        joined, floor_id = _with_floor(model)
+        stmt = select(model.parking_id, floor_id, model.entry_time, model.exit_time) \
+            .select_from(joined) \
+            .where(model.entry_time < end,
+                   or_(model.exit_time.is_(None), model.exit_time > start))
+        result = db.session.execute(stmt, execution_options={'stream_results': True})
+        for rows in result.partitions(READ_CHUNK):
+            for parking_id, floor, entry, exit_time in rows:
+                if entry is None:
+                    continue
+                begin = max(entry, start)
+                finish = min(exit_time or end, end)
+                if finish <= begin:
+                    continue
+                key = (parking_id or 0, floor)
+                per_hour = seconds.get(key)
+                if per_hour is None:
+                    per_hour = seconds[key] = array('d', bytes(8 * hours))
+                    whole[key] = array('q', bytes(8 * (hours + 1)))
+                first = int((begin - start) / HOUR)
+                last = int((finish - start) / HOUR)
+                if first == last:
+                    per_hour[first] += (finish - begin).total_seconds()
+                    continue
+                per_hour[first] += (start + (first + 1) * HOUR - begin).total_seconds()
+                if last < hours:
+                    per_hour[last] += (finish - (start + last * HOUR)).total_seconds()
+                if last > first + 1:
+                    whole[key][first + 1] += 1
+                    whole[key][last] -= 1
+    for key, per_hour in seconds.items():
+        running = 0
+        diff = whole[key]
+        for i in range(hours):
+            running += diff[i]
+            if running:
+                per_hour[i] += running * 3600.0
+    return seconds
+
+
+def _rollup_window(start, end):
+    dialect = db.session.get_bind().dialect.name
+    models = sessions_tiers(start)
+    rows = {}
+
+    def row(key):
+        if key not in rows:
+            rows[key] = {'parking_id': key[0], 'floor_id': key[1], 'hour': key[2],
+                         'entries': 0, 'exits': 0, 'dwell_seconds': 0.0,
+                         'occupied_seconds': 0.0}
+        return rows[key]
+
+    for model in models:
+        for key, count, _ in _grouped_events(model, model.entry_time, start, end, dialect):
+            row(key)['entries'] += count
+        for key, count, dwell in _grouped_events(model, model.exit_time, start, end, dialect,
+                                                 dwell=True):
+            row(key)['exits'] += count
+            row(key)['dwell_seconds'] += float(dwell)
+    for (parking_id, floor), per_hour in _occupied_seconds(models, start, end).items():
+        for i, value in enumerate(per_hour):
+            if value:
+                row((parking_id, floor, start + i * HOUR))['occupied_seconds'] += value
+
+    table = OccupancyHourly.__table__
+    db.session.execute(delete(table).where(table.c.hour >= start, table.c.hour < end))
+    if rows:
+        db.session.execute(insert(table), list(rows.values()))
+    return len(rows)
+
+
+def refresh_hourly_rollup(now=None, max_hours=None, wait=True):
+    """Bring the rollup up to the start of the current hour.
+
+    Computes at most ``max_hours`` hours, leaving the rest to later calls.
+    With ``wait=False`` it returns at once when another thread is already
+    refreshing. Returns the number of hours computed. Needs an app context.
+    """
+    check_dialect(db.session.get_bind().dialect.name)
+    if not _refresh_lock.acquire(blocking=wait):
+        return 0
+    try:
+        with use_primary():
+            return _refresh(floor_hour(now or datetime.utcnow()), max_hours)
+    finally:
+        _refresh_lock.release()
+
+
+def _refresh(until, max_hours):
+    computed = 0
+    mark = db.session.get(RollupWatermark, ROLLUP_NAME)
+    if mark is None:
+        firsts = [db.session.query(func.min(model.entry_time)).scalar()
+                  for model in sessions_tiers(None)]
+        firsts = [first for first in firsts if first is not None]
+        mark = RollupWatermark(name=ROLLUP_NAME,
+                               computed_until=floor_hour(min(firsts)) if firsts else until)
+        db.session.add(mark)
+    if max_hours:
+        until = min(until, mark.computed_until + max_hours * HOUR)
+    while mark.computed_until < until:
+        start = mark.computed_until
+        end = min(start + REFRESH_WINDOW, until)
+        try:
+            _rollup_window(start, end)
+            mark.computed_until = end
+            db.session.commit()
+        except IntegrityError:
+            # Another worker computed the same window first.
+            db.session.rollback()
+            break
+        computed += int((end - start) / HOUR)
+    try:
+        db.session.commit()
+    except IntegrityError:  # another worker created the watermark
+        db.session.rollback()
+    return computed
+
+
+def rollup_watermark():
+    mark = db.session.get(RollupWatermark, ROLLUP_NAME)
+    return mark.computed_until if mark else None
+
+
+def occupancy_report(start, end, parking_id=None, by_floor=False):
+    """Hourly rows and per-lot (or per-floor) totals from the rollup."""
+    group = [OccupancyHourly.parking_id] + ([OccupancyHourly.floor_id] if by_floor else [])
+    query = db.session.query(
+        *group, OccupancyHourly.hour,
+        func.sum(OccupancyHourly.entries), func.sum(OccupancyHourly.exits),
+        func.sum(OccupancyHourly.dwell_seconds), func.sum(OccupancyHourly.occupied_seconds)
+    ).filter(OccupancyHourly.hour >= start, OccupancyHourly.hour < end)
+    if parking_id is not None:
+        query = query.filter(OccupancyHourly.parking_id == parking_id)
+    rows = query.group_by(*group, OccupancyHourly.hour).order_by(*group, OccupancyHourly.hour).all()
+
+    # Capacity from the denormalised total_slots of the lot or floor.
+    index, model = (1, Floor) if by_floor else (0, ParkingLot)
+    key_column = model.__mapper__.primary_key[0]
+    capacity = dict(db.session.query(key_column, model.total_slots)
+                    .filter(key_column.in_({row[index] for row in rows})))
+
+    hours_in_range = (end - start) / HOUR
+    hourly, totals = [], {}
+    for row in rows:
+        key = tuple(row[:len(group)])
+        hour, entries, exits, dwell, occupied = row[len(group):]
+        slots = capacity.get(key[index])
+        item = dict(zip(['parking_id', 'floor_id'], key))
+        item.update({
+            'hour': hour.isoformat(),
+            'entries': int(entries),
+            'exits': int(exits),
+            'avg_dwell_minutes': round(dwell / exits / 60, 1) if exits else None,
+            'occupied_slots': round(occupied / 3600, 2),
+            'occupancy_rate': round(occupied / 3600 / slots, 4) if slots else None,
+        })
+        hourly.append(item)
+        total = totals.setdefault(key, [0, 0, 0.0, 0.0])
+        total[0] += entries
+        total[1] += exits
+        total[2] += dwell
+        total[3] += occupied
+
+    summary = []
+    for key, (entries, exits, dwell, occupied) in sorted(totals.items()):
+        slots = capacity.get(key[index])
+        item = dict(zip(['parking_id', 'floor_id'], key))
+        item.update({
+            'entries': int(entries),
+            'exits': int(exits),
+            'avg_dwell_minutes': round(dwell / exits / 60, 1) if exits else None,
+            'turnover': round(entries / slots, 3) if slots else None,
+            'avg_occupancy_rate': (round(occupied / 3600 / hours_in_range / slots, 4)
+                                   if slots else None),
+        })
+        summary.append(item)
+    return hourly, summary
+
+
+def main():
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        hours = refresh_hourly_rollup()
+        print(f'computed {hours} hours; rollup complete until {rollup_watermark()}')
+
+
+if __name__ == '__main__':
+    main()
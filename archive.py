@@ -0,0 +1,110 @@
+"""Move completed parking sessions to the archive tier.
+
+``parkingsessions`` keeps open sessions and recently completed ones; sessions
+that ended more than ``SESSION_ARCHIVE_DAYS`` ago are copied to
+``parkingsessions_archive`` (same columns and ids) and deleted from the hot
+table. Each batch is one ``INSERT ... SELECT`` plus one ``DELETE`` by
+primary key, committed on its own, so the job never holds locks on many rows
+and can be interrupted and re-run safely. Run it from cron::
+
+    python archive.py                     # uses DATABASE_URL / MYSQL_*
+    python archive.py --days 30 --batch-size 2000
+
+Before moving anything the job records its cutoff as the archive horizon
+(a ``rollup_watermarks`` row; it only ever moves forward). Readers choose
+their tables from that horizon rather than from their own config, so
+``/sessions/?from=...&to=...`` and the occupancy rollup read the archive as
+well whenever the range reaches back past it (``sessions_tiers``).
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, delete, insert, literal, select
+
+from models import ArchivedParkingSession, ParkingSession, RollupWatermark, db
+
+HORIZON_NAME = 'session_archive'
+
+
+def archive_cutoff(days, now=None):
+    return (now or datetime.utcnow()) - timedelta(days=days)
+
+
+def archive_horizon():
+    """Sessions that entered before this may be archived; None if none are."""
+    mark = db.session.get(RollupWatermark, HORIZON_NAME)
+    return mark.computed_until if mark else None
+
+
+def _advance_horizon(cutoff):
+    mark = db.session.get(RollupWatermark, HORIZON_NAME)
+    if mark is None:
+        db.session.add(RollupWatermark(name=HORIZON_NAME, computed_until=cutoff))
+    elif mark.computed_until < cutoff:
+        mark.computed_until = cutoff
+    db.session.commit()
+
+
+def archive_sessions(days, batch_size=5000, now=None):
+    """Archive sessions whose exit is older than ``days``; return the count.
+
+    Needs an app context.
+    """
+    now = now or datetime.utcnow()
+    cutoff = archive_cutoff(days, now)
+    hot, cold = ParkingSession.__table__, ArchivedParkingSession.__table__
+    columns = [column.name for column in hot.columns]
+    _advance_horizon(cutoff)  # before any row moves, so no reader misses it
+    moved = 0
+    while True:
+        ids = [row[0] for row in db.session.execute(
+            select(hot.c.session_id)
+            .where(hot.c.exit_time.isnot(None), hot.c.exit_time < cutoff)
+            .order_by(hot.c.session_id).limit(batch_size))]
+        if not ids:
+            break
+        try:
+            db.session.execute(insert(cold).from_select(
+                columns + ['archived_at'],
+                select(*[hot.c[name] for name in columns], literal(now, DateTime))
+                .where(hot.c.session_id.in_(ids))))
+            db.session.execute(delete(hot).where(hot.c.session_id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(ids)
+        if len(ids) < batch_size:
+            break
+    return moved
+
+
+def sessions_tiers(start):
+    """The session models a query for entries from ``start`` has to read.
+
+    Archived sessions ended, and so started, before the archive horizon; a
+    range starting after it can only match rows in the hot table.
+    """
+    horizon = archive_horizon()
+    if horizon is None or (start is not None and start >= horizon):
+        return [ParkingSession]
+    return [ParkingSession, ArchivedParkingSession]
+
+
+def main():
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, help='default: SESSION_ARCHIVE_DAYS')
+    parser.add_argument('--batch-size', type=int, help='default: SESSION_ARCHIVE_BATCH')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        moved = archive_sessions(args.days or app.config['SESSION_ARCHIVE_DAYS'],
+                                 args.batch_size or app.config['SESSION_ARCHIVE_BATCH'])
+    print(f'archived {moved} sessions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+#asgi.py
+# Async read endpoints (see async_reads.py): uvicorn asgi:app
+from async_reads import create_asgi_app
+
+app = create_asgi_app()
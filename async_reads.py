@@ -0,0 +1,194 @@
+"""Async read path: the display-board endpoints on an asyncio server.
+
+Under gunicorn every request holds a worker thread for as long as its
+queries take, so hundreds of display boards polling the lot, floor and slot
+listings need hundreds of threads. This module serves the same GET endpoints
+as a plain ASGI application on SQLAlchemy's asyncio engine. A request that
+waits on the database is just a suspended coroutine, so thousands of client
+connections fit in one process and one event loop:
+
+* ``GET /parkinglots/`` (with ``limit``/``after``/``fields``, as the Flask view)
+* ``GET /floors/<parking_id>``
+* ``GET /rows/<floor_id>``
+* ``GET /slots/<row_id>``
+* ``GET /users/<user_id>``
+
+The bodies are the documents the Flask views return, encoded with the same
+JSON provider. Run it next to the WSGI app and send those paths to it::
+
+    uvicorn asgi:app --port 5001
+
+The database URL is the app's, with the driver swapped for its asyncio one
+(``sqlite+aiosqlite``, ``mysql+aiomysql``), or ``ASYNC_DATABASE_URL``; with
+``DATABASE_REPLICA_URL`` set it reads from the replica. aiomysql and uvicorn
+are optional (``pip install -r requirements-asgi.txt``); without the driver
+the app refuses to start and names it. Queries go straight to the
+database: the topology and response caches are per process, and this
+process never sees the writes that invalidate them.
+"""
+import re
+from importlib.util import find_spec
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.urls import url_decode
+
+from config import database_config
+from formatting import http_date, row_serializer
+from json_provider import create_json_provider
+from models import Floor, ParkingLot, Row, Slot, User, db
+from pagination import (NEXT_AFTER_HEADER, QueryArgumentError, page_args, page_items,
+                        page_statement, parse_fields)
+from routing import REPLICA_BIND
+
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'mysql': 'aiomysql'}
+
+LOT_FIELDS = ['parking_id', 'parking_name', 'city', 'available_slots']
+FLOOR_FIELDS = ['floor_id', 'floor_number', 'total_slots', 'available_slots']
+ROW_FIELDS = ['row_id', 'row_number']
+SLOT_FIELDS = ['slot_id', 'slot_number']
+USER_FIELDS = ['user_id', 'username', 'email', 'phone', 'created_at']
+
+
+def async_database_url(url):
+    """``url`` with its driver replaced by the asyncio driver of its dialect."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No asyncio driver known for {backend!r} databases')
+    if url.get_driver_name() == ASYNC_DRIVERS[backend]:
+        return url
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def check_async_driver(url):
+    """Fail with the missing package named rather than a bare ImportError."""
+    driver = make_url(url).get_driver_name()
+    if find_spec(driver) is None:
+        raise RuntimeError(
+            f'The async read path needs the {driver!r} driver for {url.drivername} URLs, '
+            'which is not installed: pip install -r requirements-asgi.txt')
+
+
+def async_engine_options(url, options):
+    options = dict(options)
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+        # aiosqlite defaults to a new connection (and thread) per checkout.
+        options.setdefault('poolclass', AsyncAdaptedQueuePool)
+        options.setdefault('pool_size', 10)
+    return options
+
+
+class AsyncReadApp:
+    """ASGI application serving the read endpoints listed above."""
+
+    def __init__(self, config):
+        self.config = config
+        url = config.get('ASYNC_DATABASE_URI') or async_database_url(
+            (config.get('SQLALCHEMY_BINDS') or {}).get(REPLICA_BIND)
+            or config['SQLALCHEMY_DATABASE_URI'])
+        url = make_url(url)
+        check_async_driver(url)
+        self.engine = create_async_engine(
+            url, **async_engine_options(url, config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}))
+        self.json = create_json_provider(None, config['JSON_PROVIDER'])
+        self.routes = [
+            (re.compile(r'/parkinglots/'), self.list_parking_lots),
+            (re.compile(r'/floors/(\d+)'), self.list_floors),
+            (re.compile(r'/rows/(\d+)'), self.list_rows),
+            (re.compile(r'/slots/(\d+)'), self.list_slots),
+            (re.compile(r'/users/(\d+)'), self.get_user),
+        ]
+
+    async def _rows(self, statement):
+        # The connection goes back to the pool before the body is encoded.
+        async with self.engine.connect() as conn:
+            return (await conn.execute(statement)).all()
+
+    async def list_parking_lots(self, args):
+        fields = parse_fields(ParkingLot, LOT_FIELDS, args=args)
+        limit, after = page_args(args)
+        rows = await self._rows(page_statement(ParkingLot, fields, (), limit, after))
+        items, next_after = page_items(rows, fields, None, limit)
+        headers = [('Cache-Control', f"public, max-age={self.config['RESPONSE_CACHE_MAX_AGE']}")]
+        if next_after is not None:
+            headers.append((NEXT_AFTER_HEADER, str(next_after)))
+        return 200, items, headers
+
+    async def _children(self, model, fields, parent, parent_id, *criteria):
+        key = model.__mapper__.primary_key[0]
+        rows = await self._rows(
+            select(*[getattr(model, f) for f in fields])
+            .where(getattr(model, parent) == parent_id, *criteria).order_by(key))
+        serialize = row_serializer(fields)
+        return 200, [serialize(row) for row in rows], []
+
+    async def list_floors(self, args, parking_id):
+        return await self._children(Floor, FLOOR_FIELDS, 'parking_id', parking_id)
+
+    async def list_rows(self, args, floor_id):
+        return await self._children(Row, ROW_FIELDS, 'floor_id', floor_id)
+
+    async def list_slots(self, args, row_id):
+        return await self._children(Slot, SLOT_FIELDS, 'row_id', row_id,
+                                    Slot.is_available == db.true())
+
+    async def get_user(self, args, user_id):
+        rows = await self._rows(select(*[getattr(User, f) for f in USER_FIELDS])
+                                .where(User.user_id == user_id))
+        if not rows:
+            return 404, {'message': 'User not found'}, []
+        user = row_serializer(USER_FIELDS, {'created_at': http_date})(rows[0])
+        return 200, user, [('Cache-Control', 'private, no-cache')]
+
+    async def dispatch(self, method, path, query_string):
+        """Return ``(status, data, headers)`` for one request."""
+        for pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                break
+        else:
+            return 404, {'message': 'Not found'}, []
+        if method not in ('GET', 'HEAD'):
+            return 405, {'message': 'Method not allowed'}, [('Allow', 'GET, HEAD')]
+        try:
+            return await handler(url_decode(query_string), *map(int, match.groups()))
+        except QueryArgumentError as error:
+            return 400, {'message': str(error)}, []
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise RuntimeError(f"Unsupported ASGI scope type {scope['type']!r}")
+        status, data, headers = await self.dispatch(scope['method'], scope['path'],
+                                                    scope['query_string'])
+        body = self.json.response_body(data, self.config['JSON_SORT_KEYS'])
+        headers = [('Content-Type', 'application/json'),
+                   ('Content-Length', str(len(body)))] + headers
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                                for k, v in headers]})
+        await send({'type': 'http.response.body',
+                    'body': b'' if scope['method'] == 'HEAD' else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(test_config=None):
+    config = {'JSON_PROVIDER': 'auto', 'JSON_SORT_KEYS': True, 'RESPONSE_CACHE_MAX_AGE': 5}
+    if test_config is None:
+        config.update(database_config())
+    else:
+        config.update(test_config)
+    return AsyncReadApp(config)
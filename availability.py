@@ -0,0 +1,102 @@
+"""Live per-lot and per-floor free-slot counts.
+
+The counts are computed from ``slots.is_available`` with one GROUP BY query
+on first use and then kept up to date incrementally by the booking, release
+and slot-creation paths. Every change bumps ``version``. The serialised
+snapshot is built at most once per version, so clients polling with
+``If-None-Match`` cost a dictionary lookup and a 304.
+
+Each process keeps its own tracker. ``refresh_seconds``
+(``AVAILABILITY_REFRESH_SECONDS``, default 30) bounds how long the counts
+can drift from changes made by other worker processes; a refresh that finds
+nothing changed keeps the version, so it does not break revalidation. The
+ETag includes a per-process token, so a poll that lands on another worker
+gets a full response instead of a wrong 304.
+"""
+import json
+import threading
+import time
+import uuid
+
+
+class AvailabilityTracker:
+
+    def __init__(self, loader, refresh_seconds=0, clock=time.monotonic):
+        # loader() -> iterable of (parking_id, floor_id, total, free)
+        self._loader = loader
+        self._refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex[:8]
+        self._lots = {}
+        self._floors = {}
+        self._loaded_at = None
+        self._snapshot = None
+        self.version = 0
+
+    def _load(self):
+        lots, floors = {}, {}
+        for parking_id, floor_id, total, free in self._loader():
+            free = int(free or 0)
+            if parking_id is not None:
+                lot = lots.setdefault(parking_id, [0, 0])
+                lot[0] += free
+                lot[1] += total
+            if floor_id is not None:
+                floor = floors.setdefault(floor_id, [parking_id, 0, 0])
+                floor[1] += free
+                floor[2] += total
+        with self._lock:
+            if self._loaded_at is None or (lots, floors) != (self._lots, self._floors):
+                self._lots, self._floors = lots, floors
+                self.version += 1
+            self._loaded_at = self._clock()
+
+    def _ensure_loaded(self):
+        stale = (self._refresh_seconds and self._loaded_at is not None
+                 and self._clock() - self._loaded_at > self._refresh_seconds)
+        if self._loaded_at is None or stale:
+            self._load()
+
+    def _apply(self, parking_id, floor_id, free_delta, total_delta=0):
+        if self._loaded_at is None:
+            return  # not built yet; the first load will see this change
+        with self._lock:
+            if parking_id is not None:
+                lot = self._lots.setdefault(parking_id, [0, 0])
+                lot[0] += free_delta
+                lot[1] += total_delta
+            if floor_id is not None:
+                floor = self._floors.setdefault(floor_id, [parking_id, 0, 0])
+                floor[1] += free_delta
+                floor[2] += total_delta
+            self.version += 1
+
+    def slot_taken(self, parking_id, floor_id):
+        self._apply(parking_id, floor_id, -1)
+
+    def slot_freed(self, parking_id, floor_id):
+        self._apply(parking_id, floor_id, 1)
+
+    def slot_added(self, parking_id, floor_id, available=True, count=1):
+        self._apply(parking_id, floor_id, count if available else 0, count)
+
+    def lot_free(self, parking_id):
+        """Live free count of a lot, or None when it has no slots."""
+        self._ensure_loaded()
+        with self._lock:
+            lot = self._lots.get(parking_id)
+            return lot[0] if lot else None
+
+    def snapshot(self):
+        """Return ``(etag, body)`` for the current version."""
+        self._ensure_loaded()
+        with self._lock:
+            if self._snapshot is None or self._snapshot[0] != self.version:
+                body = json.dumps({
+                    'version': self.version,
+                    'lots': {str(k): v for k, v in self._lots.items()},
+                    'floors': {str(k): v for k, v in self._floors.items()},
+                }, separators=(',', ':')).encode('utf-8')
+                self._snapshot = (self.version, f'{self._token}-{self.version}', body)
+            return self._snapshot[1], self._snapshot[2]
@@ -0,0 +1,113 @@
+"""Helpers shared by the benchmark scripts."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Latency percentiles (ms) and throughput for one scenario."""
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(values) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(values, 50) * 1000, 3) if values else None,
+        'p95_ms': round(percentile(values, 95) * 1000, 3) if values else None,
+        'p99_ms': round(percentile(values, 99) * 1000, 3) if values else None,
+    }
+
+
+def run_concurrently(concurrency, total, make_request):
+    """Call ``make_request(i)`` ``total`` times from ``concurrency`` threads.
+
+    ``make_request`` returns True on success. Returns the ``summarize`` dict.
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        local = []
+        failed = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            ok = make_request(i)
+            local.append(time.perf_counter() - start)
+            if not ok:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, errors[0])
+
+
+def lot_payload(**overrides):
+    """A complete POST /parkinglots/ body."""
+    data = {
+        'parking_name': 'Bench Lot', 'city': 'New Delhi', 'parking_location': 'CP',
+        'address_1': 'Barakhamba Road', 'address_2': '', 'latitude': 28.6297,
+        'longitude': 77.2257, 'physical_appearance': 'Multi-level',
+        'parking_ownership': 'Public', 'parking_surface': 'Cemented', 'has_cctv': 'Yes',
+        'has_boom_barrier': 'Yes', 'ticket_generated': 'Digital',
+        'entry_exit_gates': 'North Gate', 'weekly_off': 'None', 'parking_timing': '24/7',
+        'vehicle_types': 'Car, Bike', 'car_capacity': 200, 'two_wheeler_capacity': 50,
+        'parking_type': 'Multi-level', 'payment_modes': 'Cash, Card',
+        'car_parking_charge': '20', 'two_wheeler_parking_charge': '10',
+        'allows_prepaid_passes': 'Yes', 'provides_valet_services': 'No', 'notes': '',
+        'total_slots': 200, 'available_slots': 200,
+    }
+    data.update(overrides)
+    return data
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name, results, output=None):
+    """Print results as JSON and optionally write them to ``output``."""
+    document = {
+        'benchmark': name,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results,
+    }
+    text = json.dumps(document, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as fh:
+            fh.write(text + '\n')
+    return document
@@ -0,0 +1,167 @@
+"""Read endpoints on the sync WSGI app against the async ASGI read path.
+
+Seeds a SQLite database with ``seed.py`` and sends the same mix of
+``/slots/<row_id>``, ``/rows/<floor_id>``, ``/floors/<parking_id>``,
+``/users/<user_id>`` and ``/parkinglots/?limit=50`` requests, in process,
+with ``--concurrency`` requests in flight at a time:
+
+* ``sync``  - the Flask app, one thread per in-flight request (what a
+  threaded gunicorn worker needs to hold that many clients);
+* ``async`` - ``async_reads`` on one event loop, queries through aiosqlite.
+
+The topology and response caches are off, so both paths go to the database
+for every request. ``--query-delay-ms`` makes every statement that much
+slower inside the driver (a SQLite trace callback, run in the thread that
+executes the query), to stand in for a busy MySQL server. Reports the usual
+latency/throughput summary per mode plus the peak number of threads::
+
+    python benchmarks/bench_async.py --requests 5000 --concurrency 500 \\
+        --query-delay-ms 20 --output async.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+from _common import run_concurrently, summarize, write_results
+from bench_load import WsgiClient
+from seed import PRESETS, create_seeded_app
+
+
+def slow_queries(engine, delay):
+    """Add ``delay`` seconds to every statement, in the driver's own thread."""
+    def on_connect(dbapi_connection, connection_record):
+        raw = dbapi_connection
+        if hasattr(raw, '_connection'):  # aiosqlite adapter -> sqlite3 connection
+            raw = raw._connection._conn
+        raw.set_trace_callback(lambda statement: time.sleep(delay))
+    event.listen(engine, 'connect', on_connect)
+
+
+def request_mix(app, count, seed=7):
+    from app import db
+
+    with app.app_context():
+        ids = {table: [r[0] for r in db.session.execute(db.text(f'SELECT {key} FROM {table}'))]
+               for table, key in (('parking_rows', 'row_id'), ('floors', 'floor_id'),
+                                  ('parkinglots_details', 'parking_id'),
+                                  ('users', 'user_id'))}
+    rng = random.Random(seed)
+    choices = [lambda: f"/slots/{rng.choice(ids['parking_rows'])}",
+               lambda: f"/slots/{rng.choice(ids['parking_rows'])}",
+               lambda: f"/rows/{rng.choice(ids['floors'])}",
+               lambda: f"/floors/{rng.choice(ids['parkinglots_details'])}",
+               lambda: f"/users/{rng.choice(ids['users'])}",
+               lambda: '/parkinglots/?limit=50']
+    return [rng.choice(choices)() for _ in range(count)]
+
+
+class PeakThreads:
+
+    def __init__(self):
+        self.peak = threading.active_count()
+
+    def sample(self):
+        self.peak = max(self.peak, threading.active_count())
+
+
+def run_sync(app, paths, concurrency, delay):
+    from app import db
+
+    with app.app_context():
+        slow_queries(db.get_engine(app), delay)
+    client = WsgiClient(app)
+    threads = PeakThreads()
+
+    def get(i):
+        threads.sample()
+        return client.get(paths[i])[0] == 200
+
+    summary = run_concurrently(concurrency, len(paths), get)
+    summary['peak_threads'] = threads.peak
+    return summary
+
+
+async def _asgi_status(asgi_app, url):
+    path, _, query = url.partition('?')
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await asgi_app({'type': 'http', 'method': 'GET', 'path': path,
+                    'query_string': query.encode(), 'headers': []}, receive, send)
+    return status[0]
+
+
+async def _drive(asgi_app, paths, concurrency, threads):
+    latencies, errors = [], [0]
+    counter = iter(range(len(paths)))
+
+    async def worker():
+        for i in counter:  # shared by all workers; one event loop, so no lock
+            threads.sample()
+            start = time.perf_counter()
+            if await _asgi_status(asgi_app, paths[i]) != 200:
+                errors[0] += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    finally:
+        await asgi_app.engine.dispose()
+    return summarize(latencies, time.perf_counter() - started, errors[0])
+
+
+def run_async(database_url, paths, concurrency, delay, pool_size):
+    from async_reads import create_asgi_app
+
+    asgi_app = create_asgi_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30},
+                                      'pool_size': pool_size, 'max_overflow': 0}})
+    slow_queries(asgi_app.engine.sync_engine, delay)
+    threads = PeakThreads()
+    summary = asyncio.run(_drive(asgi_app, paths, concurrency, threads))
+    summary['peak_threads'] = threads.peak
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--query-delay-ms', type=float, default=0.0)
+    parser.add_argument('--pool-size', type=int, default=20,
+                        help='async engine connections (aiosqlite threads)')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'async.db')
+    app, seeded = create_seeded_app(database_url, args.preset, TOPOLOGY_CACHE='none',
+                                    RESPONSE_CACHE='none')
+    paths = request_mix(app, args.requests)
+    delay = args.query_delay_ms / 1000
+    results = {
+        'sync': run_sync(app, paths, args.concurrency, delay),
+        'async': run_async(database_url, paths, args.concurrency, delay, args.pool_size),
+        'config': {'preset': args.preset, 'requests': args.requests,
+                   'concurrency': args.concurrency, 'query_delay_ms': args.query_delay_ms,
+                   'pool_size': args.pool_size, 'seeded': seeded},
+    }
+    write_results('async', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Gate burst throughput: one commit per request against group commit.
+
+Seeds one database per mode with ``seed.py`` and fires a shift-change burst
+at it from ``--concurrency`` threads: ``--requests`` POST /Park_car/ for
+distinct free slots, then PUT /Remove_car/<id>/exit for every session
+opened. For each mode it reports the usual latency/throughput summary per
+phase plus the number of database commits, commits per second and gate
+events per commit:
+
+* ``direct`` - every request commits its own transaction (the default);
+* ``group``  - ``GATE_GROUP_COMMIT`` on, events batched by the gate writer.
+
+    python benchmarks/bench_gate.py --requests 2000 --concurrency 64 --output gate.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+
+from sqlalchemy import event
+
+from _common import run_concurrently, write_results
+from bench_load import WsgiClient
+from seed import PRESETS, create_seeded_app
+
+MODES = {'direct': {'GATE_GROUP_COMMIT': False}, 'group': {'GATE_GROUP_COMMIT': True}}
+
+
+def run_mode(database_url, preset, overrides, requests, concurrency):
+    from app import db
+
+    app, _ = create_seeded_app(database_url, preset, **overrides)
+    client = WsgiClient(app)
+    with app.app_context():
+        free = db.session.execute(db.text(
+            'SELECT slot_id, parking_id FROM slots WHERE is_available = 1 '
+            'ORDER BY slot_id LIMIT :n'), {'n': requests}).fetchall()
+        engine = db.get_engine(app)
+    commits = [0]
+
+    def count_commit(conn):
+        commits[0] += 1
+    event.listen(engine, 'commit', count_commit)
+
+    opened = []
+    opened_lock = threading.Lock()
+
+    def park(i):
+        slot_id, parking_id = free[i]
+        status, data = client.post('/Park_car/', {
+            'user_id': 1 + i % 100, 'parking_id': parking_id, 'slot_id': slot_id,
+            'car_number': f'GATE{i:06d}'})
+        if status == 201:
+            with opened_lock:
+                opened.append(json.loads(data)['session_id'])
+        return status == 201
+
+    def exit_(i):
+        return client.put(f'/Remove_car/{opened[i]}/exit')[0] == 200
+
+    results = {}
+    for name, total, request in (('park', len(free), park), ('exit', None, exit_)):
+        before = commits[0]
+        summary = run_concurrently(concurrency, total if total is not None else len(opened),
+                                   request)
+        done = commits[0] - before
+        summary['commits'] = done
+        summary['commits_per_s'] = round(done / summary['seconds'], 1) if summary['seconds'] else None
+        summary['events_per_commit'] = round(summary['requests'] / done, 2) if done else None
+        results[name] = summary
+    event.remove(engine, 'commit', count_commit)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    results = {}
+    for mode, overrides in MODES.items():
+        database_url = 'sqlite:///' + os.path.join(workdir, f'gate-{mode}.db')
+        overrides = dict(overrides, GATE_BATCH_SIZE=args.batch_size)
+        results[mode] = run_mode(database_url, args.preset, overrides, args.requests,
+                                 args.concurrency)
+    results['config'] = {'preset': args.preset, 'requests': args.requests,
+                         'concurrency': args.concurrency, 'batch_size': args.batch_size}
+    write_results('gate', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
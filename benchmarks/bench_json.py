@@ -0,0 +1,105 @@
+"""CPU cost of turning result rows into a JSON response body.
+
+Builds ``--rows`` synthetic session rows (the widest list payload, with two
+timestamp columns) and times, in CPU milliseconds per 10k rows (median of
+``--runs``):
+
+* ``legacy`` - the previous path: a dict filled field by field, timestamps
+  through ``strftime`` and ``flask.jsonify``;
+* ``json`` / ``orjson`` - ``row_serializer`` with the cached ``http_date``
+  and the given JSON provider (orjson only when it is installed).
+
+``rows_ms`` is row-to-dict conversion, ``encode_ms`` the response encoding
+and ``total_ms`` both::
+
+    python benchmarks/bench_json.py --rows 50000 --output json.json
+"""
+import argparse
+import gc
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from _common import write_results
+
+FIELDS = ['session_id', 'user_id', 'parking_id', 'slot_id', 'car_number',
+          'entry_time', 'exit_time']
+HTTP_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+
+
+def make_rows(count):
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        entry = start + timedelta(seconds=97 * i)
+        exit_time = entry + timedelta(minutes=45) if i % 5 else None
+        rows.append((i + 1, i + 1, i % 500, i % 40, i % 4000, f'DL{i:06d}', entry, exit_time))
+    return rows
+
+
+def legacy_rows(rows):
+    formatters = {'entry_time': lambda v: v.strftime(HTTP_DATE_FORMAT),
+                  'exit_time': lambda v: v.strftime(HTTP_DATE_FORMAT)}
+    items = []
+    for row in rows:
+        item = {}
+        for name, value in zip(FIELDS, row[1:]):
+            fmt = formatters.get(name)
+            item[name] = fmt(value) if fmt and value is not None else value
+        items.append(item)
+    return items
+
+
+def current_rows(rows):
+    from formatting import http_date, row_serializer
+
+    serialize = row_serializer(FIELDS, {'entry_time': http_date, 'exit_time': http_date},
+                               offset=1)
+    return [serialize(row) for row in rows]
+
+
+def measure(to_items, encode, rows, runs):
+    per_10k = 10000 / len(rows)
+    samples = {'rows_ms': [], 'encode_ms': [], 'total_ms': []}
+    for _ in range(runs):
+        gc.collect()  # don't bill one variant for the previous one's garbage
+        started = time.process_time()
+        items = to_items(rows)
+        converted = time.process_time()
+        encode({'sessions': items}).get_data()
+        encoded = time.process_time()
+        samples['rows_ms'].append((converted - started) * 1000 * per_10k)
+        samples['encode_ms'].append((encoded - converted) * 1000 * per_10k)
+        samples['total_ms'].append((encoded - started) * 1000 * per_10k)
+    return {key: round(statistics.median(values), 2) for key, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    import flask
+    from app import create_app
+    from json_provider import PROVIDERS
+
+    rows = make_rows(args.rows)
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+                      'SQLALCHEMY_TRACK_MODIFICATIONS': False})
+    results = {}
+    with app.app_context():
+        results['legacy'] = measure(legacy_rows, flask.jsonify, rows, args.runs)
+        for name, provider_class in PROVIDERS.items():
+            try:
+                provider = provider_class(app)
+            except ImportError:
+                continue
+            results[name] = measure(current_rows, provider.response, rows, args.runs)
+    write_results('json', {'per_10k_rows': results,
+                           'config': {'rows': args.rows, 'runs': args.runs}}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Load test of the booking and listing hot paths.
+
+Seeds (or reuses) a database with ``seed.py``, then drives each scenario
+from ``--concurrency`` threads and reports p50/p95/p99 latency and
+requests per second:
+
+* ``park``  - POST /Park_car/ for distinct free slots
+* ``exit``  - PUT /Remove_car/<session_id>/exit for the sessions just opened
+* ``slots`` - GET /slots/<row_id> over random rows
+* ``lots``  - GET /parkinglots/
+
+By default requests go through the in-process WSGI test client, which
+measures the application and database cost without any HTTP server. Pass
+``--url`` to load a running server instead (the database must be the one
+that server uses). Results are written as JSON, one file per run, so runs
+from different commits can be compared with ``compare.py``::
+
+    python benchmarks/bench_load.py --database-url sqlite:////tmp/park.db \\
+        --preset medium --output benchmarks/results/$(git rev-parse --short HEAD).json
+    python benchmarks/compare.py benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import urllib.parse
+
+from _common import run_concurrently, write_results
+from seed import PRESETS, create_seeded_app
+
+
+class HttpClient:
+    """Tiny keep-alive client with the subset of the test-client API we use."""
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.local = threading.local()
+
+    def _request(self, method, path, body=None):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                         headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self.local.conn = None
+            raise
+        return response.status, data
+
+    def get(self, path):
+        return self._request('GET', path)
+
+    def post(self, path, body):
+        return self._request('POST', path, body)
+
+    def put(self, path):
+        return self._request('PUT', path)
+
+
+class WsgiClient:
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def _client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        return client
+
+    def get(self, path):
+        response = self._client().get(path)
+        return response.status_code, response.data
+
+    def post(self, path, body):
+        response = self._client().post(path, json=body)
+        return response.status_code, response.data
+
+    def put(self, path):
+        response = self._client().put(path)
+        return response.status_code, response.data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--url', help='load a running server instead of the WSGI app')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--scenarios', default='park,exit,slots,lots')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+    app, summary = create_seeded_app(database_url, args.preset)
+    client = HttpClient(args.url) if args.url else WsgiClient(app)
+
+    from app import db
+    with app.app_context():
+        free = db.session.execute(db.text(
+            'SELECT slot_id, parking_id FROM slots WHERE is_available = 1 '
+            'ORDER BY slot_id LIMIT :n'), {'n': args.requests}).fetchall()
+        row_ids = [r[0] for r in db.session.execute(db.text('SELECT row_id FROM parking_rows'))]
+    rng = random.Random(7)
+    opened = []
+    opened_lock = threading.Lock()
+
+    def park(i):
+        slot_id, parking_id = free[i % len(free)]
+        status, data = client.post('/Park_car/', {
+            'user_id': 1 + i % 100, 'parking_id': parking_id, 'slot_id': slot_id,
+            'car_number': f'LOAD{i:06d}'})
+        if status == 201:
+            with opened_lock:
+                opened.append(json.loads(data)['session_id'])
+        return status == 201
+
+    def exit_(i):
+        return client.put(f'/Remove_car/{opened[i % len(opened)]}/exit')[0] == 200
+
+    def slots(i):
+        return client.get(f'/slots/{row_ids[rng.randrange(len(row_ids))]}')[0] == 200
+
+    def lots(i):
+        return client.get('/parkinglots/')[0] == 200
+
+    scenarios = {'park': park, 'exit': exit_, 'slots': slots, 'lots': lots}
+    results = {}
+    for name in args.scenarios.split(','):
+        if name == 'exit' and not opened:
+            continue
+        total = min(args.requests, len(opened)) if name == 'exit' else args.requests
+        if name == 'lots':
+            total = max(1, total // 10)  # full-table listing; keep the run short
+        results[name] = run_concurrently(args.concurrency, total, scenarios[name])
+    results['config'] = {'preset': args.preset, 'concurrency': args.concurrency,
+                         'target': args.url or 'wsgi', 'seeded': summary}
+    write_results('load', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Login latency under concurrent load.
+
+Registers ``--users`` accounts, then fires ``--requests`` logins from
+``--concurrency`` threads against an in-process test client and reports
+p50/p95/p99 and requests per second. Run it once per pool size to see how
+the hashing pool bounds throughput and tail latency::
+
+    python benchmarks/bench_login.py --workers 1
+    python benchmarks/bench_login.py --workers 4 --output login.json
+"""
+import argparse
+import os
+import tempfile
+
+from _common import run_concurrently, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4, help='hashing pool size')
+    parser.add_argument('--scrypt-n', type=int, default=2 ** 14)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    from app import create_app, db
+
+    workdir = tempfile.mkdtemp()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}},
+        'PASSWORD_SCRYPT_N': args.scrypt_n,
+        'PASSWORD_HASH_WORKERS': args.workers,
+        'PASSWORD_HASH_QUEUE': args.concurrency,
+    })
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    for i in range(args.users):
+        client.post('/users/register', json={
+            'username': f'bench{i}', 'password': f'pw{i}',
+            'email': f'bench{i}@example.com', 'phone': str(i)})
+
+    def login(i):
+        n = i % args.users
+        response = app.test_client().post('/users/login', json={
+            'email': f'bench{n}@example.com', 'password': f'pw{n}'})
+        return response.status_code == 200
+
+    result = run_concurrently(args.concurrency, args.requests, login)
+    result.update({'workers': args.workers, 'concurrency': args.concurrency,
+                   'scrypt_n': args.scrypt_n})
+    write_results('login', result, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Throughput of the Flask dev server vs. the gunicorn production setup.
+
+Seeds a SQLite database, then starts each server as a subprocess on a free
+port (``python run.py`` as the dev server, ``gunicorn -c gunicorn.conf.py
+wsgi:app`` as production), drives a mix of GET requests over keep-alive
+connections from ``--concurrency`` threads, and reports req/s and latency
+percentiles for each mode::
+
+    python benchmarks/bench_server.py --requests 3000 --output server.json
+"""
+import argparse
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from _common import ROOT, lot_payload, run_concurrently, write_results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(database_url, lots):
+    from app import create_app, db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url,
+                      'SQLALCHEMY_TRACK_MODIFICATIONS': False})
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    layout = {'floors': [{'floor_number': str(f), 'rows': [
+        {'row_number': chr(65 + r), 'slots': 20} for r in range(5)]} for f in range(2)]}
+    row_ids = []
+    for i in range(lots):
+        parking_id = client.post('/parkinglots/', json=lot_payload(
+            parking_name=f'Lot {i}')).get_json()['parking_id']
+        floors = client.post(f'/parkinglots/{parking_id}/import', json=layout).get_json()['floors']
+        row_ids.extend(row['row_id'] for floor in floors for row in floor['rows'])
+    return row_ids
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start on port {port}')
+
+
+def drive(port, paths, concurrency, total):
+    local = threading.local()
+
+    def request(i):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            conn.request('GET', paths[i % len(paths)])
+            response = conn.getresponse()
+            response.read()
+            return response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            local.conn = None
+            return False
+
+    return run_concurrently(concurrency, total, request)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    row_ids = seed(database_url, args.lots)
+    paths = ['/parkinglots/?limit=50'] + [f'/slots/{row_id}' for row_id in row_ids[:50]]
+
+    modes = {
+        'dev': [sys.executable, 'run.py'],
+        'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+    }
+    results = {}
+    for mode, command in modes.items():
+        port = free_port()
+        env = dict(os.environ, DATABASE_URL=database_url, PORT=str(port),
+                   GUNICORN_THREADS=str(args.threads), GUNICORN_ACCESSLOG='/dev/null')
+        if args.workers:
+            env['WEB_CONCURRENCY'] = str(args.workers)
+        server = subprocess.Popen(command, cwd=ROOT, env=env, start_new_session=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            drive(port, paths, args.concurrency, min(200, args.requests))  # warm-up
+            results[mode] = drive(port, paths, args.concurrency, args.requests)
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=60)
+    results['config'] = {'lots': args.lots, 'concurrency': args.concurrency,
+                         'workers': args.workers or 'default', 'threads': args.threads,
+                         'cpus': os.cpu_count()}
+    write_results('server', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
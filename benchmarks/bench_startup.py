@@ -0,0 +1,80 @@
+"""App factory startup cost and first-request latency.
+
+Each sample runs in a fresh interpreter, so module import and mapper
+configuration are paid exactly as a new gunicorn worker or test session pays
+them. Reported (median of ``--runs``, in milliseconds):
+
+* ``import_ms`` - ``import app``
+* ``create_app_ms`` - the first ``create_app()`` call
+* ``first_request_ms`` - the first GET /parkinglots/ and GET /slots/1 on an
+  empty SQLite schema (includes lazy engine and mapper setup)
+* ``second_create_app_ms`` - another ``create_app()`` in the same process,
+  as a test suite or a multi-tenant host would do (null if it fails)
+
+    python benchmarks/bench_startup.py --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from _common import ROOT, write_results
+
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app, db
+imported = time.perf_counter()
+
+def config(path):
+    return {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path,
+            'SQLALCHEMY_TRACK_MODIFICATIONS': False}
+
+app = create_app(config(sys.argv[1]))
+created = time.perf_counter()
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+first = time.perf_counter()
+assert client.get('/parkinglots/').status_code == 200
+assert client.get('/slots/1').status_code == 200
+served = time.perf_counter()
+try:
+    again = time.perf_counter()
+    create_app(config(sys.argv[1] + '.2'))
+    second = (time.perf_counter() - again) * 1000
+except Exception:
+    second = None
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'create_app_ms': (created - imported) * 1000,
+                  'first_request_ms': (served - first) * 1000,
+                  'second_create_app_ms': second}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    samples = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for run in range(args.runs):
+            path = os.path.join(scratch, f'startup{run}.db')
+            out = subprocess.run([sys.executable, '-c', PROBE, path], cwd=ROOT, check=True,
+                                 capture_output=True, text=True).stdout
+            samples.append(json.loads(out.strip().splitlines()[-1]))
+
+    results = {}
+    for key in samples[0]:
+        values = [s[key] for s in samples if s[key] is not None]
+        results[key] = round(statistics.median(values), 2) if values else None
+    write_results('startup', {'startup': results, 'config': {'runs': args.runs}}, args.output)
+
+
+if __name__ == '__main__':
+    main()
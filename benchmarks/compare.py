@@ -0,0 +1,62 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python benchmarks/compare.py baseline.json candidate.json --threshold 10
+
+Prints p50/p99 and req/s for every load scenario present in both files, and
+every other ``*_ms`` timing (as written by ``bench_startup.py``). Exits with
+status 1 if any p99 or timing grew, or any req/s fell, by more than
+``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+
+
+def _change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0)
+    args = parser.parse_args()
+
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    with open(args.candidate) as fh:
+        candidate = json.load(fh)
+
+    print(f"{baseline.get('revision')} -> {candidate.get('revision')} ({candidate['benchmark']})")
+    print(f"{'scenario':<12}{'p50 ms':>18}{'p99 ms':>22}{'req/s':>22}")
+    regressions = []
+    for name, old in baseline['results'].items():
+        new = candidate['results'].get(name)
+        if not isinstance(old, dict) or not isinstance(new, dict):
+            continue
+        if 'p99_ms' not in old:
+            for key, value in old.items():
+                if key.endswith('_ms'):
+                    print(f"{name + '.' + key:<34}{value} -> {new.get(key)}")
+                    change = _change(value, new.get(key))
+                    if change is not None and change > args.threshold:
+                        regressions.append(f'{name}.{key}')
+            continue
+        p99 = _change(old['p99_ms'], new['p99_ms'])
+        rps = _change(old['rps'], new['rps'])
+        print(f"{name:<12}{old['p50_ms']:>8} -> {new['p50_ms']:<8}"
+              f"{old['p99_ms']:>10} -> {new['p99_ms']:<10}"
+              f"{old['rps']:>10} -> {new['rps']:<10}")
+        if (p99 is not None and p99 > args.threshold) or (rps is not None and rps < -args.threshold):
+            regressions.append(name)
+    if regressions:
+        print(f"regressed beyond {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Seed a database with a realistic topology at scale.
+
+The data follows the shape of ``Parking-system dump.sql``: lots with the full
+set of ``parkinglots_details`` columns, numbered floors, lettered rows,
+``<row><n>`` slot numbers, users, and parking sessions. Most sessions are
+closed, with realistic dwell times over the last 180 days; a small
+share is still open and holds its slot. Rows are written with Core
+``executemany`` batches into an empty schema, with ids assigned up front, so
+millions of sessions take minutes rather than hours::
+
+    python benchmarks/seed.py --database-url sqlite:////tmp/park.db --preset medium
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from _common import lot_payload
+
+PRESETS = {
+    # lots, floors/lot, rows/floor, slots/row, users, sessions
+    'small': (50, 3, 5, 20, 500, 50000),
+    'medium': (1000, 3, 10, 10, 20000, 1000000),
+    'large': (3000, 4, 10, 10, 100000, 5000000),
+}
+BATCH = 10000
+CITIES = ['New Delhi', 'Mumbai', 'Bengaluru', 'Chennai', 'Hyderabad', 'Pune', 'Kolkata']
+
+
+def _batched(conn, table, rows):
+    for start in range(0, len(rows), BATCH):
+        conn.execute(table.insert(), rows[start:start + BATCH])
+
+
+def seed(engine, metadata, lots, floors, rows, slots, users, sessions, days=180,
+         open_ratio=0.02, seed_value=1801):
+    """Fill an empty schema and return a summary dict."""
+    rng = random.Random(seed_value)
+    t = metadata.tables
+    started = time.perf_counter()
+    slots_per_lot = floors * rows * slots
+    now = datetime.utcnow().replace(microsecond=0)
+
+    lot_rows = []
+    for parking_id in range(1, lots + 1):
+        city = CITIES[parking_id % len(CITIES)]
+        lot = lot_payload(parking_name=f'{city} Lot {parking_id}', city=city,
+                          latitude=8 + rng.random() * 25, longitude=68 + rng.random() * 29,
+                          total_slots=slots_per_lot, available_slots=slots_per_lot)
+        lot['parking_id'] = parking_id
+        lot_rows.append(lot)
+
+    floor_rows, row_rows, slot_rows = [], [], []
+    floor_id = row_id = slot_id = 0
+    for parking_id in range(1, lots + 1):
+        for f in range(floors):
+            floor_id += 1
+            floor_rows.append({'floor_id': floor_id, 'parking_id': parking_id,
+                               'floor_number': str(f + 1), 'total_slots': rows * slots,
+                               'available_slots': rows * slots})
+            for r in range(rows):
+                row_id += 1
+                letter = chr(65 + r % 26)
+                row_rows.append({'row_id': row_id, 'parking_id': parking_id,
+                                 'floor_id': floor_id, 'row_number': letter})
+                for s in range(slots):
+                    slot_id += 1
+                    slot_rows.append({'slot_id': slot_id, 'parking_id': parking_id,
+                                      'row_id': row_id, 'slot_number': f'{letter}{s + 1}',
+                                      'is_available': True})
+
+    # Open sessions hold distinct slots, which are then unavailable, and the
+    # denormalised floor/lot counters reflect that.
+    open_count = min(int(sessions * open_ratio), len(slot_rows))
+    open_slots = rng.sample(range(len(slot_rows)), open_count)
+    for index in open_slots:
+        slot = slot_rows[index]
+        slot['is_available'] = False
+        floor_rows[row_rows[slot['row_id'] - 1]['floor_id'] - 1]['available_slots'] -= 1
+        lot_rows[slot['parking_id'] - 1]['available_slots'] -= 1
+
+    user_rows = [{'user_id': u, 'username': f'user{u}', 'password': f'password{u}',
+                  'email': f'user{u}@example.com', 'phone': f'9{u:09d}',
+                  'created_at': now - timedelta(days=days)} for u in range(1, users + 1)]
+
+    with engine.begin() as conn:
+        _batched(conn, t['parkinglots_details'], lot_rows)
+        _batched(conn, t['floors'], floor_rows)
+        _batched(conn, t['parking_rows'], row_rows)
+        _batched(conn, t['slots'], slot_rows)
+        _batched(conn, t['users'], user_rows)
+
+        session_rows = []
+        horizon = days * 86400
+        for session_id in range(1, sessions + 1):
+            if session_id <= open_count:
+                slot = slot_rows[open_slots[session_id - 1]]
+                entry = now - timedelta(seconds=rng.randint(60, 8 * 3600))
+                exit_time = None
+            else:
+                slot = slot_rows[rng.randrange(len(slot_rows))]
+                entry = now - timedelta(seconds=rng.randint(8 * 3600, horizon))
+                exit_time = entry + timedelta(seconds=int(rng.lognormvariate(8.2, 0.9)) + 300)
+            session_rows.append({
+                'session_id': session_id, 'user_id': rng.randint(1, users),
+                'parking_id': slot['parking_id'], 'slot_id': slot['slot_id'],
+                'entry_time': entry, 'exit_time': exit_time,
+                'car_number': f'{CITIES[session_id % 7][:2].upper()}{rng.randint(1, 99):02d}'
+                              f'{chr(65 + rng.randrange(26))}{rng.randint(1, 9999):04d}',
+                'payment_status': 'paid' if exit_time else None})
+            if len(session_rows) == BATCH:
+                conn.execute(t['parkingsessions'].insert(), session_rows)
+                session_rows = []
+        if session_rows:
+            conn.execute(t['parkingsessions'].insert(), session_rows)
+
+    return {'lots': lots, 'floors': len(floor_rows), 'rows': len(row_rows),
+            'slots': len(slot_rows), 'users': users, 'sessions': sessions,
+            'open_sessions': open_count, 'seconds': round(time.perf_counter() - started, 1)}
+
+
+def create_seeded_app(database_url, preset='small', **overrides):
+    """Create the app against ``database_url`` and seed it if it is empty."""
+    from app import create_app, db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url,
+                      'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+                      'SQLALCHEMY_ENGINE_OPTIONS': (
+                          {'connect_args': {'timeout': 30}} if database_url.startswith('sqlite') else {}),
+                      **overrides})
+    summary = None
+    with app.app_context():
+        db.create_all()
+        empty = db.session.execute(db.text('SELECT COUNT(*) FROM parkinglots_details')).scalar() == 0
+        if empty:
+            summary = seed(db.engine, db.metadata, *PRESETS[preset])
+    return app, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    args = parser.parse_args()
+    _, summary = create_seeded_app(args.database_url, args.preset)
+    print(summary or 'database already seeded; nothing to do')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Bulk import of a lot layout (floors -> rows -> slots) in one transaction.
+
+A layout is given either as nested JSON::
+
+    {"floors": [{"floor_number": "1",
+                 "rows": [{"row_number": "A", "slots": ["A1", "A2"]},
+                          {"row_number": "B", "slots": 40}]}]}
+
+where ``slots`` is a list of slot numbers or a count (numbered
+``<row_number><n>``), or as CSV with a ``floor_number,row_number,slot_number``
+header and one line per slot.
+
+Floors are inserted one statement each (there are only a handful). Rows and
+slots are inserted with a single executemany per table, and their generated
+ids are read back with one SELECT per table, keyed on the parent ids that
+were just created.
+"""
+import csv
+import io
+
+from sqlalchemy import insert, select
+
+MAX_IMPORT_SLOTS = 50000
+
+
+class LayoutError(ValueError):
+    """Raised for a malformed or oversized layout."""
+
+
+def _add(layout, floor_number, row_number, slot_numbers):
+    rows = layout.setdefault(str(floor_number), {})
+    slots = rows.setdefault(str(row_number), [])
+    slots.extend(str(n) for n in slot_numbers)
+
+
+def parse_json_layout(data):
+    """Return ``{floor_number: {row_number: [slot_number, ...]}}``."""
+    if not isinstance(data, dict) or not isinstance(data.get('floors'), list):
+        raise LayoutError("Layout must be an object with a 'floors' list")
+    layout = {}
+    for floor in data['floors']:
+        if not isinstance(floor, dict) or floor.get('floor_number') in (None, ''):
+            raise LayoutError("Every floor needs a 'floor_number'")
+        if str(floor['floor_number']) in layout:
+            raise LayoutError(f"Duplicate floor_number '{floor['floor_number']}'")
+        layout[str(floor['floor_number'])] = {}
+        for row in floor.get('rows', []):
+            if not isinstance(row, dict) or row.get('row_number') in (None, ''):
+                raise LayoutError("Every row needs a 'row_number'")
+            row_number = str(row['row_number'])
+            if row_number in layout[str(floor['floor_number'])]:
+                raise LayoutError(f"Duplicate row_number '{row_number}' on floor '{floor['floor_number']}'")
+            slots = row.get('slots', [])
+            if isinstance(slots, int) and not isinstance(slots, bool):
+                if slots < 0:
+                    raise LayoutError("'slots' count must not be negative")
+                slots = [f'{row_number}{n}' for n in range(1, slots + 1)]
+            elif not isinstance(slots, list):
+                raise LayoutError("'slots' must be a list of slot numbers or a count")
+            _add(layout, floor['floor_number'], row_number, slots)
+    return _validated(layout)
+
+
+def parse_csv_layout(text):
+    reader = csv.DictReader(io.StringIO(text))
+    required = {'floor_number', 'row_number', 'slot_number'}
+    if not reader.fieldnames or not required <= {f.strip() for f in reader.fieldnames}:
+        raise LayoutError('CSV layout needs a floor_number,row_number,slot_number header')
+    layout = {}
+    for line in reader:
+        line = {k.strip(): (v or '').strip() for k, v in line.items() if k}
+        if not all(line[k] for k in required):
+            raise LayoutError(f'Incomplete CSV line {reader.line_num}')
+        _add(layout, line['floor_number'], line['row_number'], [line['slot_number']])
+    return _validated(layout)
+
+
+def _validated(layout):
+    total = 0
+    for rows in layout.values():
+        for row_number, slots in rows.items():
+            if len(set(slots)) != len(slots):
+                raise LayoutError(f"Duplicate slot_number in row '{row_number}'")
+            total += len(slots)
+    if total > MAX_IMPORT_SLOTS:
+        raise LayoutError(f'A layout may contain at most {MAX_IMPORT_SLOTS} slots')
+    return layout
+
+
+def import_layout(session, Floor, Row, Slot, parking_id, layout):
+    """Insert ``layout`` under ``parking_id`` and return the generated ids.
+
+    The caller owns the transaction (commit or rollback).
+    """
+    floors_t, rows_t, slots_t = Floor.__table__, Row.__table__, Slot.__table__
+
+    floor_ids = {}
+    for floor_number, rows in layout.items():
+        total = sum(len(slots) for slots in rows.values())
+        result = session.execute(insert(floors_t).values(
+            parking_id=parking_id, floor_number=floor_number,
+            total_slots=total, available_slots=total))
+        floor_ids[floor_number] = result.inserted_primary_key[0]
+
+    row_params = [{'parking_id': parking_id, 'floor_id': floor_ids[floor_number],
+                   'row_number': row_number}
+                  for floor_number, rows in layout.items() for row_number in rows]
+    row_ids = {}
+    if row_params:
+        session.execute(insert(rows_t), row_params)
+        for row_id, floor_id, row_number in session.execute(
+                select(rows_t.c.row_id, rows_t.c.floor_id, rows_t.c.row_number)
+                .where(rows_t.c.floor_id.in_(list(floor_ids.values())))):
+            row_ids[(floor_id, row_number)] = row_id
+
+    slot_params = []
+    for floor_number, rows in layout.items():
+        for row_number, slots in rows.items():
+            row_id = row_ids[(floor_ids[floor_number], row_number)]
+            slot_params.extend({'parking_id': parking_id, 'row_id': row_id,
+                                'slot_number': n, 'is_available': True} for n in slots)
+    slot_ids = {}
+    if slot_params:
+        session.execute(insert(slots_t), slot_params)
+        for slot_id, row_id, slot_number in session.execute(
+                select(slots_t.c.slot_id, slots_t.c.row_id, slots_t.c.slot_number)
+                .where(slots_t.c.row_id.in_(list(row_ids.values())))
+                .order_by(slots_t.c.slot_id)):
+            slot_ids[(row_id, slot_number)] = slot_id
+
+    result = []
+    for floor_number, rows in layout.items():
+        floor_id = floor_ids[floor_number]
+        result.append({
+            'floor_id': floor_id,
+            'floor_number': floor_number,
+            'rows': [{
+                'row_id': row_ids[(floor_id, row_number)],
+                'row_number': row_number,
+                'slot_ids': [slot_ids[(row_ids[(floor_id, row_number)], n)] for n in slots]
+            } for row_number, slots in rows.items()]
+        })
+    return result
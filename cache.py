@@ -0,0 +1,156 @@
+"""Read-through caches for rarely changing data such as the lot topology.
+
+Two interchangeable backends share the same small interface
+(``get``/``set``/``delete``/``clear``/``get_or_load``/``stats``):
+
+* ``LRUCache`` - in-process, bounded, with a per-entry TTL.
+* ``RedisCache`` - any client exposing Redis' ``get``/``set(ex=)``/``delete``;
+  values are stored as JSON so every worker process shares one cache.
+
+``create_cache`` picks one from the app config. Writers are expected to call
+``delete`` for the keys they make stale; the TTL only bounds how long an
+entry can survive a missed invalidation.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LRUCache:
+
+    backend = 'memory'
+
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value):
+        expires = self._clock() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        return {'backend': self.backend, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': size, 'maxsize': self.maxsize}
+
+
+class RedisCache:
+
+    backend = 'redis'
+
+    def __init__(self, client, ttl=300, prefix='parkvision:cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        self._count(raw is not None)
+        if raw is None:
+            return MISSING
+        return json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        return {'backend': self.backend, 'hits': self.hits, 'misses': self.misses}
+
+
+class NullCache(LRUCache):
+    """Never stores anything; every lookup is a miss."""
+
+    backend = 'none'
+
+    def __init__(self):
+        super().__init__(maxsize=0, ttl=0)
+
+    def set(self, key, value):
+        pass
+
+
+def create_cache(config, prefix='TOPOLOGY_CACHE'):
+    """Build the cache configured under ``<prefix>``/``<prefix>_*`` keys."""
+    backend = config.get(prefix, 'memory')
+    ttl = config.get(f'{prefix}_TTL', 300)
+    if backend == 'memory':
+        return LRUCache(maxsize=config.get(f'{prefix}_SIZE', 1024), ttl=ttl)
+    if backend == 'redis':
+        if not config.get(f'{prefix}_REDIS_URL'):
+            raise ValueError(f'{prefix}=redis needs {prefix}_REDIS_URL')
+        import redis  # optional dependency, only needed for this backend
+        client = redis.Redis.from_url(config[f'{prefix}_REDIS_URL'])
+        return RedisCache(client, ttl=ttl, prefix=f'parkvision:{prefix.lower()}:')
+    if backend in ('none', None):
+        return NullCache()
+    raise ValueError(f'Unknown {prefix} backend: {backend!r}')
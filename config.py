@@ -0,0 +1,224 @@
+"""Database configuration loaded from the environment.
+
+``DATABASE_URL`` wins if set; otherwise the MySQL URL is assembled from
+``MYSQL_USER``, ``MYSQL_PASSWORD``, ``MYSQL_HOST``, ``MYSQL_PORT`` and
+``MYSQL_DATABASE`` (defaults match the original local setup).
+``DATABASE_REPLICA_URL`` adds a read replica used by the read-only GET
+endpoints. ``ASYNC_DATABASE_URL`` overrides the URL the async read path
+(async_reads.py) derives from those.
+
+Pool tuning (ignored for SQLite, which does not use a QueuePool):
+
+* ``DB_POOL_SIZE`` (default 10) and ``DB_MAX_OVERFLOW`` (default 20)
+* ``DB_POOL_TIMEOUT`` seconds to wait for a connection (default 30)
+* ``DB_POOL_RECYCLE`` seconds before a connection is replaced (default 1800,
+  below MySQL's ``wait_timeout``)
+* ``DB_POOL_PRE_PING`` - test connections on checkout (default on)
+
+Request instrumentation (see instrumentation.py) is off unless
+``INSTRUMENTATION`` is set; ``SLOW_REQUEST_MS`` (default 500) and
+``PROFILE_SAMPLE_RATE`` (default 0, a fraction of requests) control the
+slow-request profiler.
+
+Caches (see cache.py): ``TOPOLOGY_CACHE`` is ``memory`` (default), ``redis``
+(with ``TOPOLOGY_CACHE_REDIS_URL``, shared by all workers) or ``none``;
+``TOPOLOGY_CACHE_SIZE`` (default 1024 entries, memory only) and
+``TOPOLOGY_CACHE_TTL`` (default 300 seconds) bound it. The response cache
+(see response_cache.py) takes the same ``RESPONSE_CACHE*`` settings (default
+2048 entries, 60 seconds) plus ``RESPONSE_CACHE_MAX_AGE`` (default 5), the
+client-side max-age of the lot listing.
+
+``AVAILABILITY_REFRESH_SECONDS`` (default 30, 0 = never) is how often each
+worker rebuilds its free-slot counts to pick up other workers' bookings.
+
+Slot change feed (see events.py): ``SLOT_EVENTS_REDIS_URL`` shares it
+between workers, ``SLOT_EVENTS_MAX_STREAMS`` (default 4) caps the open SSE
+streams and long polls per process, ``SLOT_EVENTS_BUFFER`` (default 1024)
+and ``SLOT_EVENTS_HEARTBEAT`` (default 15 seconds) tune it.
+
+The session archive job (archive.py) moves sessions that ended more than
+``SESSION_ARCHIVE_DAYS`` (default 90) days ago, ``SESSION_ARCHIVE_BATCH``
+(default 5000) per transaction.
+
+Occupancy analytics (see analytics.py): ``ANALYTICS_REFRESH_ON_READ``
+(default off; run ``python analytics.py`` from cron) extends the rollup from
+``GET /analytics/occupancy``, by at most ``ANALYTICS_REFRESH_MAX_HOURS``
+(default 168) hours per request.
+
+Password hashing (see passwords.py): scrypt cost ``PASSWORD_SCRYPT_N``
+(default 16384, a power of two), ``PASSWORD_SCRYPT_R`` (8) and
+``PASSWORD_SCRYPT_P`` (1); ``PASSWORD_HASH_WORKERS`` (4) threads and
+``PASSWORD_HASH_QUEUE`` (64) waiting requests per process.
+"""
+import os
+import urllib.parse
+
+
+def _int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _bool(environ, name, default):
+    value = environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _float(environ, name, default):
+    value = environ.get(name)
+    return float(value) if value not in (None, '') else default
+
+
+def database_url(environ):
+    if environ.get('DATABASE_URL'):
+        return environ['DATABASE_URL']
+    username = environ.get('MYSQL_USER', 'root')
+    password = urllib.parse.quote_plus(environ.get('MYSQL_PASSWORD', 'mysql'))
+    host = environ.get('MYSQL_HOST', 'localhost')
+    port = _int(environ, 'MYSQL_PORT', 3306)
+    database_name = environ.get('MYSQL_DATABASE', 'parking_system')
+    return f"mysql://{username}:{password}@{host}:{port}/{database_name}"
+
+
+def engine_options(url, environ):
+    options = {'pool_pre_ping': _bool(environ, 'DB_POOL_PRE_PING', True)}
+    if not url.startswith('sqlite'):
+        options.update({
+            'pool_size': _int(environ, 'DB_POOL_SIZE', 10),
+            'max_overflow': _int(environ, 'DB_MAX_OVERFLOW', 20),
+            'pool_timeout': _int(environ, 'DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _int(environ, 'DB_POOL_RECYCLE', 1800),
+        })
+    return options
+
+
+def database_config(environ=None):
+    """Return the ``SQLALCHEMY_*`` settings for ``environ`` (os.environ)."""
+    environ = os.environ if environ is None else environ
+    url = database_url(environ)
+    config = {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(url, environ),
+    }
+    replica_url = environ.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        config['SQLALCHEMY_BINDS'] = {'replica': replica_url}
+    if environ.get('ASYNC_DATABASE_URL'):
+        config['ASYNC_DATABASE_URI'] = environ['ASYNC_DATABASE_URL']
+    return config
+
+
+def cache_config(environ=None, prefix='TOPOLOGY_CACHE', size=1024, ttl=300):
+    """Return the ``<prefix>*`` settings of one cache for ``environ``."""
+    environ = os.environ if environ is None else environ
+    config = {
+        prefix: environ.get(prefix, 'memory'),
+        f'{prefix}_SIZE': _int(environ, f'{prefix}_SIZE', size),
+        f'{prefix}_TTL': _int(environ, f'{prefix}_TTL', ttl),
+    }
+    if environ.get(f'{prefix}_REDIS_URL'):
+        config[f'{prefix}_REDIS_URL'] = environ[f'{prefix}_REDIS_URL']
+    return config
+
+
+def response_cache_config(environ=None):
+    """Return the response cache settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    config = cache_config(environ, prefix='RESPONSE_CACHE', size=2048, ttl=60)
+    config['RESPONSE_CACHE_MAX_AGE'] = _int(environ, 'RESPONSE_CACHE_MAX_AGE', 5)
+    return config
+
+
+def availability_config(environ=None):
+    """Return the live availability settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    return {'AVAILABILITY_REFRESH_SECONDS': _float(environ, 'AVAILABILITY_REFRESH_SECONDS', 30)}
+
+
+def events_config(environ=None):
+    """Return the slot change feed settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    config = {
+        'SLOT_EVENTS_BUFFER': _int(environ, 'SLOT_EVENTS_BUFFER', 1024),
+        'SLOT_EVENTS_HEARTBEAT': _float(environ, 'SLOT_EVENTS_HEARTBEAT', 15),
+        'SLOT_EVENTS_MAX_STREAMS': _int(environ, 'SLOT_EVENTS_MAX_STREAMS', 4),
+    }
+    if environ.get('SLOT_EVENTS_REDIS_URL'):
+        config['SLOT_EVENTS_REDIS_URL'] = environ['SLOT_EVENTS_REDIS_URL']
+    return config
+
+
+def password_config(environ=None):
+    """Return the password hashing settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    config = {
+        'PASSWORD_SCRYPT_N': _int(environ, 'PASSWORD_SCRYPT_N', 2 ** 14),
+        'PASSWORD_SCRYPT_R': _int(environ, 'PASSWORD_SCRYPT_R', 8),
+        'PASSWORD_SCRYPT_P': _int(environ, 'PASSWORD_SCRYPT_P', 1),
+        'PASSWORD_HASH_WORKERS': _int(environ, 'PASSWORD_HASH_WORKERS', 4),
+        'PASSWORD_HASH_QUEUE': _int(environ, 'PASSWORD_HASH_QUEUE', 64),
+    }
+    n = config['PASSWORD_SCRYPT_N']
+    if n < 2 or n & (n - 1):
+        raise ValueError('PASSWORD_SCRYPT_N must be a power of two greater than 1')
+    return config
+
+
+def instrumentation_config(environ=None):
+    """Return the request instrumentation settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    return {
+        'INSTRUMENTATION': _bool(environ, 'INSTRUMENTATION', False),
+        'SLOW_REQUEST_MS': _float(environ, 'SLOW_REQUEST_MS', 500),
+        'PROFILE_SAMPLE_RATE': _float(environ, 'PROFILE_SAMPLE_RATE', 0.0),
+    }
+
+
+def admission_config(environ=None):
+    """Return the admission control settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    config = {
+        'ADMISSION_CONTROL': _bool(environ, 'ADMISSION_CONTROL', False),
+        'ADMISSION_BACKEND': environ.get('ADMISSION_BACKEND', 'memory'),
+        'ADMISSION_MAX_EXPENSIVE': _int(environ, 'ADMISSION_MAX_EXPENSIVE', 8),
+    }
+    if environ.get('ADMISSION_REDIS_URL'):
+        config['ADMISSION_REDIS_URL'] = environ['ADMISSION_REDIS_URL']
+    for name, rate, burst in (('PARK_CLIENT', 5, 20), ('PARK_LOT', 50, 100),
+                              ('LOGIN_CLIENT', 1, 10)):
+        config[f'ADMISSION_{name}_RATE'] = _float(environ, f'ADMISSION_{name}_RATE', rate)
+        config[f'ADMISSION_{name}_BURST'] = _float(environ, f'ADMISSION_{name}_BURST', burst)
+    return config
+
+
+def archive_config(environ=None):
+    """Return the session archive job settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    return {
+        'SESSION_ARCHIVE_DAYS': _int(environ, 'SESSION_ARCHIVE_DAYS', 90),
+        'SESSION_ARCHIVE_BATCH': _int(environ, 'SESSION_ARCHIVE_BATCH', 5000),
+    }
+
+
+def analytics_config(environ=None):
+    """Return the occupancy analytics settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    return {
+        'ANALYTICS_REFRESH_ON_READ': _bool(environ, 'ANALYTICS_REFRESH_ON_READ', False),
+        'ANALYTICS_REFRESH_MAX_HOURS': _int(environ, 'ANALYTICS_REFRESH_MAX_HOURS', 168),
+    }
+
+
+def gate_config(environ=None):
+    """Return the gate group-commit settings for ``environ``."""
+    environ = os.environ if environ is None else environ
+    return {
+        'GATE_GROUP_COMMIT': _bool(environ, 'GATE_GROUP_COMMIT', False),
+        'GATE_BATCH_SIZE': _int(environ, 'GATE_BATCH_SIZE', 64),
+        'GATE_BATCH_WAIT_MS': _float(environ, 'GATE_BATCH_WAIT_MS', 0.0),
+        'GATE_QUEUE_SIZE': _int(environ, 'GATE_QUEUE_SIZE', 1024),
+        'GATE_COMMIT_TIMEOUT': _float(environ, 'GATE_COMMIT_TIMEOUT', 10),
+    }
@@ -0,0 +1,184 @@
+"""Fan-out of slot availability changes.
+
+``EventFeed`` keeps the most recent events in a bounded ring buffer, each
+with a monotonically increasing id and its JSON payload encoded once at
+publish time. Subscribers do not get their own queues: they block on one
+shared condition variable and read whatever is newer than the last id they
+saw. Publishing therefore costs the same with one subscriber or a thousand,
+and no subscriber ever queries the database.
+
+A subscriber that falls further behind than the buffer holds gets
+``reset=True`` and should reload the full state (e.g. ``/availability/``).
+
+The buffer belongs to one process. With several workers, set
+``SLOT_EVENTS_REDIS_URL``: events are then published through Redis
+(``RedisEventRelay``), ids come from one shared counter, and every worker's
+feed receives every change, whichever worker booked it. Without Redis each
+worker only sees its own bookings, so the feed is only complete with
+``WEB_CONCURRENCY=1``.
+
+Every SSE stream and long poll holds a server thread for as long as it is
+open, so each process admits at most ``SLOT_EVENTS_MAX_STREAMS`` of them;
+the next one gets ``FeedBusy`` (503).
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Take the next id and publish under it in one step, so ids reach every
+# subscriber in order.
+_PUBLISH_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', KEYS[2], id .. ' ' .. ARGV[1])
+return id
+"""
+
+
+class FeedBusy(RuntimeError):
+    """Raised when a process already serves its maximum of feed subscribers."""
+
+
+class EventFeed:
+
+    def __init__(self, capacity=1024, max_subscribers=None):
+        self._events = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self.last_id = 0
+        self.relay = None
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+
+    def publish(self, event):
+        data = json.dumps(event, separators=(',', ':'))
+        if self.relay is not None:
+            return self.relay.publish(data)
+        with self._cond:
+            self.last_id += 1
+            self._append(self.last_id, event, data)
+        return self.last_id
+
+    def receive(self, event_id, data):
+        """Add an event published under ``event_id`` by any process."""
+        with self._cond:
+            if event_id <= self.last_id:
+                return
+            if event_id != self.last_id + 1:
+                # Events were missed (e.g. while reconnecting): make every
+                # subscriber that is behind reload the full state.
+                self._events.clear()
+            self.last_id = event_id
+            self._append(event_id, json.loads(data), data)
+
+    def _append(self, event_id, event, data):
+        self._events.append((event_id, event, data))
+        self._cond.notify_all()
+
+    def subscribe(self):
+        """Count a new SSE/long-poll subscriber or raise ``FeedBusy``."""
+        with self._cond:
+            if self.max_subscribers and self.subscribers >= self.max_subscribers:
+                raise FeedBusy('Too many slot feed subscribers')
+            self.subscribers += 1
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def _connect(self):
+        if self.relay is not None:
+            self.relay.ensure_started()
+
+    def since(self, last_id):
+        """Return ``(events, reset)`` for everything newer than ``last_id``.
+
+        ``events`` is a list of ``(id, event, data)`` tuples.
+        """
+        self._connect()
+        with self._cond:
+            return self._since(last_id)
+
+    def _since(self, last_id):
+        if last_id > self.last_id:
+            # The client saw ids from an earlier process; start over.
+            return [], True
+        if last_id == self.last_id:
+            return [], False
+        oldest = self._events[0][0] if self._events else self.last_id + 1
+        reset = last_id < oldest - 1
+        events = [e for e in self._events if e[0] > last_id]
+        return events, reset
+
+    def wait(self, last_id, timeout):
+        """Like ``since`` but block up to ``timeout`` seconds for new events."""
+        self._connect()
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_id != last_id, timeout)
+            return self._since(last_id)
+
+
+class RedisEventRelay:
+    """Publishes a feed's events through Redis and feeds back everyone's.
+
+    One listener thread per process, started on first use (so a forking
+    server starts it in each worker), delivers the channel into the local
+    ``EventFeed``; the SSE and long-poll subscribers never talk to Redis.
+    """
+
+    def __init__(self, client, feed, channel='parkvision:slot-events'):
+        self._client = client
+        self._feed = feed
+        self._channel = channel
+        self._counter = channel + ':last-id'
+        self._script = client.register_script(_PUBLISH_SCRIPT)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, data):
+        self.ensure_started()
+        return int(self._script(keys=[self._counter, self._channel], args=[data]))
+
+    def ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    pubsub = self._subscribe()
+                    self._thread = threading.Thread(target=self._run, args=(pubsub,),
+                                                    name='slot-events-relay', daemon=True)
+                    self._thread.start()
+
+    def _subscribe(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self._channel)
+        # Subscribed first, so nothing after this id can be missed.
+        start = int(self._client.get(self._counter) or 0)
+        if self._feed.last_id == 0:
+            self._feed.last_id = start
+        return pubsub
+
+    def _run(self, pubsub):
+        while True:
+            try:
+                for message in pubsub.listen():
+                    raw = message['data']
+                    event_id, _, data = (raw.decode() if isinstance(raw, bytes) else raw) \
+                        .partition(' ')
+                    self._feed.receive(int(event_id), data)
+            except Exception:
+                logger.exception('Slot event relay lost its Redis subscription')
+            time.sleep(1)
+            try:
+                pubsub = self._subscribe()
+            except Exception:
+                logger.exception('Slot event relay could not resubscribe')
+
+
+def create_event_feed(config):
+    feed = EventFeed(config['SLOT_EVENTS_BUFFER'], config['SLOT_EVENTS_MAX_STREAMS'])
+    if config.get('SLOT_EVENTS_REDIS_URL'):
+        import redis  # optional dependency, only needed for the shared feed
+        feed.relay = RedisEventRelay(redis.Redis.from_url(config['SLOT_EVENTS_REDIS_URL']), feed)
+    return feed
@@ -0,0 +1,73 @@
+"""Streaming NDJSON export of large tables.
+
+Rows are read through a server-side cursor (``stream_results``) and fetched
+``EXPORT_CHUNK_SIZE`` at a time; every chunk is encoded and handed to the
+WSGI server before the next one is fetched, so memory use does not depend on
+the size of the table. A hot table and its archive can be streamed as one,
+merged by primary key (``ndjson_tiered_export``).
+"""
+import heapq
+import itertools
+from contextlib import ExitStack
+
+from flask import Response, current_app, request
+
+from formatting import row_serializer
+from pagination import page_args, page_statement, parse_fields
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+EXPORT_CHUNK_SIZE = 1000
+
+
+def wants_ndjson():
+    """True when the client prefers NDJSON over a JSON document."""
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def ndjson_export(model, default_fields, formatters=None, exclude=(),
+                  chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream ``model`` rows as one JSON object per line.
+
+    Honours the same ``fields``/``after``/``limit`` arguments as the paginated
+    list endpoints.
+    """
+    return ndjson_tiered_export([model], default_fields, formatters=formatters,
+                                exclude=exclude, chunk_size=chunk_size)
+
+
+def ndjson_tiered_export(models, default_fields, criteria=lambda model: (), formatters=None,
+                         exclude=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """``ndjson_export`` over tables that share their columns and primary key
+    space, such as a hot table and its archive.
+
+    ``criteria(model)`` returns the filters for one table. Each table is read
+    through its own cursor and the rows are merged by key.
+    """
+    fields = parse_fields(models[0], default_fields, exclude)
+    limit, after = page_args()
+    statements = [(model.query.session.get_bind(mapper=model.__mapper__),
+                   page_statement(model, fields, criteria(model), limit, after))
+                  for model in models]
+    encode = current_app.json.dumps
+    serialize = row_serializer(fields, formatters, offset=1)  # row[0] is the key
+
+    def stream(conn, stmt):
+        result = conn.execution_options(stream_results=True).execute(stmt)
+        for rows in result.partitions(chunk_size):
+            yield from rows
+
+    def generate():
+        with ExitStack() as connections:
+            rows = heapq.merge(*[stream(connections.enter_context(engine.connect()), stmt)
+                                 for engine, stmt in statements], key=lambda row: row[0])
+            rows = itertools.islice(rows, limit)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                lines = [encode(serialize(row)) for row in chunk]
+                lines.append('')
+                yield '\n'.join(lines).encode('utf-8')
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
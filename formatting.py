@@ -0,0 +1,53 @@
+"""Value formatting shared by the JSON views."""
+from functools import lru_cache
+
+HTTP_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+           'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+_TWO_DIGITS = tuple(f'{i:02d}' for i in range(61))
+
+
+@lru_cache(maxsize=4096)
+def _http_day(day):
+    return f'{_DAYS[day.weekday()]}, {_TWO_DIGITS[day.day]} {_MONTHS[day.month - 1]} {day.year:04d} '
+
+
+def http_date(value):
+    """``value.strftime(HTTP_DATE_FORMAT)``, several times faster.
+
+    The rows of a list share few distinct days, so the day part is cached
+    and only the clock is formatted per value. Unlike strftime the names do
+    not depend on the C locale.
+    """
+    return (f'{_http_day(value.date())}{_TWO_DIGITS[value.hour]}:'
+            f'{_TWO_DIGITS[value.minute]}:{_TWO_DIGITS[value.second]} GMT')
+
+
+@lru_cache(maxsize=256)
+def _compile_serializer(fields, formatters, offset):
+    formatters = dict(formatters)
+    namespace = {}
+    items = []
+    for i, name in enumerate(fields, offset):
+        if name in formatters:
+            fmt = f'_f{i}'
+            namespace[fmt] = formatters[name]
+            items.append(f'{name!r}: None if row[{i}] is None else {fmt}(row[{i}])')
+        else:
+            items.append(f'{name!r}: row[{i}]')
+    exec(f"def serialize(row):\n    return {{{', '.join(items)}}}\n", namespace)
+    return namespace['serialize']
+
+
+def row_serializer(fields, formatters=None, offset=0):
+    """Return a function turning a result row into a dict of ``fields``.
+
+    ``row[offset + i]`` is the value of ``fields[i]``; ``formatters`` maps
+    field names to functions applied to their non-null values. The function
+    is generated once per field list as a single dict display, which is about
+    twice as fast as filling a dict field by field.
+    """
+    formatters = sorted((name, fmt) for name, fmt in (formatters or {}).items() if name in fields)
+    return _compile_serializer(tuple(fields), tuple(formatters), offset)
@@ -0,0 +1,176 @@
+"""Group commit for gate entries and exits.
+
+With ``GATE_GROUP_COMMIT`` on, ``/Park_car/``, ``/Park_car/auto`` and
+``/Remove_car/<id>/exit`` do not commit themselves. They put their event on
+a bounded queue and wait. One writer thread drains the queue: it applies
+every event queued so far (up to ``GATE_BATCH_SIZE``, optionally waiting
+``GATE_BATCH_WAIT_MS`` for more) in a single transaction through the
+booking engine's ``stage_*`` methods, commits once, and only then answers
+each waiting request. A burst of N gate events therefore costs one fsync
+per batch instead of N, and a client still gets its session id only once
+the booking is durable.
+
+If a batch fails (a bad user id, a lost connection) it is rolled back and
+its events are retried one transaction each, so one bad event only fails
+its own request. An error after the commit (an ``after_commit`` callback,
+say a failed Redis publish) is logged and does not fail the event; any
+other error fails the events of that batch and the writer carries on. A full queue is refused with ``GateBusy`` (503 with
+``Retry-After``). So is an event that is still queued when its request has
+waited ``GATE_COMMIT_TIMEOUT`` seconds; the event is then dropped, never
+applied late. Queue depth, rejections, batch sizes and commit time are
+exported on ``/metrics``.
+
+Each process has its own writer; the database still arbitrates between
+workers with the same conditional updates as the direct path.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from models import ParkingSession, db
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+logger = logging.getLogger(__name__)
+
+# What a gate request gets back for a booking: plain values, since the
+# ORM object belongs to the writer thread's session.
+Booking = namedtuple('Booking', 'session_id slot_id')
+
+
+class GateBusy(RuntimeError):
+    """Raised when a gate event cannot be queued or committed in time."""
+
+
+def _empty(operation):
+    """The result of an event that changed nothing, as the direct path returns it."""
+    return False if operation == 'release' else None
+
+
+def _detach(result):
+    if isinstance(result, ParkingSession):
+        return Booking(result.session_id, result.slot_id)
+    return result
+
+
+class GateWriter:
+
+    def __init__(self, app, operations, metrics, batch_size=64, batch_wait=0.0,
+                 queue_size=1024, timeout=10):
+        # operations: name -> stage function returning (result, after_commit) or None
+        self._app = app
+        self._operations = operations
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self._events = metrics.counter(
+            'gate_events_total', 'Gate events processed, by operation.', ['operation'])
+        self._rejected = metrics.counter(
+            'gate_rejected_total', 'Gate events refused with 503, by reason.', ['reason'])
+        self._batch_sizes = metrics.histogram(
+            'gate_batch_size', 'Gate events per group commit.', buckets=BATCH_BUCKETS)
+        self._commit_seconds = metrics.histogram(
+            'gate_commit_seconds', 'Time to apply and commit one gate batch.')
+        self._wait_seconds = metrics.histogram(
+            'gate_wait_seconds', 'Time a gate request waited for its batch to commit.')
+        metrics.register(self.queue_metrics)
+
+    def queue_metrics(self):
+        return [('gate_queue_depth', 'gauge', 'Gate events waiting for the writer.',
+                 [({}, self._queue.qsize())])]
+
+    def _ensure_started(self):
+        # Started on first use, so a forking server starts it in each worker.
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='gate-writer',
+                                                    daemon=True)
+                    self._thread.start()
+
+    def submit(self, operation, *args):
+        """Queue one event and return its result once it is committed."""
+        self._ensure_started()
+        future = Future()
+        started = time.perf_counter()
+        try:
+            self._queue.put_nowait((operation, args, future))
+        except queue.Full:
+            self._rejected.inc(reason='queue_full')
+            raise GateBusy('Gate queue is full')
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if not future.cancel():  # its batch is being committed right now
+                try:
+                    return future.result(timeout=self.timeout)
+                except FutureTimeout:
+                    pass
+            self._rejected.inc(reason='timeout')
+            raise GateBusy('Gate event was not committed in time')
+        finally:
+            self._wait_seconds.observe(time.perf_counter() - started)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [item for item in batch if item[2].set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                with self._app.app_context():
+                    self._write(batch)
+            except Exception as error:
+                logger.exception('Gate writer failed a batch')
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+
+    def _apply(self, batch):
+        staged = [self._operations[operation](*args) for operation, args, _ in batch]
+        db.session.flush()  # assigns the new session ids
+        results = [_detach(item[0]) if item else None for item in staged]
+        db.session.commit()
+        return staged, results
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            staged, results = self._apply(batch)
+        except Exception as error:
+            db.session.rollback()
+            if len(batch) == 1:
+                batch[0][2].set_exception(error)
+            else:  # one transaction per event, so only the bad one fails
+                for item in batch:
+                    self._write([item])
+            return
+        self._commit_seconds.observe(time.perf_counter() - started)
+        self._batch_sizes.observe(len(batch))
+        for (operation, _, future), item, result in zip(batch, staged, results):
+            if item is not None:
+                try:
+                    item[1]()
+                except Exception:  # the event is committed; only derived state lags
+                    logger.exception('Gate after_commit callback failed')
+            self._events.inc(operation=operation)
+            future.set_result(result if result is not None else _empty(operation))
@@ -0,0 +1,117 @@
+"""Grid-bucket spatial index for nearest-lot searches.
+
+Lots are hashed into fixed-size latitude/longitude cells (``cell_degrees``,
+about 5.5 km at the default). A radius query only visits the cells that
+overlap the search circle's bounding box and computes the exact haversine
+distance for the lots in them, so its cost depends on how many lots are
+near the point, not on how many lots exist.
+"""
+import math
+import threading
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _coordinates(lat, lon):
+    """Parse a stored lat/lon pair; None when missing or out of range."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class SpatialIndex:
+
+    def __init__(self, loader, cell_degrees=0.05):
+        # loader() -> iterable of (parking_id, latitude, longitude, payload)
+        self._loader = loader
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._points = {}
+        self._loaded = False
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def _insert(self, parking_id, lat, lon, payload):
+        self._remove(parking_id)
+        cell = self._cell(lat, lon)
+        self._points[parking_id] = (lat, lon, payload, cell)
+        self._cells.setdefault(cell, set()).add(parking_id)
+
+    def _remove(self, parking_id):
+        old = self._points.pop(parking_id, None)
+        if old is not None:
+            members = self._cells.get(old[3])
+            members.discard(parking_id)
+            if not members:
+                del self._cells[old[3]]
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        rows = list(self._loader())
+        with self._lock:
+            if self._loaded:
+                return
+            for parking_id, lat, lon, payload in rows:
+                point = _coordinates(lat, lon)
+                if point:
+                    self._insert(parking_id, point[0], point[1], payload)
+            self._loaded = True
+
+    def upsert(self, parking_id, lat, lon, payload):
+        point = _coordinates(lat, lon)
+        if not self._loaded or point is None:
+            return
+        with self._lock:
+            self._insert(parking_id, point[0], point[1], payload)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._points)
+
+    def nearby(self, lat, lon, radius_m, limit=None, predicate=None):
+        """Return ``[(distance_m, parking_id, payload)]`` sorted by distance."""
+        self._ensure_loaded()
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        coslat = max(math.cos(math.radians(lat)), 1e-6)
+        dlon = min(180.0, math.degrees(radius_m / (EARTH_RADIUS_M * coslat)))
+        lat_lo, lon_lo = self._cell(lat - dlat, lon - dlon)
+        lat_hi, lon_hi = self._cell(lat + dlat, lon + dlon)
+
+        results = []
+        with self._lock:
+            n_cells = (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1)
+            if n_cells > len(self._cells):
+                # Huge radius: walking the occupied cells is cheaper.
+                candidates = [pid for members in self._cells.values() for pid in members]
+            else:
+                candidates = []
+                for i in range(lat_lo, lat_hi + 1):
+                    for j in range(lon_lo, lon_hi + 1):
+                        members = self._cells.get((i, j))
+                        if members:
+                            candidates.extend(members)
+            points = [(pid, self._points[pid]) for pid in candidates]
+
+        for parking_id, (plat, plon, payload, _) in points:
+            if abs(plat - lat) > dlat:
+                continue
+            distance = haversine_m(lat, lon, plat, plon)
+            if distance <= radius_m and (predicate is None or predicate(parking_id, payload)):
+                results.append((distance, parking_id, payload))
+        results.sort(key=lambda r: r[0])
+        return results[:limit] if limit else results
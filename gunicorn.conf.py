@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+# Production server settings, all overridable from the environment:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+
+# Processes x threads. gthread workers let one process overlap DB waits and
+# hold the long-lived /slots/events and /slots/changes connections.
+# One process by default: the slot change feed, the caches and the admission
+# buckets are per process unless they are given a Redis backend (see the
+# README), so only raise WEB_CONCURRENCY (e.g. to 2 x CPUs + 1) once they are.
+workers = _env_int('WEB_CONCURRENCY', 1)
+worker_class = 'gthread'
+threads = _env_int('GUNICORN_THREADS', 8)
+
+# Import the app (create_app) once in the master and fork it into workers.
+preload_app = True
+
+# Keep-alive for clients behind a load balancer, and request timeouts.
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+# On SIGTERM workers stop accepting and get this long to finish in-flight requests.
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+
+# Recycle workers now and then to bound memory growth.
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 10000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 1000)
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Never share pooled DB connections opened in the master with the workers.
+    from app import db
+    from wsgi import app
+    with app.app_context():
+        db.engine.dispose()
+        # Exit-by-plate lookups should not pay for the initial load. Best
+        # effort: if the database is not up yet the index loads on first use,
+        # and a failed worker boot would stop the whole arbiter.
+        try:
+            app.extensions['parking'].open_sessions.warm()
+        except Exception:
+            server.log.exception('Worker %s could not warm the open-session index', worker.pid)
@@ -0,0 +1,299 @@
+"""Request metrics, SQL counters and slow-request profiles.
+
+``MetricsRegistry`` holds counters and histograms and renders them, together
+with anything returned by registered collector callables, in the Prometheus
+text format served at ``/metrics``. Other subsystems add their own numbers
+with ``registry.counter(...)``/``registry.histogram(...)`` or by registering a
+collector that reads its state at scrape time.
+
+``instrument(app, registry)`` is the opt-in per-request layer. For every
+request it records, labelled by method and URL rule (not the raw path, to
+keep the label set bounded):
+
+* ``http_requests_total`` by status and ``http_request_duration_seconds``
+* ``http_request_sql_queries`` and ``http_request_sql_seconds``, counted by
+  SQLAlchemy ``before/after_cursor_execute`` engine events (all binds)
+* ``http_response_size_bytes`` (not for streamed responses, whose length is
+  unknown when the view returns; their duration is also time to first byte)
+
+A sampled share of requests (``PROFILE_SAMPLE_RATE``) runs under cProfile;
+the profile is kept, in a small ring buffer served at ``/metrics/profiles``,
+only if the request took at least ``SLOW_REQUEST_MS``. Only one request per
+process is profiled at a time (from Python 3.12 a profiler is process-wide
+and a second one cannot start); sampled requests that find it busy run
+unprofiled. On 3.12+ a profile also includes the other threads' work.
+
+Numbers are per process: under gunicorn each worker reports its own.
+"""
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import Response, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation = name, documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[n]) for n in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation = name, documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(str(labels[n]) for n in self.labelnames))
+        return series[-1] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, hits in zip(self.buckets, series):
+                cumulative += hits
+                yield f'{self.name}_bucket', {**labels, 'le': _number(bound)}, cumulative
+            yield f'{self.name}_sum', labels, series[-2]
+            yield f'{self.name}_count', labels, series[-1]
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def register(self, collector):
+        """Add ``collector()``, called on every scrape.
+
+        It returns an iterable of ``(name, kind, documentation, samples)``
+        where ``kind`` is ``'counter'`` or ``'gauge'`` and ``samples`` is an
+        iterable of ``(labels_dict, value)``.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        for collector in list(self._collectors):
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        stats = g.get('_sql_stats')
+        if stats is not None:
+            stats['started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        stats = g.get('_sql_stats')
+        if stats is not None and stats['started'] is not None:
+            stats['queries'] += 1
+            stats['seconds'] += time.perf_counter() - stats['started']
+            stats['started'] = None
+
+
+_listening = False
+_listen_lock = threading.Lock()
+# Held by the request being profiled; see the module docstring.
+_profile_lock = threading.Lock()
+
+
+def _listen_for_sql():
+    # The listeners live on the Engine class, so they cover every engine and
+    # bind; they only count while a request has opened its _sql_stats.
+    global _listening
+    with _listen_lock:
+        if not _listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            _listening = True
+
+
+class SlowRequestProfiles:
+
+    def __init__(self, keep=20, top=30):
+        self.top = top
+        self._profiles = deque(maxlen=keep)
+
+    def add(self, method, path, seconds, profiler):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(self.top)
+        self._profiles.appendleft({'method': method, 'path': path,
+                                   'ms': round(seconds * 1000, 1),
+                                   'at': datetime.utcnow().isoformat() + 'Z',
+                                   'profile': out.getvalue()})
+
+    def render(self):
+        return '\n'.join(f"=== {p['at']} {p['method']} {p['path']} {p['ms']} ms\n{p['profile']}"
+                         for p in list(self._profiles)) or 'No slow requests profiled yet.\n'
+
+
+def instrument(app, registry, slow_request_ms=500, profile_sample_rate=0.0,
+               profile_keep=20, rng=random.random):
+    """Record request metrics for ``app`` into ``registry``; see module docs."""
+    requests_total = registry.counter(
+        'http_requests_total', 'HTTP requests handled.', ('method', 'endpoint', 'status'))
+    duration = registry.histogram(
+        'http_request_duration_seconds', 'Time spent handling a request.',
+        ('method', 'endpoint'))
+    sql_queries = registry.histogram(
+        'http_request_sql_queries', 'SQL statements executed per request.',
+        ('method', 'endpoint'), QUERY_BUCKETS)
+    sql_seconds = registry.histogram(
+        'http_request_sql_seconds', 'Time spent in SQL statements per request.',
+        ('method', 'endpoint'))
+    response_size = registry.histogram(
+        'http_response_size_bytes', 'Response body size.', ('method', 'endpoint'), SIZE_BUCKETS)
+    profiled = registry.counter(
+        'http_slow_request_profiles_total', 'Slow requests captured by the profiler.',
+        ('endpoint',))
+    profiles = SlowRequestProfiles(keep=profile_keep)
+    _listen_for_sql()
+
+    @app.before_request
+    def start_request_metrics():
+        g._sql_stats = {'queries': 0, 'seconds': 0.0, 'started': None}
+        g._request_profiler = None
+        if (profile_sample_rate and rng() < profile_sample_rate
+                and _profile_lock.acquire(blocking=False)):
+            g._request_profiler = cProfile.Profile()
+            try:
+                g._request_profiler.enable()
+            except ValueError:  # another profiler (not ours) is active
+                g._request_profiler = None
+                _profile_lock.release()
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('_request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        profiler = g.get('_request_profiler')
+        if profiler is not None:
+            profiler.disable()
+        endpoint = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        method = request.method
+        requests_total.inc(method=method, endpoint=endpoint, status=response.status_code)
+        duration.observe(elapsed, method=method, endpoint=endpoint)
+        stats = g.pop('_sql_stats')
+        sql_queries.observe(stats['queries'], method=method, endpoint=endpoint)
+        sql_seconds.observe(stats['seconds'], method=method, endpoint=endpoint)
+        if not response.is_streamed:
+            response_size.observe(response.calculate_content_length() or 0,
+                                  method=method, endpoint=endpoint)
+        if profiler is not None and elapsed * 1000 >= slow_request_ms:
+            profiles.add(method, request.full_path, elapsed, profiler)
+            profiled.inc(endpoint=endpoint)
+        return response
+
+    @app.teardown_request
+    def stop_request_profiler(exc):
+        # Also runs when after_request did not, so the lock is always released.
+        profiler = g.pop('_request_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+
+    return profiles
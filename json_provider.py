@@ -0,0 +1,143 @@
+"""Pluggable JSON encoding for API responses.
+
+Flask 2.1 hard-wires ``flask.jsonify`` to the stdlib encoder, so
+``create_app`` installs a provider as ``app.json`` (the attribute Flask 2.2
+later adopted for the same purpose) and the views use this module's
+``jsonify``. ``JSON_PROVIDER`` selects it:
+
+* ``auto`` (default) - orjson when it is installed, else the stdlib;
+* ``orjson`` - fail at startup if orjson is missing;
+* ``json`` - the stdlib encoder.
+
+Both produce the documents ``flask.jsonify`` did: keys sorted when
+``JSON_SORT_KEYS`` is set, indented in debug or with
+``JSONIFY_PRETTYPRINT_REGULAR``, datetimes as HTTP dates and ``Decimal`` /
+``UUID`` values as strings. orjson writes non-ASCII characters as UTF-8
+rather than ``\\u`` escapes, which decodes to the same values.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime
+
+from flask import current_app
+
+from formatting import http_date
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return http_date(value)
+    if isinstance(value, date):
+        return http_date(datetime(value.year, value.month, value.day))
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _response_data(args, kwargs):
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    if len(args) == 1:
+        return args[0]
+    return args or kwargs
+
+
+class JSONProvider:
+    """Encoder based on the stdlib ``json`` module."""
+
+    name = 'json'
+
+    def __init__(self, app):
+        self.app = app
+
+    def dumps(self, obj, sort_keys=False, indent=None):
+        """Compact JSON text of ``obj``."""
+        return json.dumps(obj, default=_default, sort_keys=sort_keys, indent=indent,
+                          separators=(', ', ': ') if indent else (',', ':'))
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def _encode_response(self, data, sort_keys, indent):
+        return self.dumps(data, sort_keys=sort_keys, indent=indent) + '\n'
+
+    def response_body(self, data, sort_keys=False, indent=None):
+        """The UTF-8 body of a JSON response carrying ``data``."""
+        body = self._encode_response(data, sort_keys, indent)
+        return body if isinstance(body, bytes) else body.encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        """A JSON response, as ``flask.jsonify`` builds it."""
+        config = self.app.config
+        indent = 2 if config['JSONIFY_PRETTYPRINT_REGULAR'] or self.app.debug else None
+        body = self._encode_response(_response_data(args, kwargs),
+                                     config['JSON_SORT_KEYS'], indent)
+        return self.app.response_class(body, mimetype=config['JSONIFY_MIMETYPE'])
+
+
+class OrjsonProvider(JSONProvider):
+    """Encoder based on orjson, which writes UTF-8 bytes directly."""
+
+    name = 'orjson'
+
+    def __init__(self, app):
+        import orjson  # optional dependency, only needed for this provider
+        super().__init__(app)
+        self._orjson = orjson
+        # Datetimes go through _default so they keep the HTTP date format.
+        self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def _dump_bytes(self, obj, sort_keys=False, indent=None, newline=False):
+        options = self._options
+        if sort_keys:
+            options |= self._orjson.OPT_SORT_KEYS
+        if indent:
+            options |= self._orjson.OPT_INDENT_2
+        if newline:
+            options |= self._orjson.OPT_APPEND_NEWLINE
+        return self._orjson.dumps(obj, default=_default, option=options)
+
+    def dumps(self, obj, sort_keys=False, indent=None):
+        return self._dump_bytes(obj, sort_keys, indent).decode('utf-8')
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+    def _encode_response(self, data, sort_keys, indent):
+        return self._dump_bytes(data, sort_keys, indent, newline=True)
+
+
+PROVIDERS = {'json': JSONProvider, 'orjson': OrjsonProvider}
+
+
+def create_json_provider(app, choice=None):
+    """The provider selected by ``choice`` (default: ``JSON_PROVIDER``).
+
+    ``app`` may be None for code that only encodes, outside Flask.
+    """
+    if choice is None:
+        choice = app.config.get('JSON_PROVIDER', 'auto')
+    if choice == 'auto':
+        try:
+            return OrjsonProvider(app)
+        except ImportError:
+            return JSONProvider(app)
+    if choice not in PROVIDERS:
+        raise ValueError(f'Unknown JSON_PROVIDER: {choice!r}')
+    return PROVIDERS[choice](app)
+
+
+def jsonify(*args, **kwargs):
+    """Drop-in for ``flask.jsonify`` that encodes with ``current_app.json``."""
+    return current_app.json.response(*args, **kwargs)
+
+
+def dumps(obj, sort_keys=False):
+    """Compact JSON text of ``obj`` with the current app's provider."""
+    return current_app.json.dumps(obj, sort_keys=sort_keys)
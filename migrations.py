@@ -0,0 +1,150 @@
+"""Versioned schema migrations.
+
+Migrations are numbered and applied in order, each in its own transaction,
+and every applied version is recorded in ``schema_migrations``. They are
+written to be idempotent (tables and indexes are only created when missing),
+because MySQL commits DDL implicitly and a database restored from the dump
+may already have some of the objects. Run them once per deploy, before the
+new code starts serving::
+
+    python migrations.py                 # uses DATABASE_URL / MYSQL_*
+    python migrations.py --database-url sqlite:///park.db --status
+
+``db.create_all()`` still builds the full current schema for tests and
+scratch databases; ``migrate`` then only records the versions.
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table, bindparam,
+                        create_engine, inspect, insert, select, update)
+
+from models import (ArchivedParkingSession, Floor, OccupancyHourly, ParkingLot, ParkingSession,
+                    RollupWatermark, Row, Slot, User, db)
+from open_sessions import normalize_plate
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255)),
+    Column('applied_at', DateTime),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(upgrade):
+        MIGRATIONS.append((version, description, upgrade))
+        return upgrade
+    return register
+
+
+def add_missing_columns(conn, table, names):
+    """``ALTER TABLE ... ADD COLUMN`` for the named columns ``table`` lacks."""
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            column = table.c[name]
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {name} '
+                                 f'{column.type.compile(dialect=conn.dialect)}')
+
+
+def create_missing_indexes(conn, table, names):
+    """Create the named indexes of ``table`` unless an index on the same
+    columns already exists (under any name, e.g. a key from the dump)."""
+    existing = {tuple(index['column_names']) for index in inspect(conn).get_indexes(table.name)}
+    existing |= {tuple(c['column_names']) for c in inspect(conn).get_unique_constraints(table.name)}
+    for index in table.indexes:
+        if index.name in names and tuple(c.name for c in index.columns) not in existing:
+            index.create(conn)
+
+
+@migration(1, 'Baseline: the tables of the original dump')
+def create_tables(conn):
+    db.metadata.create_all(conn, checkfirst=True, tables=[
+        ParkingLot.__table__, User.__table__, Floor.__table__, Row.__table__,
+        Slot.__table__, ParkingSession.__table__])
+
+
+@migration(2, 'Composite and partial indexes for slot, topology and open-session lookups')
+def add_hot_path_indexes(conn):
+    create_missing_indexes(conn, Slot.__table__,
+                           {'ix_slots_row_available', 'ix_slots_parking_available'})
+    create_missing_indexes(conn, Floor.__table__, {'ix_floors_parking_id'})
+    create_missing_indexes(conn, Row.__table__, {'ix_parking_rows_floor_id'})
+    create_missing_indexes(conn, ParkingSession.__table__,
+                           {'ix_parkingsessions_open_slot', 'ix_parkingsessions_open_user'})
+
+
+@migration(3, 'Session archive table; exit_time and entry_time indexes for archival and history')
+def add_session_archive(conn):
+    db.metadata.create_all(conn, checkfirst=True, tables=[ArchivedParkingSession.__table__])
+    create_missing_indexes(conn, ParkingSession.__table__,
+                           {'ix_parkingsessions_exit_time', 'ix_parkingsessions_entry_time'})
+
+
+@migration(4, 'Hourly occupancy rollup and its watermark')
+def add_occupancy_rollup(conn):
+    db.metadata.create_all(conn, checkfirst=True,
+                           tables=[OccupancyHourly.__table__, RollupWatermark.__table__])
+
+
+@migration(5, 'Normalised car_plate and the open-session plate index for exit by plate')
+def add_open_session_plates(conn):
+    hot = ParkingSession.__table__
+    add_missing_columns(conn, hot, ['car_plate'])
+    add_missing_columns(conn, ArchivedParkingSession.__table__, ['car_plate'])
+    # Only open sessions are looked up by plate; closed history stays NULL.
+    open_sessions = conn.execute(select(hot.c.session_id, hot.c.car_number)
+                                 .where(hot.c.exit_time.is_(None))).fetchall()
+    plates = [{'id': session_id, 'plate': normalize_plate(car_number)}
+              for session_id, car_number in open_sessions if normalize_plate(car_number)]
+    if plates:
+        conn.execute(update(hot).where(hot.c.session_id == bindparam('id'))
+                     .values(car_plate=bindparam('plate')), plates)
+    create_missing_indexes(conn, hot, {'ix_parkingsessions_open_plate'})
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def migrate(engine):
+    """Apply every pending migration; return the versions applied."""
+    done = applied_versions(engine)
+    applied = []
+    for version, description, upgrade in sorted(MIGRATIONS):
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            upgrade(conn)
+            conn.execute(insert(schema_migrations).values(
+                version=version, description=description, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+
+def main():
+    from config import database_config
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--status', action='store_true', help='list pending migrations only')
+    args = parser.parse_args()
+
+    url = args.database_url or database_config()['SQLALCHEMY_DATABASE_URI']
+    engine = create_engine(url)
+    if args.status:
+        done = applied_versions(engine)
+        for version, description, _ in sorted(MIGRATIONS):
+            print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {description}")
+        return
+    applied = migrate(engine)
+    print(f"applied {', '.join(map(str, applied))}" if applied else 'schema is up to date')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""SQLAlchemy models, defined once at import time and shared by every app.
+
+``db`` is unbound until ``create_app`` calls ``db.init_app``; several apps
+(tests, workers, tools) can use the same models and metadata.
+"""
+from datetime import datetime
+
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+
+class ParkingLot(db.Model):
+    __tablename__ = 'parkinglots_details'  # Corrected table name
+    parking_id = db.Column(db.Integer, primary_key=True)
+    parking_name = db.Column(db.String(255))
+    city = db.Column(db.String(100))
+    parking_location = db.Column(db.String(255))
+    address_1 = db.Column(db.String(255))
+    address_2 = db.Column(db.String(255))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    physical_appearance = db.Column(db.String(255))
+    parking_ownership = db.Column(db.String(100))
+    parking_surface = db.Column(db.String(50))
+    has_cctv = db.Column(db.String(10))
+    has_boom_barrier = db.Column(db.String(10))
+    ticket_generated = db.Column(db.String(50))
+    entry_exit_gates = db.Column(db.Text)
+    weekly_off = db.Column(db.String(50))
+    parking_timing = db.Column(db.String(50))
+    vehicle_types = db.Column(db.String(255))
+    car_capacity = db.Column(db.Integer)
+    two_wheeler_capacity = db.Column(db.Integer)
+    parking_type = db.Column(db.String(50))
+    payment_modes = db.Column(db.String(255))
+    car_parking_charge = db.Column(db.String(50))
+    two_wheeler_parking_charge = db.Column(db.String(50))
+    allows_prepaid_passes = db.Column(db.String(10))
+    provides_valet_services = db.Column(db.String(10))
+    notes = db.Column(db.Text)
+    total_slots = db.Column(db.Integer)
+    available_slots = db.Column(db.Integer)
+    # The layout tree, for eager loading (GET /parkinglots/<id>/layout).
+    # Lazy by default; nothing else loads through these.
+    floors = db.relationship('Floor', order_by='Floor.floor_id', viewonly=True)
+
+
+class Floor(db.Model):
+    __tablename__ = 'floors'
+    floor_id = db.Column(db.Integer, primary_key=True)
+    parking_id = db.Column(db.Integer, db.ForeignKey('parkinglots_details.parking_id'))
+    floor_number = db.Column(db.String(50))
+    total_slots = db.Column(db.Integer)
+    available_slots = db.Column(db.Integer)
+    rows = db.relationship('Row', order_by='Row.row_id', viewonly=True)
+
+
+class Row(db.Model):
+    __tablename__ = 'parking_rows'
+    row_id = db.Column(db.Integer, primary_key=True)
+    parking_id = db.Column(db.Integer)
+    floor_id = db.Column(db.Integer, db.ForeignKey('floors.floor_id'))
+    row_number = db.Column(db.String(50))
+    slots = db.relationship('Slot', order_by='Slot.slot_id', viewonly=True)
+
+
+class Slot(db.Model):
+    __tablename__ = 'slots'
+    slot_id = db.Column(db.Integer, primary_key=True)
+    parking_id = db.Column(db.Integer)
+    row_id = db.Column(db.Integer, db.ForeignKey('parking_rows.row_id'))
+    slot_number = db.Column(db.String(50))
+    is_available = db.Column(db.Boolean, default=True)
+
+
+class ParkingSession(db.Model):
+    __tablename__ = 'parkingsessions'
+    session_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    parking_id = db.Column(db.Integer)
+    slot_id = db.Column(db.Integer, db.ForeignKey('slots.slot_id'))
+    entry_time = db.Column(db.DateTime, default=datetime.utcnow)
+    exit_time = db.Column(db.DateTime)
+    car_number = db.Column(db.String(20))
+    payment_status = db.Column(db.String(50))
+    # car_number normalised for exit-by-plate (open_sessions.normalize_plate)
+    car_plate = db.Column(db.String(20))
+
+
+class User(db.Model):
+    __tablename__ = 'users'
+    user_id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(100), unique=True)
+    password = db.Column(db.String(255))
+    email = db.Column(db.String(100), unique=True)
+    phone = db.Column(db.String(15))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Indexes for the hot query shapes (created for existing databases by
+# migration 2; see migrations.py). The dump only has single-column keys.
+db.Index('ix_slots_row_available', Slot.row_id, Slot.is_available)
+db.Index('ix_slots_parking_available', Slot.parking_id, Slot.is_available)
+db.Index('ix_floors_parking_id', Floor.parking_id)
+db.Index('ix_parking_rows_floor_id', Row.floor_id)
+# Open sessions by slot and by user. Partial where the database supports it
+# (SQLite, PostgreSQL); elsewhere exit_time as a second column serves the
+# same "exit_time IS NULL" lookups.
+db.Index('ix_parkingsessions_open_slot', ParkingSession.slot_id, ParkingSession.exit_time,
+         sqlite_where=ParkingSession.exit_time.is_(None),
+         postgresql_where=ParkingSession.exit_time.is_(None))
+db.Index('ix_parkingsessions_open_user', ParkingSession.user_id, ParkingSession.exit_time,
+         sqlite_where=ParkingSession.exit_time.is_(None),
+         postgresql_where=ParkingSession.exit_time.is_(None))
+# Open sessions by licence plate (migration 5).
+db.Index('ix_parkingsessions_open_plate', ParkingSession.car_plate, ParkingSession.exit_time,
+         sqlite_where=ParkingSession.exit_time.is_(None),
+         postgresql_where=ParkingSession.exit_time.is_(None))
+
+
+class ArchivedParkingSession(db.Model):
+    """Completed sessions moved out of ``parkingsessions`` by archive.py.
+
+    Same columns and ids as the hot table, so the two can be queried as one.
+    """
+    __tablename__ = 'parkingsessions_archive'
+    session_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer)
+    parking_id = db.Column(db.Integer)
+    slot_id = db.Column(db.Integer)
+    entry_time = db.Column(db.DateTime)
+    exit_time = db.Column(db.DateTime)
+    car_number = db.Column(db.String(20))
+    payment_status = db.Column(db.String(50))
+    car_plate = db.Column(db.String(20))
+    archived_at = db.Column(db.DateTime)
+
+
+# Archival picks completed sessions by exit_time; date-range history
+# queries filter both tiers on entry_time.
+db.Index('ix_parkingsessions_exit_time', ParkingSession.exit_time)
+db.Index('ix_parkingsessions_entry_time', ParkingSession.entry_time)
+db.Index('ix_parkingsessions_archive_entry_time', ArchivedParkingSession.entry_time)
+db.Index('ix_parkingsessions_archive_user_id', ArchivedParkingSession.user_id)
+
+
+class OccupancyHourly(db.Model):
+    """Per-lot, per-floor hourly rollup maintained by analytics.py."""
+    __tablename__ = 'occupancy_hourly'
+    parking_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    floor_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0: unknown
+    hour = db.Column(db.DateTime, primary_key=True)
+    entries = db.Column(db.Integer, default=0)
+    exits = db.Column(db.Integer, default=0)
+    dwell_seconds = db.Column(db.Float, default=0)  # summed over the hour's exits
+    occupied_seconds = db.Column(db.Float, default=0)  # slot-seconds in use
+
+
+class RollupWatermark(db.Model):
+    """How far (exclusive) each rollup has been computed."""
+    __tablename__ = 'rollup_watermarks'
+    name = db.Column(db.String(50), primary_key=True)
+    computed_until = db.Column(db.DateTime)
+
+
+db.Index('ix_occupancy_hourly_hour', OccupancyHourly.hour)
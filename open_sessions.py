@@ -0,0 +1,73 @@
+"""Open parking sessions by licence plate.
+
+Exit gates read a number plate, not a session id. Plates are normalised
+(upper case, letters and digits only, so ``dl 01-ab 1234`` and ``DL01AB1234``
+match) and stored in ``parkingsessions.car_plate``. The partial index
+``ix_parkingsessions_open_plate`` covers only open sessions, so a plate
+lookup costs the same with ten or ten million closed sessions.
+
+``OpenSessionIndex`` keeps the same plate -> session id map in memory. It is
+loaded from the primary on first use (``warm`` loads it eagerly, e.g. in a
+freshly forked worker) and updated when sessions open and close. Like the
+free-slot index it is only a hint: the exit is still a conditional UPDATE,
+and a miss or a stale entry (a car that entered or left through another
+worker) falls back to the indexed query.
+"""
+import re
+import threading
+
+_NOT_PLATE = re.compile(r'[^0-9A-Z]')
+
+
+def normalize_plate(car_number):
+    """Canonical form of a licence plate, or None if nothing is left."""
+    if not car_number:
+        return None
+    return _NOT_PLATE.sub('', car_number.upper()) or None
+
+
+class OpenSessionIndex:
+
+    def __init__(self, loader):
+        # loader() -> iterable of (session_id, car_number) for every open session
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._by_plate = {}
+        self._loaded = False
+
+    def warm(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for session_id, car_number in self._loader():
+                plate = normalize_plate(car_number)
+                if plate and session_id > self._by_plate.get(plate, 0):
+                    self._by_plate[plate] = session_id  # the latest, if entered twice
+            self._loaded = True
+
+    def get(self, plate):
+        self.warm()
+        return self._by_plate.get(plate)
+
+    def opened(self, plate, session_id):
+        if plate is None or not self._loaded:
+            return
+        with self._lock:
+            self._by_plate[plate] = session_id
+
+    def closed(self, plate, session_id):
+        if plate is None or session_id is None or not self._loaded:
+            return
+        with self._lock:
+            if self._by_plate.get(plate) == session_id:
+                del self._by_plate[plate]
+
+    def __len__(self):
+        return len(self._by_plate)
+
+    def clear(self):
+        with self._lock:
+            self._by_plate.clear()
+            self._loaded = False
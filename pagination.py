@@ -0,0 +1,162 @@
+"""Keyset pagination and column projection for the collection endpoints.
+
+List endpoints accept three optional query-string arguments:
+
+* ``limit`` - page size (1..MAX_PAGE_SIZE). Without it the whole collection
+  is returned, as before.
+* ``after`` - primary key of the last row of the previous page. Rows are
+  always ordered by primary key, so the next page is ``WHERE pk > after``
+  and never needs an OFFSET scan.
+* ``fields`` - comma separated column names. Only those columns are put in
+  the SELECT list; rows come back as plain tuples instead of hydrated ORM
+  objects.
+
+When a page is full the primary key of its last row is sent back in the
+``X-Next-After`` response header.
+
+Endpoints over time-stamped rows may also take ``from``/``to`` (ISO 8601
+date or date-time, UTC) through ``date_range_args``.
+"""
+import heapq
+import itertools
+from datetime import datetime, timezone
+
+from flask import request
+from sqlalchemy import select
+
+from formatting import row_serializer
+from json_provider import jsonify
+
+MAX_PAGE_SIZE = 1000
+NEXT_AFTER_HEADER = 'X-Next-After'
+
+
+class QueryArgumentError(ValueError):
+    """Raised for a malformed list query-string argument."""
+
+
+def _int_arg(name, minimum=None, maximum=None, args=None):
+    raw = (request.args if args is None else args).get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        value = int(raw)
+    except ValueError:
+        raise QueryArgumentError(f"'{name}' must be an integer")
+    if minimum is not None and value < minimum:
+        raise QueryArgumentError(f"'{name}' must be >= {minimum}")
+    if maximum is not None and value > maximum:
+        raise QueryArgumentError(f"'{name}' must be <= {maximum}")
+    return value
+
+
+def _datetime_arg(name):
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        value = datetime.fromisoformat(raw.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise QueryArgumentError(f"'{name}' must be an ISO 8601 date or date-time")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_fields(model, default_fields, exclude=(), args=None):
+    """Return the validated column names requested through ``fields=``.
+
+    ``args`` is the query string (default: the current request's).
+    """
+    raw = (request.args if args is None else args).get('fields')
+    if not raw:
+        return list(default_fields)
+    allowed = {c.key for c in model.__table__.columns} - set(exclude)
+    fields = []
+    for name in raw.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in allowed:
+            raise QueryArgumentError(f"Unknown field '{name}'")
+        if name not in fields:
+            fields.append(name)
+    if not fields:
+        raise QueryArgumentError("'fields' must name at least one column")
+    return fields
+
+
+def page_args(args=None):
+    """Return ``(limit, after)`` from the query string."""
+    return _int_arg('limit', 1, MAX_PAGE_SIZE, args), _int_arg('after', args=args)
+
+
+def date_range_args():
+    """Return ``(start, end)`` from ``from``/``to``; ``end`` is exclusive."""
+    start, end = _datetime_arg('from'), _datetime_arg('to')
+    if start is not None and end is not None and end <= start:
+        raise QueryArgumentError("'to' must be later than 'from'")
+    return start, end
+
+
+def page_statement(model, fields, criteria, limit, after):
+    """SELECT of the primary key and ``fields`` for one page, ordered by key."""
+    key = model.__mapper__.primary_key[0]
+    statement = select(key, *[getattr(model, f) for f in fields]).where(*criteria)
+    if after is not None:
+        statement = statement.where(key > after)
+    statement = statement.order_by(key)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def _page_rows(model, fields, criteria, limit, after):
+    return model.query.session.execute(
+        page_statement(model, fields, criteria, limit, after)).all()
+
+
+def page_items(rows, fields, formatters, limit):
+    serialize = row_serializer(fields, formatters, offset=1)  # row[0] is the key
+    items = [serialize(row) for row in rows]
+
+    next_after = None
+    if limit is not None and len(rows) == limit:
+        next_after = rows[-1][0]
+    return items, next_after
+
+
+def list_page(model, default_fields, criteria=(), formatters=None, exclude=()):
+    """Run a keyset-paginated, column-projected query for a list endpoint.
+
+    Returns ``(items, next_after)`` where ``items`` is a list of dicts with
+    the requested fields and ``next_after`` is the cursor for the next page,
+    or None when there is none.
+    """
+    fields = parse_fields(model, default_fields, exclude)
+    limit, after = page_args()
+    return page_items(_page_rows(model, fields, criteria, limit, after), fields, formatters,
+                      limit)
+
+
+def list_tiered_page(models, default_fields, criteria=lambda model: (), formatters=None):
+    """``list_page`` over tables that share their columns and primary key
+    space, such as a hot table and its archive.
+
+    ``criteria(model)`` returns the filters for one table. Each table is
+    queried for at most one page and the results are merged by key.
+    """
+    fields = parse_fields(models[0], default_fields)
+    limit, after = page_args()
+    rows = heapq.merge(*[_page_rows(model, fields, criteria(model), limit, after)
+                         for model in models], key=lambda row: row[0])
+    rows = list(itertools.islice(rows, limit))
+    return page_items(rows, fields, formatters, limit)
+
+
+def page_response(body, next_after, status=200):
+    response = jsonify(body)
+    response.status_code = status
+    if next_after is not None:
+        response.headers[NEXT_AFTER_HEADER] = str(next_after)
+    return response
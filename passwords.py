@@ -0,0 +1,90 @@
+"""scrypt password hashing on a bounded worker pool.
+
+Hashes are stored as ``scrypt$<n>$<r>$<p>$<salt>$<hash>`` (base64 salt and
+hash). The key derivation runs on a fixed-size thread pool: CPython releases
+the GIL inside ``hashlib.scrypt``, so hashes really run in parallel. The pool
+size also caps how much CPU and memory concurrent logins can use. Requests
+beyond ``workers + queue_size`` are refused with ``HasherBusy`` instead of
+piling up.
+
+Rows that still hold a plaintext password (from before hashing was
+introduced), or a hash made with older cost parameters, verify normally and
+are reported as needing a rehash.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+PREFIX = 'scrypt'
+
+
+class HasherBusy(RuntimeError):
+    """Raised when the hashing pool is saturated."""
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii')
+
+
+def _derive(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + (1 << 20), dklen=32)
+
+
+class PasswordHasher:
+
+    def __init__(self, n=2 ** 14, r=8, p=1, workers=4, queue_size=64, timeout=10):
+        self.n, self.r, self.p = n, r, p
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):  # refuse at once, never queue up
+            raise HasherBusy('Password hashing pool is saturated')
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy('Password hashing timed out')
+
+    def _hash(self, password):
+        salt = os.urandom(16)
+        digest = _derive(password, salt, self.n, self.r, self.p)
+        return f'{PREFIX}${self.n}${self.r}${self.p}${_b64(salt)}${_b64(digest)}'
+
+    def _verify(self, password, stored):
+        if not stored:
+            return False, False
+        if not stored.startswith(PREFIX + '$'):
+            # Legacy plaintext row.
+            ok = hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+            return ok, ok
+        try:
+            _, n, r, p, salt, digest = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+            salt, digest = base64.b64decode(salt), base64.b64decode(digest)
+        except ValueError:
+            return False, False
+        ok = hmac.compare_digest(_derive(password, salt, n, r, p), digest)
+        return ok, ok and (n, r, p) != (self.n, self.r, self.p)
+
+    def hash(self, password):
+        return self._submit(self._hash, password)
+
+    def verify(self, password, stored):
+        """Return ``(ok, needs_rehash)``."""
+        return self._submit(self._verify, password, stored)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
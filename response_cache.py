@@ -0,0 +1,99 @@
+"""Whole-response cache with strong ETags for hot read endpoints.
+
+``@cached_response(tag, cache_control)`` stores the serialised body of a 200
+response together with a strong ETag (a hash of the bytes), the time it was
+generated and the headers the view set. Later requests with the same
+endpoint and query string are answered from the stored bytes without
+touching the database or the JSON encoder, and ``If-None-Match`` /
+``If-Modified-Since`` revalidation is answered with 304.
+
+Entries are grouped under tags (``'lots'``, ``'user:<id>'``); writers call
+``invalidate(tag)``, which gives the tag a new random generation so every
+key built from the old one is simply never read again (and ages out). The
+generation is itself an ordinary cache entry, so with
+``RESPONSE_CACHE=redis`` a write on one worker invalidates every worker's
+entries, and it is bounded and expires like any other entry. A tag whose
+generation was evicted or expired just gets a new one: the worst case is a
+miss, never a stale hit.
+"""
+import hashlib
+import secrets
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, request
+
+from cache import MISSING, create_cache
+from formatting import http_date
+
+EXTENSION = 'response_cache'
+# Headers a view may set that belong to the cached representation.
+STORED_HEADERS = ('X-Next-After',)
+
+
+class ResponseCache:
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def key(self, tag):
+        generation = self.cache.get(f'generation:{tag}')
+        if generation is MISSING:
+            generation = self._new_generation(tag)
+        query = urlencode(sorted(request.args.items(multi=True)))
+        return f'{tag}#{generation}:{request.endpoint}?{query}'
+
+    def _new_generation(self, tag):
+        generation = secrets.token_hex(8)
+        self.cache.set(f'generation:{tag}', generation)
+        return generation
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self._new_generation(tag)
+
+    def entry(self, response):
+        body = response.get_data()
+        return {
+            'body': body.decode('utf-8'),
+            'content_type': response.content_type,
+            'etag': hashlib.blake2b(body, digest_size=16).hexdigest(),
+            'modified': http_date(datetime.utcnow()),
+            'headers': {name: response.headers[name] for name in STORED_HEADERS
+                        if name in response.headers},
+        }
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def create_response_cache(config):
+    return ResponseCache(create_cache(config, prefix='RESPONSE_CACHE'))
+
+
+def cached_response(tag, cache_control):
+    """Cache a JSON GET view. ``tag`` is a string or a function of the view
+    arguments; ``cache_control`` a string or a function returning one."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            responses = current_app.extensions[EXTENSION]
+            key = responses.key(tag(**kwargs) if callable(tag) else tag)
+            entry = responses.cache.get(key)
+            if entry is MISSING:
+                response = current_app.make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = responses.entry(response)
+                responses.cache.set(key, entry)
+            response = current_app.response_class(entry['body'],
+                                                  content_type=entry['content_type'])
+            response.headers.update(entry['headers'])
+            response.set_etag(entry['etag'])
+            response.headers['Last-Modified'] = entry['modified']
+            response.headers['Cache-Control'] = (
+                cache_control() if callable(cache_control) else cache_control)
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
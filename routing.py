@@ -0,0 +1,63 @@
+"""Primary/replica routing for the Flask-SQLAlchemy session.
+
+Views decorated with ``read_only`` send their queries to the ``replica``
+bind, if ``SQLALCHEMY_BINDS`` defines one. Everything else goes to the
+primary, and so do flushes and any session with pending changes, even inside
+a read-only view. Without a replica bind the decorator does nothing.
+
+Code that must see the primary from inside a read-only view (for example to
+warm an in-memory index that is then kept in sync incrementally) can wrap
+the work in ``with use_primary():``.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+
+REPLICA_BIND = 'replica'
+
+
+def _replica_requested():
+    return has_app_context() and g.get('_use_replica', False)
+
+
+def read_only(view):
+    """Route the queries issued by ``view`` to the read replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._use_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g._use_replica = False
+    return wrapper
+
+
+@contextmanager
+def use_primary():
+    previous = _replica_requested()
+    if has_app_context():
+        g._use_replica = False
+    try:
+        yield
+    finally:
+        if has_app_context():
+            g._use_replica = previous
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (_replica_requested() and not self._flushing
+                and not (self.new or self.dirty or self.deleted)
+                and REPLICA_BIND in (self.app.config.get('SQLALCHEMY_BINDS') or {})):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -1,8 +1,12 @@
 #run.py
+# Development server. In production use gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
 from app import create_app
 
 # Create an instance of the app
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)),
+            debug=os.environ.get("FLASK_DEBUG", "0") == "1")
@@ -0,0 +1,402 @@
+"""Per-app state and the booking engine.
+
+Models and views are module-level and shared, but the in-memory indexes,
+caches and feeds belong to one app: ``create_app`` builds a
+``ParkingServices`` and stores it in ``app.extensions['parking']``, and the
+views reach it through ``services()``.
+"""
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, event, func, update
+from sqlalchemy.orm import selectinload
+
+from admission import EXTENSION as ADMISSION, Admission
+from availability import AvailabilityTracker
+from cache import MISSING, create_cache
+from events import create_event_feed
+from gate import GateWriter
+from geo import SpatialIndex
+from instrumentation import MetricsRegistry, instrument
+from models import Floor, ParkingLot, ParkingSession, Row, Slot, db
+from open_sessions import OpenSessionIndex, normalize_plate
+from passwords import PasswordHasher
+from response_cache import EXTENSION as RESPONSE_CACHE, create_response_cache
+from routing import use_primary
+from slot_index import FreeSlotIndex
+
+EXTENSION = 'parking'
+
+
+def services():
+    """The ``ParkingServices`` of the current app."""
+    return current_app.extensions[EXTENSION]
+
+
+def lot_search_payload(lot):
+    return {'parking_name': lot.parking_name, 'city': lot.city,
+            'vehicle_types': lot.vehicle_types, 'available_slots': lot.available_slots}
+
+
+# Undo steps for in-memory state changed while staging (see the booking
+# engine): run if the transaction rolls back, dropped once it commits.
+ROLLBACK_HOOKS = 'parking_rollback_hooks'
+
+
+def on_rollback(callback):
+    """Run ``callback`` if the current transaction is rolled back."""
+    db.session.info.setdefault(ROLLBACK_HOOKS, []).append(callback)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _run_rollback_hooks(session):
+    for callback in session.info.pop(ROLLBACK_HOOKS, ()):
+        callback()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _drop_rollback_hooks(session):
+    session.info.pop(ROLLBACK_HOOKS, None)
+
+
+# The in-memory indexes below are kept in sync incrementally, so they are
+# always loaded from the primary, never from a lagging replica.
+def load_free_slots(parking_id=None):
+    query = db.session.query(Slot.parking_id, Slot.slot_id) \
+        .filter(Slot.is_available == db.true())
+    if parking_id is not None:
+        query = query.filter(Slot.parking_id == parking_id)
+    with use_primary():
+        return query.all()
+
+
+def load_availability():
+    parking_id = func.coalesce(Slot.parking_id, Row.parking_id)
+    with use_primary():
+        return db.session.query(
+            parking_id, Row.floor_id, func.count(Slot.slot_id),
+            func.sum(case((Slot.is_available == db.true(), 1), else_=0))
+        ).outerjoin(Row, Row.row_id == Slot.row_id) \
+            .group_by(parking_id, Row.floor_id).all()
+
+
+def load_lot_locations():
+    with use_primary():
+        lots = db.session.query(
+            ParkingLot.parking_id, ParkingLot.latitude, ParkingLot.longitude,
+            ParkingLot.parking_name, ParkingLot.city, ParkingLot.vehicle_types,
+            ParkingLot.available_slots).all()
+    return [(lot.parking_id, lot.latitude, lot.longitude, lot_search_payload(lot))
+            for lot in lots]
+
+
+def load_open_sessions():
+    with use_primary():
+        return db.session.query(ParkingSession.session_id, ParkingSession.car_number) \
+            .filter(ParkingSession.exit_time.is_(None)).all()
+
+
+def open_session_by_plate(plate):
+    """The latest open session of a normalised plate (partial index lookup)."""
+    return ParkingSession.query \
+        .filter(ParkingSession.car_plate == plate, ParkingSession.exit_time.is_(None)) \
+        .order_by(ParkingSession.session_id.desc()).first()
+
+
+def slot_location(slot_id):
+    return db.session.query(Slot.parking_id, Slot.row_id, Row.floor_id) \
+        .outerjoin(Row, Row.row_id == Slot.row_id) \
+        .filter(Slot.slot_id == slot_id).first()
+
+
+def load_lot_layout(parking_id):
+    """The floor -> row -> slot tree of a lot as nested lists, or None.
+
+    Four queries whatever the size of the lot (the lot, then each level
+    eagerly loaded with ``SELECT ... WHERE parent IN (...)``). Availability
+    is left out, so the result stays valid until the topology changes.
+    """
+    lot = ParkingLot.query.options(
+        selectinload(ParkingLot.floors).selectinload(Floor.rows).selectinload(Row.slots)
+    ).get(parking_id)
+    if lot is None:
+        return None
+    return {'parking_id': lot.parking_id, 'parking_name': lot.parking_name,
+            'floors': [[floor.floor_id, floor.floor_number,
+                        [[row.row_id, row.row_number,
+                          [[slot.slot_id, slot.slot_number] for slot in row.slots]]
+                         for row in floor.rows]]
+                       for floor in lot.floors]}
+
+
+def free_layout_slots(parking_id):
+    """Ids of the free slots in a lot's tree, in one indexed query."""
+    return {slot_id for slot_id, in db.session.query(Slot.slot_id)
+            .join(Row, Row.row_id == Slot.row_id).join(Floor, Floor.floor_id == Row.floor_id)
+            .filter(Floor.parking_id == parking_id, Slot.is_available == db.true())}
+
+
+def adjust_available_slots(parking_id, floor_id, delta):
+    if floor_id is not None:
+        db.session.execute(
+            update(Floor).where(Floor.floor_id == floor_id)
+            .values(available_slots=Floor.available_slots + delta),
+            execution_options={'synchronize_session': False})
+    if parking_id is not None:
+        db.session.execute(
+            update(ParkingLot).where(ParkingLot.parking_id == parking_id)
+            .values(available_slots=ParkingLot.available_slots + delta),
+            execution_options={'synchronize_session': False})
+
+
+class ParkingServices:
+
+    def __init__(self, app):
+        config = app.config
+        self.topology_cache = create_cache(config)
+        self.response_cache = app.extensions[RESPONSE_CACHE] = create_response_cache(config)
+        self.password_hasher = PasswordHasher(
+            n=config['PASSWORD_SCRYPT_N'], r=config['PASSWORD_SCRYPT_R'],
+            p=config['PASSWORD_SCRYPT_P'], workers=config['PASSWORD_HASH_WORKERS'],
+            queue_size=config['PASSWORD_HASH_QUEUE'])
+        self.free_slots = FreeSlotIndex(load_free_slots)
+        self.availability = AvailabilityTracker(
+            load_availability, config['AVAILABILITY_REFRESH_SECONDS'])
+        self.slot_events = create_event_feed(config)
+        self.lot_locations = SpatialIndex(load_lot_locations)
+        self.open_sessions = OpenSessionIndex(load_open_sessions)
+
+        self.metrics = MetricsRegistry()
+        self.slow_profiles = None
+        if config['INSTRUMENTATION']:
+            self.slow_profiles = instrument(
+                app, self.metrics, slow_request_ms=config['SLOW_REQUEST_MS'],
+                profile_sample_rate=config['PROFILE_SAMPLE_RATE'])
+        self.metrics.register(self.cache_metrics)
+        self.admission = app.extensions[ADMISSION] = (
+            Admission(config, self.metrics) if config['ADMISSION_CONTROL'] else None)
+
+        self.gate = None
+        if config['GATE_GROUP_COMMIT']:
+            self.gate = GateWriter(
+                app, {'book': self.stage_booking, 'allocate': self.stage_allocation,
+                      'release': self.stage_release, 'release_plate': self.stage_plate_exit},
+                self.metrics, batch_size=config['GATE_BATCH_SIZE'],
+                batch_wait=config['GATE_BATCH_WAIT_MS'] / 1000.0,
+                queue_size=config['GATE_QUEUE_SIZE'], timeout=config['GATE_COMMIT_TIMEOUT'])
+
+    def cache_metrics(self):
+        families = []
+        for name, cache in (('topology', self.topology_cache), ('response', self.response_cache)):
+            stats = cache.stats()
+            backend = {'backend': stats['backend']}
+            families += [(f'{name}_cache_hits_total', 'counter', f'{name.title()} cache hits.',
+                          [(backend, stats['hits'])]),
+                         (f'{name}_cache_misses_total', 'counter', f'{name.title()} cache misses.',
+                          [(backend, stats['misses'])])]
+        return families
+
+    def invalidate_topology(self, parking_id=None, floor_id=None):
+        keys = []
+        if parking_id is not None:
+            keys.append(f'floors:{parking_id}')
+        if floor_id is not None:
+            keys.extend([f'rows:{floor_id}', 'rows:all'])
+        self.topology_cache.delete(*keys)
+
+    # Lot layouts are cached under a per-lot version token, which is
+    # replaced whenever floors, rows or slots are added. Bookings do not
+    # change it: availability is read fresh for every layout request.
+    def _layout_version(self, parking_id):
+        key = f'layout-version:{parking_id}'
+        version = self.topology_cache.get(key)
+        if version is MISSING:
+            version = uuid.uuid4().hex
+            self.topology_cache.set(key, version)
+        return version
+
+    def topology_changed(self, parking_id):
+        """Retire the cached layout of a lot after its structure changed."""
+        if parking_id is not None:
+            self.topology_cache.delete(f'layout-version:{parking_id}')
+
+    def lot_layout(self, parking_id):
+        key = f'layout:{parking_id}:{self._layout_version(parking_id)}'
+        layout = self.topology_cache.get(key)
+        if layout is MISSING:
+            layout = load_lot_layout(parking_id)
+            if layout is not None:
+                self.topology_cache.set(key, layout)
+        return layout
+
+    def publish_slot_change(self, slot_id, location, parking_id, is_available):
+        self.slot_events.publish({
+            'slot_id': slot_id,
+            'parking_id': location.parking_id or parking_id,
+            'floor_id': location.floor_id,
+            'row_id': location.row_id,
+            'is_available': is_available
+        })
+
+    # Booking engine
+    #
+    # A slot is taken with a conditional UPDATE ... WHERE is_available, so of
+    # any number of concurrent requests for the same slot exactly one sees
+    # rowcount == 1; the others fail without ever blocking on a table lock.
+    # The floor and lot counters are adjusted in the same transaction, always
+    # in slot -> floor -> lot order so that concurrent bookings and releases
+    # cannot deadlock each other.
+    #
+    # The stage_* methods make their changes in the current transaction and
+    # return ``(result, after_commit)``, or None when nothing was changed; the
+    # caller commits (one request, or a whole group-commit batch, see
+    # gate.py) and then runs ``after_commit`` to update the in-memory state.
+    # In-memory changes that cannot wait for the commit register an undo
+    # with ``on_rollback``.
+    def stage_booking(self, slot_id, user_id, parking_id, car_number):
+        location = slot_location(slot_id)
+        if location is None:
+            return None
+        taken = db.session.execute(
+            update(Slot)
+            .where(Slot.slot_id == slot_id, Slot.is_available == db.true())
+            .values(is_available=False),
+            execution_options={'synchronize_session': False}).rowcount
+        if taken != 1:
+            return None
+        adjust_available_slots(location.parking_id or parking_id, location.floor_id, -1)
+        plate = normalize_plate(car_number)
+        session = ParkingSession(
+            user_id=user_id,
+            parking_id=parking_id,
+            slot_id=slot_id,
+            car_number=car_number,
+            car_plate=plate
+        )
+        db.session.add(session)
+        db.session.flush()  # the id is needed below, after the commit expired it
+        session_id = session.session_id
+
+        def after_commit():
+            # Not before: a rolled-back batch leaves the slot free.
+            self.free_slots.discard(location.parking_id, slot_id)
+            self.open_sessions.opened(plate, session_id)
+            self.availability.slot_taken(location.parking_id or parking_id, location.floor_id)
+            self.publish_slot_change(slot_id, location, parking_id, False)
+            self.invalidate_topology(parking_id=location.parking_id or parking_id)
+            self.response_cache.invalidate('lots')  # available_slots changed
+        return session, after_commit
+
+    def stage_allocation(self, parking_id, user_id, car_number):
+        reload = True
+        while True:
+            slot_id = self.free_slots.pop(parking_id, reload=reload)
+            if slot_id is None:
+                return None
+            staged = self.stage_booking(slot_id, user_id, parking_id, car_number)
+            if staged:
+                # Popped ahead of the commit: a rolled-back batch puts it back.
+                on_rollback(lambda: self.free_slots.add(parking_id, slot_id))
+                return staged
+            # The index entry was stale; refill from the database at most once.
+            reload = False
+
+    def _stage_close(self, session):
+        """Close ``session`` if it is still open; return its after_commit
+        callback, or None when it was already closed."""
+        session_id, slot_id, parking_id = session.session_id, session.slot_id, session.parking_id
+        plate = session.car_plate or normalize_plate(session.car_number)
+        closed = db.session.execute(
+            update(ParkingSession)
+            .where(ParkingSession.session_id == session_id,
+                   ParkingSession.exit_time.is_(None))
+            .values(exit_time=datetime.utcnow()),
+            execution_options={'synchronize_session': False}).rowcount
+        if closed != 1:
+            return None
+        freed = db.session.execute(
+            update(Slot)
+            .where(Slot.slot_id == slot_id, Slot.is_available == db.false())
+            .values(is_available=True),
+            execution_options={'synchronize_session': False}).rowcount
+        if freed != 1:
+            return lambda: self.open_sessions.closed(plate, session_id)
+        location = slot_location(slot_id)
+        adjust_available_slots(location.parking_id or parking_id, location.floor_id, 1)
+
+        def after_commit():
+            self.open_sessions.closed(plate, session_id)
+            self.free_slots.add(location.parking_id, slot_id)
+            self.availability.slot_freed(location.parking_id or parking_id, location.floor_id)
+            self.publish_slot_change(slot_id, location, parking_id, True)
+            self.invalidate_topology(parking_id=location.parking_id or parking_id)
+            self.response_cache.invalidate('lots')
+        return after_commit
+
+    def stage_release(self, session_id):
+        session = ParkingSession.query.get(session_id)
+        if session is None:
+            return None
+        return True, self._stage_close(session) or (lambda: None)
+
+    def stage_plate_exit(self, car_number):
+        """Close the open session of a licence plate; the result is its id."""
+        plate = normalize_plate(car_number)
+        if plate is None:
+            return None
+        session_id = self.open_sessions.get(plate)
+        session = ParkingSession.query.get(session_id) if session_id else None
+        if session is None or session.exit_time is not None:
+            # Not in this process's map, or stale: ask the plate index.
+            session = open_session_by_plate(plate)
+            if session is None:
+                self.open_sessions.closed(plate, session_id)
+                return None
+        after_commit = self._stage_close(session)
+        if after_commit is None:
+            return None  # closed by a concurrent exit
+        return session.session_id, after_commit
+
+    def _commit(self, staged):
+        if staged is None:
+            db.session.rollback()
+            return None
+        result, after_commit = staged
+        db.session.commit()
+        after_commit()
+        return result
+
+    def book_slot(self, slot_id, user_id, parking_id, car_number):
+        """Take ``slot_id`` and open a session for it, or return None."""
+        return self._commit(self.stage_booking(slot_id, user_id, parking_id, car_number))
+
+    def release_session(self, session_id):
+        """Close an open session and free its slot; False if it does not exist."""
+        return bool(self._commit(self.stage_release(session_id)))
+
+    def allocate_slot(self, parking_id, user_id, car_number):
+        """Book the first free slot of a lot using the free-slot index."""
+        return self._commit(self.stage_allocation(parking_id, user_id, car_number))
+
+    # Gate endpoints: through the group-commit writer when it is enabled.
+    def park_car(self, slot_id, user_id, parking_id, car_number):
+        if self.gate is not None:
+            return self.gate.submit('book', slot_id, user_id, parking_id, car_number)
+        return self.book_slot(slot_id, user_id, parking_id, car_number)
+
+    def park_car_anywhere(self, parking_id, user_id, car_number):
+        if self.gate is not None:
+            return self.gate.submit('allocate', parking_id, user_id, car_number)
+        return self.allocate_slot(parking_id, user_id, car_number)
+
+    def exit_car(self, session_id):
+        if self.gate is not None:
+            return self.gate.submit('release', session_id)
+        return self.release_session(session_id)
+
+    def exit_car_by_plate(self, car_number):
+        """Close the open session of a plate; its id, or None if there is none."""
+        if self.gate is not None:
+            return self.gate.submit('release_plate', car_number)
+        return self._commit(self.stage_plate_exit(car_number))
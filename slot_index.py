@@ -0,0 +1,95 @@
+"""In-memory index of free slots per parking lot.
+
+Each lot keeps a min-heap of free slot ids plus a membership set, so the
+lowest-numbered free slot is found in O(1) (O(log n) to pop) without touching
+the ``slots`` table. Removals are lazy: ``discard`` only drops the id from the
+membership set and stale heap entries are skipped when popped.
+
+The index is only a hint. Bookings still go through the conditional UPDATE,
+so an entry that went stale (for example because another worker process took
+the slot) just costs one failed attempt. When a lot's free list runs dry it is
+reloaded from the database once before the lot is reported full.
+"""
+import heapq
+import threading
+
+
+class FreeSlotIndex:
+
+    def __init__(self, loader):
+        # loader(parking_id=None) -> iterable of (parking_id, slot_id) for
+        # every free slot, or only those of one lot.
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._heaps = {}
+        self._members = {}
+        self._loaded = False
+
+    def _push(self, parking_id, slot_id):
+        members = self._members.setdefault(parking_id, set())
+        if slot_id not in members:
+            members.add(slot_id)
+            heap = self._heaps.setdefault(parking_id, [])
+            heapq.heappush(heap, slot_id)
+            if len(heap) > 2 * len(members) + 64:
+                # Too many stale entries from discard/add churn; rebuild.
+                heap[:] = sorted(members)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for parking_id, slot_id in self._loader():
+                if parking_id is not None:
+                    self._push(parking_id, slot_id)
+            self._loaded = True
+
+    def _pop(self, parking_id):
+        heap = self._heaps.get(parking_id)
+        members = self._members.get(parking_id)
+        while heap:
+            slot_id = heapq.heappop(heap)
+            if slot_id in members:
+                members.discard(slot_id)
+                return slot_id
+        return None
+
+    def pop(self, parking_id, reload=True):
+        """Remove and return the first free slot id of a lot, or None."""
+        self._ensure_loaded()
+        with self._lock:
+            slot_id = self._pop(parking_id)
+        if slot_id is None and reload:
+            fresh = list(self._loader(parking_id))
+            with self._lock:
+                for lot_id, free_id in fresh:
+                    self._push(lot_id, free_id)
+                slot_id = self._pop(parking_id)
+        return slot_id
+
+    def add(self, parking_id, slot_id):
+        if parking_id is None or not self._loaded:
+            return
+        with self._lock:
+            self._push(parking_id, slot_id)
+
+    def discard(self, parking_id, slot_id):
+        if parking_id is None or not self._loaded:
+            return
+        with self._lock:
+            members = self._members.get(parking_id)
+            if members:
+                members.discard(slot_id)
+
+    def free_count(self, parking_id):
+        self._ensure_loaded()
+        with self._lock:
+            return len(self._members.get(parking_id, ()))
+
+    def clear(self):
+        with self._lock:
+            self._heaps.clear()
+            self._members.clear()
+            self._loaded = False
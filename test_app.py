@@ -1,17 +1,31 @@
+import json
+import os
+import threading
+import time
+
 import pytest
 from app import create_app, db
 
+# Point TEST_DATABASE_URI at a scratch MySQL-compatible database to run the
+# suite (including the booking stress tests) against it instead of SQLite.
+TEST_DATABASE_URI = os.environ.get('TEST_DATABASE_URI')
+
 @pytest.fixture(scope="session")
-def app():
+def app(tmp_path_factory):
+    # A file database rather than :memory: so that concurrent requests each get
+    # their own connection, as they would in production.
+    database_uri = TEST_DATABASE_URI or 'sqlite:///{}'.format(
+        tmp_path_factory.mktemp('db') / 'parking.db')
     app = create_app({
         'TESTING': True,
-        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
-        'SQLALCHEMY_TRACK_MODIFICATIONS': False
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SQLALCHEMY_ENGINE_OPTIONS': (
+            {} if TEST_DATABASE_URI else {'connect_args': {'timeout': 30}})
     })
 
     with app.app_context():
-        db.reflect()        # Drop previously defined tables to avoid metadata conflict
-        db.drop_all()
+        db.drop_all()       # a TEST_DATABASE_URI may hold tables from an earlier run
         db.create_all()
 
     return app
@@ -271,3 +285,1442 @@ def test_slot_creation_and_listing(client):
     data = response.get_json()
     assert any(slot['slot_id'] == slot_id for slot in data)
  
+
+
+def _lot_payload(**overrides):
+    data = {
+        'parking_name': 'Central Park',
+        'city': 'Metropolis',
+        'parking_location': 'Downtown',
+        'address_1': '123 Main St',
+        'address_2': 'Suite 100',
+        'latitude': 40.7128,
+        'longitude': -74.0060,
+        'physical_appearance': 'Multi-level',
+        'parking_ownership': 'Public',
+        'parking_surface': 'Concrete',
+        'has_cctv': 'Yes',
+        'has_boom_barrier': 'Yes',
+        'ticket_generated': 'Digital',
+        'entry_exit_gates': 'North Gate, South Gate',
+        'weekly_off': 'Sunday',
+        'parking_timing': '24/7',
+        'vehicle_types': 'Car, Bike',
+        'car_capacity': 100,
+        'two_wheeler_capacity': 50,
+        'parking_type': 'Multi-level',
+        'payment_modes': 'Cash, Card',
+        'car_parking_charge': '20',
+        'two_wheeler_parking_charge': '10',
+        'allows_prepaid_passes': 'Yes',
+        'provides_valet_services': 'No',
+        'notes': 'Open during holidays',
+        'total_slots': 150,
+        'available_slots': 150
+    }
+    data.update(overrides)
+    return data
+
+def _create_lot_with_slots(client, slot_count=1, **lot_overrides):
+    """Create lot -> floor -> row -> slots and return their ids."""
+    response = client.post('/parkinglots/', json=_lot_payload(**lot_overrides))
+    parking_id = response.get_json()['parking_id']
+    response = client.post('/floors/', json={
+        'parking_id': parking_id,
+        'floor_number': '1',
+        'total_slots': slot_count,
+        'available_slots': slot_count
+    })
+    floor_id = response.get_json()['floor_id']
+    response = client.post('/rows/', json={
+        'parking_id': parking_id,
+        'floor_id': floor_id,
+        'row_number': 'A'
+    })
+    row_id = response.get_json()['row_id']
+    slot_ids = []
+    for number in range(slot_count):
+        response = client.post('/slots/', json={
+            'parking_id': parking_id,
+            'row_id': row_id,
+            'slot_number': str(number + 1)
+        })
+        slot_ids.append(response.get_json()['slot_id'])
+    return {'parking_id': parking_id, 'floor_id': floor_id, 'row_id': row_id,
+            'slot_ids': slot_ids}
+
+def test_keyset_pagination_walks_every_slot_once(client):
+    created = _create_lot_with_slots(client, slot_count=5)
+
+    seen = []
+    after = created['slot_ids'][0] - 1
+    while True:
+        response = client.get(f'/slots/?limit=2&after={after}')
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= 2
+        seen.extend(slot['slot_id'] for slot in page)
+        after = response.headers.get('X-Next-After')
+        if after is None:
+            break
+    assert seen[:5] == created['slot_ids']
+    assert seen == sorted(seen)
+
+def test_field_projection_and_bad_arguments(client):
+    _create_lot_with_slots(client)
+
+    response = client.get('/parkinglots/?fields=parking_id,latitude&limit=1')
+    assert response.status_code == 200
+    assert set(response.get_json()[0]) == {'parking_id', 'latitude'}
+
+    assert client.get('/users/?fields=password').status_code == 400
+    assert client.get('/slots/?limit=0').status_code == 400
+    assert client.get('/slots/?after=abc').status_code == 400
+
+def test_ndjson_export_of_sessions_and_slots(client):
+    created = _create_lot_with_slots(client, slot_count=3)
+    for slot_id in created['slot_ids']:
+        response = client.post('/Park_car/', json={
+            'user_id': 1,
+            'parking_id': created['parking_id'],
+            'slot_id': slot_id,
+            'car_number': f'KA01AB{slot_id:04d}'
+        })
+        assert response.status_code == 201
+
+    response = client.get('/sessions/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    sessions = [json.loads(line) for line in response.data.decode().splitlines()]
+    booked = [s for s in sessions if s['slot_id'] in created['slot_ids']]
+    assert len(booked) == 3
+    assert all(s['exit_time'] is None and s['entry_time'].endswith('GMT') for s in booked)
+
+    response = client.get('/slots/', headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    slots = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert {s['slot_id'] for s in slots} >= set(created['slot_ids'])
+    assert not any(s['is_available'] for s in slots if s['slot_id'] in created['slot_ids'])
+
+def _run_concurrently(app, requests):
+    """Fire ``requests`` (callables taking a client) from one thread each."""
+    barrier = threading.Barrier(len(requests))
+    results = [None] * len(requests)
+
+    def worker(index, request):
+        client = app.test_client()
+        barrier.wait()
+        results[index] = request(client)
+
+    threads = [threading.Thread(target=worker, args=(i, r)) for i, r in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_bookings_of_one_slot_never_double_book(app, client):
+    created = _create_lot_with_slots(client, slot_count=1)
+    slot_id = created['slot_ids'][0]
+
+    def book(n):
+        return lambda c: c.post('/Park_car/', json={
+            'user_id': n, 'parking_id': created['parking_id'],
+            'slot_id': slot_id, 'car_number': f'GATE{n}'}).status_code
+
+    statuses = _run_concurrently(app, [book(n) for n in range(40)])
+    assert statuses.count(201) == 1
+    assert statuses.count(400) == 39
+
+    floors = client.get(f'/floors/{created["parking_id"]}').get_json()
+    assert floors[0]['available_slots'] == 0
+
+def test_concurrent_gate_burst_books_each_slot_once(app, client):
+    created = _create_lot_with_slots(client, slot_count=10)
+
+    def book(n):
+        slot_id = created['slot_ids'][n % 10]
+        return lambda c: c.post('/Park_car/', json={
+            'user_id': n, 'parking_id': created['parking_id'],
+            'slot_id': slot_id, 'car_number': f'BURST{n}'})
+
+    responses = _run_concurrently(app, [book(n) for n in range(60)])
+    booked = [r.get_json()['session_id'] for r in responses if r.status_code == 201]
+    assert len(booked) == 10
+
+    floors = client.get(f'/floors/{created["parking_id"]}').get_json()
+    assert floors[0]['available_slots'] == 0
+    lots = client.get('/parkinglots/?fields=parking_id,available_slots').get_json()
+    lot = next(l for l in lots if l['parking_id'] == created['parking_id'])
+    assert lot['available_slots'] == 150 - 10
+
+    # Releasing twice must only give the slot back once.
+    for session_id in booked[:3]:
+        assert client.put(f'/Remove_car/{session_id}/exit').status_code == 200
+        assert client.put(f'/Remove_car/{session_id}/exit').status_code == 200
+    floors = client.get(f'/floors/{created["parking_id"]}').get_json()
+    assert floors[0]['available_slots'] == 3
+    assert client.put('/Remove_car/999999/exit').status_code == 404
+
+def test_auto_allocation_uses_free_slot_index(client):
+    created = _create_lot_with_slots(client, slot_count=3)
+    parking_id = created['parking_id']
+    first, second, third = created['slot_ids']
+
+    # Booking a specific slot directly must keep the index in sync.
+    response = client.post('/Park_car/', json={
+        'user_id': 1, 'parking_id': parking_id, 'slot_id': first, 'car_number': 'DIRECT1'})
+    assert response.status_code == 201
+
+    def auto(car_number):
+        return client.post('/Park_car/auto', json={
+            'user_id': 2, 'parking_id': parking_id, 'car_number': car_number})
+
+    response = auto('AUTO1')
+    assert response.status_code == 201
+    assert response.get_json()['slot_id'] == second
+    session_id = response.get_json()['session_id']
+
+    assert auto('AUTO2').get_json()['slot_id'] == third
+    response = auto('AUTO3')
+    assert response.status_code == 400
+
+    client.put(f'/Remove_car/{session_id}/exit')
+    assert auto('AUTO4').get_json()['slot_id'] == second
+
+def test_topology_cache_hits_and_invalidation(client):
+    created = _create_lot_with_slots(client, slot_count=1)
+    parking_id, floor_id = created['parking_id'], created['floor_id']
+
+    before = client.get('/cache/stats').get_json()
+    first = client.get(f'/floors/{parking_id}').get_json()
+    second = client.get(f'/floors/{parking_id}').get_json()
+    after = client.get('/cache/stats').get_json()
+    assert first == second
+    assert after['misses'] == before['misses'] + 1
+    assert after['hits'] == before['hits'] + 1
+
+    # Writes invalidate the affected keys explicitly.
+    client.post('/floors/', json={'parking_id': parking_id, 'floor_number': '2',
+                                  'total_slots': 10, 'available_slots': 10})
+    assert len(client.get(f'/floors/{parking_id}').get_json()) == 2
+
+    assert len(client.get(f'/rows/{floor_id}').get_json()) == 1
+    client.post('/rows/', json={'parking_id': parking_id, 'floor_id': floor_id, 'row_number': 'B'})
+    assert len(client.get(f'/rows/{floor_id}').get_json()) == 2
+
+    client.post('/Park_car/', json={'user_id': 1, 'parking_id': parking_id,
+                                    'slot_id': created['slot_ids'][0], 'car_number': 'CACHE1'})
+    floors = client.get(f'/floors/{parking_id}').get_json()
+    assert next(f for f in floors if f['floor_id'] == floor_id)['available_slots'] == 0
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in self.data if key.startswith(match.rstrip('*'))]
+
+def test_cache_backends():
+    from cache import LRUCache, MISSING, RedisCache
+
+    now = [0.0]
+    lru = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)  # evicts 'b', the least recently used
+    assert lru.get('b') is MISSING
+    assert lru.get('a') == 1
+    now[0] = 11
+    assert lru.get('a') is MISSING
+    assert lru.stats()['evictions'] == 1
+
+    redis_cache = RedisCache(_FakeRedis())
+    assert redis_cache.get_or_load('rows:1', lambda: [{'row_id': 1}]) == [{'row_id': 1}]
+    assert redis_cache.get_or_load('rows:1', lambda: []) == [{'row_id': 1}]
+    redis_cache.delete('rows:1')
+    assert redis_cache.get('rows:1') is MISSING
+    assert redis_cache.stats() == {'backend': 'redis', 'hits': 1, 'misses': 2}
+
+def test_availability_snapshot_is_incremental_and_conditional(client):
+    created = _create_lot_with_slots(client, slot_count=2)
+    lot_key, floor_key = str(created['parking_id']), str(created['floor_id'])
+
+    response = client.get('/availability/')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    snapshot = response.get_json()
+    assert snapshot['lots'][lot_key] == [2, 2]
+    assert snapshot['floors'][floor_key] == [created['parking_id'], 2, 2]
+
+    assert client.get('/availability/', headers={'If-None-Match': etag}).status_code == 304
+
+    client.post('/Park_car/', json={'user_id': 1, 'parking_id': created['parking_id'],
+                                    'slot_id': created['slot_ids'][0], 'car_number': 'AVAIL1'})
+    response = client.get('/availability/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['lots'][lot_key] == [1, 2]
+
+    client.post('/slots/', json={'parking_id': created['parking_id'],
+                                 'row_id': created['row_id'], 'slot_number': '3'})
+    assert client.get('/availability/').get_json()['floors'][floor_key] == [created['parking_id'], 2, 3]
+
+
+def test_availability_refresh_picks_up_other_workers():
+    from availability import AvailabilityTracker
+
+    rows = [(1, 10, 4, 4)]
+    now = [0.0]
+    tracker = AvailabilityTracker(lambda: list(rows), refresh_seconds=30, clock=lambda: now[0])
+    etag, _ = tracker.snapshot()
+    now[0] += 31  # nothing changed: same version, so If-None-Match still matches
+    assert tracker.snapshot()[0] == etag
+    rows[0] = (1, 10, 4, 3)  # booked through another worker
+    now[0] += 10
+    assert tracker.lot_free(1) == 4
+    now[0] += 31
+    assert tracker.lot_free(1) == 3 and tracker.snapshot()[0] != etag
+
+def test_slot_change_feed_long_poll_and_sse(client):
+    created = _create_lot_with_slots(client, slot_count=2)
+    parking_id = created['parking_id']
+    start = client.get('/slots/changes').get_json()['last_id']
+
+    response = client.post('/Park_car/', json={'user_id': 1, 'parking_id': parking_id,
+                                               'slot_id': created['slot_ids'][0], 'car_number': 'FEED1'})
+    client.put(f'/Remove_car/{response.get_json()["session_id"]}/exit')
+
+    changes = client.get(f'/slots/changes?since={start}&timeout=0&parking_id={parking_id}').get_json()
+    assert [(e['slot_id'], e['is_available']) for e in changes['events']] == [
+        (created['slot_ids'][0], False), (created['slot_ids'][0], True)]
+    assert changes['events'][0]['row_id'] == created['row_id']
+    assert changes['last_id'] == start + 2 and not changes['reset']
+
+    # Nothing newer: the long poll times out with an empty batch.
+    changes = client.get(f'/slots/changes?since={start + 2}&timeout=0').get_json()
+    assert changes == {'last_id': start + 2, 'reset': False, 'events': []}
+
+    response = client.get('/slots/events', headers={'Last-Event-ID': str(start)}, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 3000\n\n'
+    first = next(chunks).decode()
+    assert first.startswith(f'id: {start + 1}\nevent: slot\n')
+    assert json.loads(first.split('data: ', 1)[1])['is_available'] is False
+    response.close()
+
+
+def test_sse_does_not_skip_events_published_around_a_heartbeat(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'SLOT_EVENTS_HEARTBEAT', 0.01)
+    slot_events = app.extensions['parking'].slot_events
+    start = slot_events.last_id
+    response = client.get('/slots/events', headers={'Last-Event-ID': str(start)}, buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 3000\n\n'
+    assert next(chunks) == b': keep-alive\n\n'
+    # Published while the stream is between its heartbeat and the next wait.
+    event_id = slot_events.publish({'slot_id': 1, 'parking_id': 1, 'floor_id': 1,
+                                    'row_id': 1, 'is_available': True})
+    assert next(chunks).decode().startswith(f'id: {event_id}\nevent: slot\n')
+    response.close()
+
+
+class _FakePubSubRedis:
+    """INCR, GET and PUBLISH/SUBSCRIBE, as events.RedisEventRelay uses them."""
+
+    def __init__(self):
+        import queue
+        self.counters = {}
+        self.subscribers = []
+        self._queue = queue.Queue
+
+    def get(self, key):
+        return self.counters.get(key)
+
+    def register_script(self, script):
+        def run(keys, args):
+            event_id = self.counters[keys[0]] = self.counters.get(keys[0], 0) + 1
+            for subscriber in self.subscribers:
+                subscriber.put({'type': 'message', 'data': f'{event_id} {args[0]}'.encode()})
+            return event_id
+        return run
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        fake = self
+        messages = self._queue()
+
+        class PubSub:
+            def subscribe(self, channel):
+                fake.subscribers.append(messages)
+
+            def listen(self):
+                while True:
+                    yield messages.get()
+        return PubSub()
+
+
+def test_slot_feed_is_shared_between_workers_and_capped(tmp_path):
+    from events import EventFeed, RedisEventRelay
+
+    bus = _FakePubSubRedis()
+    bus.counters['parkvision:slot-events:last-id'] = 41  # earlier events
+    workers = []
+    for _ in range(2):
+        feed = EventFeed(capacity=16)
+        feed.relay = RedisEventRelay(bus, feed)
+        workers.append(feed)
+    assert workers[1].since(41) == ([], False)  # joins at the shared counter
+
+    # A change booked on one worker reaches the other's subscribers, same id.
+    assert workers[0].publish({'slot_id': 7, 'is_available': False}) == 42
+    events, reset = workers[1].wait(41, timeout=5)
+    assert [(i, e['slot_id']) for i, e, _ in events] == [(42, 7)] and not reset
+    # A gap (messages lost while reconnecting) resets subscribers behind it.
+    workers[1].receive(45, '{"slot_id":8}')
+    assert workers[1].since(42)[1] is True
+
+    capped = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'feed.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SLOT_EVENTS_MAX_STREAMS': 1,
+    })
+    client = capped.test_client()
+    stream = client.get('/slots/events', buffered=False)
+    assert stream.status_code == 200
+    busy = client.get('/slots/changes?since=0&timeout=0')
+    assert busy.status_code == 503 and busy.headers['Retry-After'] == '5'
+    stream.close()
+    assert client.get('/slots/changes?since=0&timeout=0').status_code == 200
+    assert capped.extensions['parking'].slot_events.subscribers == 0
+
+def test_nearby_parking_lots(client):
+    # Three lots around Bengaluru, far away from the other fixtures.
+    near = client.post('/parkinglots/', json=_lot_payload(
+        latitude=12.9716, longitude=77.5946, vehicle_types='Car, Bike')).get_json()['parking_id']
+    bikes = client.post('/parkinglots/', json=_lot_payload(
+        latitude=12.9750, longitude=77.6000, vehicle_types='Bike')).get_json()['parking_id']
+    full = client.post('/parkinglots/', json=_lot_payload(
+        latitude=12.9800, longitude=77.6100, available_slots=0)).get_json()['parking_id']
+    far = client.post('/parkinglots/', json=_lot_payload(
+        latitude=13.3409, longitude=77.1010)).get_json()['parking_id']
+
+    response = client.get('/parkinglots/nearby?lat=12.9716&lon=77.5946&radius=3000')
+    assert response.status_code == 200
+    lots = response.get_json()
+    assert [lot['parking_id'] for lot in lots] == [near, bikes, full]
+    assert lots[0]['distance_m'] == 0
+    assert far not in [lot['parking_id'] for lot in lots]
+
+    lots = client.get('/parkinglots/nearby?lat=12.9716&lon=77.5946&radius=3000'
+                      '&vehicle_type=car&available=1').get_json()
+    assert [lot['parking_id'] for lot in lots] == [near]
+
+    lots = client.get('/parkinglots/nearby?lat=12.9716&lon=77.5946&radius=100000&limit=2').get_json()
+    assert len(lots) == 2
+
+    assert client.get('/parkinglots/nearby?lat=abc&lon=1').status_code == 400
+
+def test_bulk_layout_import(client):
+    parking_id = client.post('/parkinglots/', json=_lot_payload()).get_json()['parking_id']
+    layout = {'floors': [
+        {'floor_number': 'G', 'rows': [{'row_number': 'A', 'slots': ['A1', 'A2']},
+                                       {'row_number': 'B', 'slots': 3}]},
+        {'floor_number': '1', 'rows': [{'row_number': 'A', 'slots': 250}]}
+    ]}
+    response = client.post(f'/parkinglots/{parking_id}/import', json=layout)
+    assert response.status_code == 201
+    floors = response.get_json()['floors']
+    assert [f['floor_number'] for f in floors] == ['G', '1']
+    assert [len(r['slot_ids']) for r in floors[0]['rows']] == [2, 3]
+    assert len(floors[1]['rows'][0]['slot_ids']) == 250
+
+    listed = client.get(f'/floors/{parking_id}').get_json()
+    assert sorted(f['total_slots'] for f in listed) == [5, 250]
+    row_b = floors[0]['rows'][1]
+    slots = client.get(f'/slots/{row_b["row_id"]}').get_json()
+    assert [s['slot_id'] for s in slots] == row_b['slot_ids']
+    assert [s['slot_number'] for s in slots] == ['B1', 'B2', 'B3']
+    assert client.get('/availability/').get_json()['lots'][str(parking_id)] == [255, 255]
+
+    csv_layout = 'floor_number,row_number,slot_number\n2,C,C1\n2,C,C2\n2,D,D1\n'
+    response = client.post(f'/parkinglots/{parking_id}/import', data=csv_layout,
+                           content_type='text/csv')
+    assert response.status_code == 201
+    assert [len(r['slot_ids']) for r in response.get_json()['floors'][0]['rows']] == [2, 1]
+
+    assert client.post(f'/parkinglots/{parking_id}/import', json={'floors': [
+        {'floor_number': '3', 'rows': [{'row_number': 'A', 'slots': ['1', '1']}]}]}).status_code == 400
+    assert client.post('/parkinglots/999999/import', json=layout).status_code == 404
+
+def test_passwords_are_hashed_and_legacy_rows_upgraded(app, client):
+    response = client.post('/users/register', json={
+        'username': 'hashed', 'password': 's3cret', 'email': 'hashed@example.com', 'phone': '1'})
+    user_id = response.get_json()['user_id']
+
+    def stored_password(uid):
+        with app.app_context():
+            return db.session.execute(
+                db.text('SELECT password FROM users WHERE user_id = :id'), {'id': uid}).scalar()
+
+    assert stored_password(user_id).startswith('scrypt$')
+    assert client.post('/users/login', json={
+        'email': 'hashed@example.com', 'password': 'wrong'}).status_code == 400
+    assert client.post('/users/login', json={
+        'email': 'nobody@example.com', 'password': 's3cret'}).status_code == 400
+
+    # A row written before hashing existed still logs in, and is rehashed.
+    with app.app_context():
+        db.session.execute(db.text(
+            "INSERT INTO users (username, password, email, phone) "
+            "VALUES ('legacy', 'plain-pass', 'legacy@example.com', '2')"))
+        db.session.commit()
+        legacy_id = db.session.execute(db.text(
+            "SELECT user_id FROM users WHERE email = 'legacy@example.com'")).scalar()
+    response = client.post('/users/login', json={'email': 'legacy@example.com', 'password': 'plain-pass'})
+    assert response.status_code == 200
+    assert stored_password(legacy_id).startswith('scrypt$')
+    assert client.post('/users/login', json={
+        'email': 'legacy@example.com', 'password': 'plain-pass'}).status_code == 200
+
+def test_password_hasher_rehash_and_backpressure():
+    from passwords import HasherBusy, PasswordHasher
+
+    old = PasswordHasher(n=2 ** 10, workers=1)
+    new = PasswordHasher(n=2 ** 11, workers=1)
+    stored = old.hash('pw')
+    assert old.verify('pw', stored) == (True, False)
+    assert new.verify('pw', stored) == (True, True)
+    assert new.verify('nope', stored) == (False, False)
+
+    busy = PasswordHasher(n=2 ** 10, workers=1, queue_size=0, timeout=5)
+    gate = threading.Event()
+    busy._executor.submit(gate.wait)
+    busy._slots.acquire()  # the pool is now fully occupied
+    try:
+        started = time.perf_counter()
+        with pytest.raises(HasherBusy):
+            busy.hash('pw')
+        assert time.perf_counter() - started < 0.5  # refused, not held for the timeout
+    finally:
+        gate.set()
+
+def test_database_config_from_environment():
+    from config import database_config
+
+    config = database_config({'MYSQL_USER': 'park', 'MYSQL_PASSWORD': 'p@ss', 'MYSQL_HOST': 'db',
+                              'DB_POOL_SIZE': '5', 'DB_POOL_RECYCLE': '600',
+                              'DATABASE_REPLICA_URL': 'mysql://ro@replica/parking_system'})
+    assert config['SQLALCHEMY_DATABASE_URI'] == 'mysql://park:p%40ss@db:3306/parking_system'
+    assert config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] == 5
+    assert config['SQLALCHEMY_ENGINE_OPTIONS']['pool_recycle'] == 600
+    assert config['SQLALCHEMY_ENGINE_OPTIONS']['pool_pre_ping'] is True
+    assert config['SQLALCHEMY_BINDS'] == {'replica': 'mysql://ro@replica/parking_system'}
+
+    config = database_config({'DATABASE_URL': 'sqlite:///x.db'})
+    assert config['SQLALCHEMY_ENGINE_OPTIONS'] == {'pool_pre_ping': True}
+    assert 'SQLALCHEMY_BINDS' not in config
+
+
+def test_service_settings_from_environment():
+    from cache import create_cache
+    from config import (archive_config, availability_config, cache_config, gate_config,
+                        password_config, response_cache_config)
+
+    assert cache_config({}) == {'TOPOLOGY_CACHE': 'memory', 'TOPOLOGY_CACHE_SIZE': 1024,
+                                'TOPOLOGY_CACHE_TTL': 300}
+    config = cache_config({'TOPOLOGY_CACHE': 'redis', 'TOPOLOGY_CACHE_TTL': '60',
+                           'TOPOLOGY_CACHE_REDIS_URL': 'redis://cache:6379/0'})
+    assert config['TOPOLOGY_CACHE_REDIS_URL'] == 'redis://cache:6379/0'
+    assert config['TOPOLOGY_CACHE_TTL'] == 60
+    with pytest.raises(ValueError):
+        create_cache({'TOPOLOGY_CACHE': 'redis'})
+
+    config = response_cache_config({'RESPONSE_CACHE': 'redis', 'RESPONSE_CACHE_MAX_AGE': '30',
+                                     'RESPONSE_CACHE_REDIS_URL': 'redis://cache:6379/1'})
+    assert config == {'RESPONSE_CACHE': 'redis', 'RESPONSE_CACHE_SIZE': 2048,
+                      'RESPONSE_CACHE_TTL': 60, 'RESPONSE_CACHE_MAX_AGE': 30,
+                      'RESPONSE_CACHE_REDIS_URL': 'redis://cache:6379/1'}
+
+    assert availability_config({}) == {'AVAILABILITY_REFRESH_SECONDS': 30}
+    assert archive_config({'SESSION_ARCHIVE_DAYS': '30'}) == {
+        'SESSION_ARCHIVE_DAYS': 30, 'SESSION_ARCHIVE_BATCH': 5000}
+    assert gate_config({'GATE_COMMIT_TIMEOUT': '2.5'})['GATE_COMMIT_TIMEOUT'] == 2.5
+    assert availability_config({'AVAILABILITY_REFRESH_SECONDS': '5'}) == {
+        'AVAILABILITY_REFRESH_SECONDS': 5}
+
+    config = password_config({'PASSWORD_SCRYPT_N': '32768', 'PASSWORD_HASH_WORKERS': '2'})
+    assert (config['PASSWORD_SCRYPT_N'], config['PASSWORD_SCRYPT_R']) == (32768, 8)
+    assert config['PASSWORD_HASH_WORKERS'] == 2
+    with pytest.raises(ValueError):
+        password_config({'PASSWORD_SCRYPT_N': '1000'})
+
+def test_read_only_endpoints_are_routed_to_replica(app, client, tmp_path, monkeypatch):
+    if TEST_DATABASE_URI:
+        pytest.skip('replica routing is exercised with two SQLite files')
+    replica_uri = 'sqlite:///{}'.format(tmp_path / 'replica.db')
+    replica = db.create_engine(replica_uri, {})
+    db.metadata.create_all(bind=replica)
+    with replica.begin() as conn:
+        conn.execute(db.text("INSERT INTO parkinglots_details (parking_id, parking_name, city) "
+                             "VALUES (424242, 'Replica Only', 'Nowhere')"))
+
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_BINDS', {'replica': replica_uri})
+    # Writes go to the primary...
+    response = client.post('/parkinglots/', json=_lot_payload(parking_name='Primary Only'))
+    assert response.status_code == 201
+    user_id = client.post('/users/register', json={
+        'username': 'primary-user', 'password': 'pw', 'email': 'primary@example.com',
+        'phone': '3'}).get_json()['user_id']
+    # ...and the read-only GET endpoints read from the replica.
+    names = [lot['parking_name'] for lot in client.get('/parkinglots/?fields=parking_name').get_json()]
+    assert names == ['Replica Only']
+    assert client.get(f'/users/{user_id}').status_code == 404
+    # Login reads and may write, so it stays on the primary.
+    assert client.post('/users/login', json={
+        'email': 'primary@example.com', 'password': 'pw'}).status_code == 200
+
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_BINDS', None)
+    # The data source changed without a write going through the app.
+    app.extensions['parking'].response_cache.invalidate('lots')
+    names = [lot['parking_name'] for lot in client.get('/parkinglots/?fields=parking_name').get_json()]
+    assert 'Primary Only' in names and 'Replica Only' not in names
+    replica.dispose()
+
+def test_metrics_endpoint_exposes_subsystem_collectors(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    assert '# TYPE topology_cache_hits_total counter' in response.get_data(as_text=True)
+    assert client.get('/metrics/profiles').status_code == 404  # instrumentation is off
+
+def test_request_instrumentation_counts_sql_and_profiles_slow_requests():
+    from flask import Flask, jsonify
+    from sqlalchemy import create_engine, text
+    from instrumentation import MetricsRegistry, instrument
+
+    engine = create_engine('sqlite://')
+    demo = Flask('instrumented')
+    registry = MetricsRegistry()
+    profiles = instrument(demo, registry, slow_request_ms=0, profile_sample_rate=1.0)
+
+    @demo.route('/items/<int:item_id>')
+    def item(item_id):
+        with engine.connect() as conn:
+            values = [conn.execute(text('SELECT :n'), {'n': n}).scalar() for n in range(3)]
+        return jsonify(values)
+
+    client = demo.test_client()
+    for item_id in (1, 2):
+        assert client.get(f'/items/{item_id}').status_code == 200
+    assert client.get('/missing').status_code == 404
+
+    labels = {'method': 'GET', 'endpoint': '/items/<int:item_id>'}
+    assert registry.histogram('http_request_duration_seconds', '').count(**labels) == 2
+    text_format = registry.render()
+    assert 'http_request_sql_queries_sum{method="GET",endpoint="/items/<int:item_id>"} 6' in text_format
+    assert 'http_requests_total{method="GET",endpoint="/items/<int:item_id>",status="200"} 2' in text_format
+    assert 'http_requests_total{method="GET",endpoint="<unmatched>",status="404"} 1' in text_format
+    assert 'http_response_size_bytes_bucket{method="GET",endpoint="/items/<int:item_id>",le="+Inf"} 2' in text_format
+    assert 'GET /items/1' in profiles.render() and 'cumulative' in profiles.render()
+
+def test_only_one_request_is_profiled_at_a_time():
+    from flask import Flask
+    from instrumentation import MetricsRegistry, instrument
+
+    demo = Flask('profiled')
+    registry = MetricsRegistry()
+    instrument(demo, registry, slow_request_ms=0, profile_sample_rate=1.0)
+    inside = threading.Barrier(2, timeout=5)
+
+    @demo.route('/slow')
+    def slow():
+        inside.wait()  # both sampled requests are in flight together
+        return 'done'
+
+    responses = _run_concurrently(demo, [lambda c: c.get('/slow')] * 2)
+    assert [response.status_code for response in responses] == [200, 200]
+    profiled = registry.counter('http_slow_request_profiles_total', '', ('endpoint',))
+    assert profiled.value(endpoint='/slow') == 1
+    _run_concurrently(demo, [lambda c: c.get('/slow')] * 2)  # the lock was released
+    assert profiled.value(endpoint='/slow') == 2
+
+def test_apps_share_models_but_not_state(app, tmp_path):
+    other = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'other.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    })
+    with other.app_context():
+        db.create_all()
+    assert other.extensions['parking'] is not app.extensions['parking']
+
+    other_client = other.test_client()
+    response = other_client.post('/parkinglots/', json=_lot_payload(parking_name='Elsewhere'))
+    assert response.status_code == 201
+    names = [lot['parking_name'] for lot in other_client.get('/parkinglots/').get_json()]
+    assert names == ['Elsewhere']
+    assert 'Elsewhere' not in [
+        lot['parking_name'] for lot in app.test_client().get('/parkinglots/').get_json()]
+
+def test_migrations_upgrade_a_dump_schema_once(tmp_path):
+    from sqlalchemy import create_engine, inspect
+    from migrations import MIGRATIONS, migrate
+
+    engine = create_engine('sqlite:///{}'.format(tmp_path / 'dump.db'))
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:  # as restored from the dump: no composite keys
+        for name in ('ix_slots_row_available', 'ix_parkingsessions_open_user',
+                     'ix_parkingsessions_open_plate'):
+            conn.exec_driver_sql(f'DROP INDEX {name}')
+        conn.exec_driver_sql('ALTER TABLE parkingsessions DROP COLUMN car_plate')
+        conn.exec_driver_sql("INSERT INTO parkingsessions (session_id, car_number) "
+                             "VALUES (1, 'dl 01-ab 1234'), (2, NULL)")
+
+    assert migrate(engine) == [version for version, _, _ in MIGRATIONS]
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql(
+            'SELECT session_id, car_plate FROM parkingsessions ORDER BY session_id'
+        ).fetchall() == [(1, 'DL01AB1234'), (2, None)]
+    indexes = {index['name'] for index in inspect(engine).get_indexes('slots')}
+    assert 'ix_slots_row_available' in indexes
+    assert {'ix_parkingsessions_open_user', 'ix_parkingsessions_open_plate'} <= {
+        index['name'] for index in inspect(engine).get_indexes('parkingsessions')}
+    assert migrate(engine) == []
+    engine.dispose()
+
+def _full_scans(conn, statement, parameters):
+    """Tables ``statement`` reads without an index, per the database's plan."""
+    if conn.dialect.name == 'sqlite':
+        plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        return [row[-1] for row in plan
+                if row[-1].startswith('SCAN ') and 'INDEX' not in row[-1]
+                and 'CONSTANT ROW' not in row[-1]]
+    plan = conn.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings().fetchall()
+    return [f"{row['table']}: type ALL" for row in plan if row['type'] == 'ALL']
+
+def test_hot_endpoint_queries_use_indexes(app, client):
+    from sqlalchemy import event
+    from models import ParkingSession
+
+    created = _create_lot_with_slots(client, slot_count=4)
+    user_id = client.post('/users/register', json={
+        'username': 'explain-user', 'password': 'pw', 'email': 'explain@example.com',
+        'phone': '7'}).get_json()['user_id']
+
+    def hot_requests():
+        app.extensions['parking'].topology_cache.clear()
+        assert client.get(f"/floors/{created['parking_id']}").status_code == 200
+        assert client.get(f"/rows/{created['floor_id']}").status_code == 200
+        assert client.get(f"/slots/{created['row_id']}").status_code == 200
+        assert client.get(f"/parkinglots/{created['parking_id']}/layout").status_code == 200
+        session_id = client.post('/Park_car/', json={
+            'user_id': user_id, 'parking_id': created['parking_id'],
+            'slot_id': created['slot_ids'][0], 'car_number': 'EX1'}).get_json()['session_id']
+        auto = client.post('/Park_car/auto', json={
+            'user_id': user_id, 'parking_id': created['parking_id'], 'car_number': 'EX2'})
+        with app.app_context():  # open sessions by user and by slot
+            ParkingSession.query.filter_by(user_id=user_id, exit_time=None).all()
+            ParkingSession.query.filter_by(slot_id=created['slot_ids'][0], exit_time=None).all()
+        assert client.get(f'/users/{user_id}/sessions/active').status_code == 200
+        assert client.get(f"/slots/{created['slot_ids'][0]}/session").status_code == 200
+        assert client.put('/Remove_car/plate/EX1/exit').status_code == 200
+        assert client.put('/Remove_car/plate/NOSUCHCAR/exit').status_code == 404
+        assert client.put(f"/Remove_car/{auto.get_json()['session_id']}/exit").status_code == 200
+        assert client.post('/users/login', json={
+            'email': 'explain@example.com', 'password': 'pw'}).status_code == 200
+        assert client.get(f'/users/{user_id}').status_code == 200
+
+    hot_requests()  # warm the in-memory indexes, whose initial load is a deliberate scan
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        hot_requests()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    assert any('is_available' in s and 'row_id' in s for s, _ in statements)
+    with engine.connect() as conn:
+        scans = {s: _full_scans(conn, s, p) for s, p in statements}
+        assert _full_scans(conn, 'SELECT * FROM slots WHERE slot_number = ?'
+                           if conn.dialect.name == 'sqlite' else
+                           'SELECT * FROM slots WHERE slot_number = %s', ('A1',))
+    assert {s: found for s, found in scans.items() if found} == {}
+
+def test_session_archival_and_tiered_history(app, client):
+    from datetime import datetime, timedelta
+    from archive import archive_horizon, archive_sessions
+    from models import ArchivedParkingSession, ParkingSession
+
+    created = _create_lot_with_slots(client, slot_count=3)
+    session_ids = []
+    for slot_id in created['slot_ids']:
+        session_ids.append(client.post('/Park_car/', json={
+            'user_id': 1, 'parking_id': created['parking_id'], 'slot_id': slot_id,
+            'car_number': f'ARC{slot_id}'}).get_json()['session_id'])
+    for session_id in session_ids[:2]:
+        assert client.put(f'/Remove_car/{session_id}/exit').status_code == 200
+    long_ago = datetime.utcnow() - timedelta(days=400)
+    with app.app_context():
+        # Two completed sessions from last year, and one still open from then.
+        db.session.query(ParkingSession).filter(ParkingSession.session_id.in_(session_ids)) \
+            .update({'entry_time': long_ago, 'exit_time': long_ago + timedelta(hours=2)},
+                    synchronize_session=False)
+        db.session.query(ParkingSession).filter_by(session_id=session_ids[2]) \
+            .update({'exit_time': None}, synchronize_session=False)
+        db.session.commit()
+        assert archive_sessions(days=90, batch_size=1) == 2
+        assert archive_sessions(days=90) == 0
+        assert {s.session_id for s in ArchivedParkingSession.query.all()} >= set(session_ids[:2])
+        assert ParkingSession.query.get(session_ids[0]) is None
+        assert ParkingSession.query.get(session_ids[2]).exit_time is None  # open stays hot
+
+    def listed(query):
+        return [s['session_id'] for s in client.get('/sessions/' + query).get_json()['sessions']]
+
+    hot = set(listed(''))
+    assert session_ids[2] in hot and not hot & set(session_ids[:2])
+    window = '?from={}&to={}'.format((long_ago - timedelta(days=1)).date().isoformat(),
+                                     (long_ago + timedelta(days=1)).date().isoformat())
+    assert listed(window) == session_ids
+    page = client.get('/sessions/' + window + '&limit=2')
+    assert [s['session_id'] for s in page.get_json()['sessions']] == session_ids[:2]
+    after = page.headers['X-Next-After']
+    assert listed(window + f'&limit=2&after={after}') == session_ids[2:]
+    recent = '?from=' + (datetime.utcnow() - timedelta(days=1)).isoformat()
+    assert not set(session_ids) & set(listed(recent))
+    assert client.get('/sessions/?from=yesterday').status_code == 400
+
+    def exported(url, **kwargs):
+        return [json.loads(line)['session_id']
+                for line in client.get(url, **kwargs).data.decode().splitlines()]
+    assert set(session_ids) <= set(exported('/sessions/export'))  # both tiers
+    assert exported('/sessions/export' + window) == session_ids
+    assert exported('/sessions/' + window,
+                    headers={'Accept': 'application/x-ndjson'}) == session_ids
+
+    # A run with a shorter horizon than the app's SESSION_ARCHIVE_DAYS (90):
+    # the readers follow the horizon the job recorded.
+    fresh = client.post('/Park_car/', json={
+        'user_id': 1, 'parking_id': created['parking_id'], 'slot_id': created['slot_ids'][0],
+        'car_number': 'ARC45'}).get_json()['session_id']
+    client.put(f'/Remove_car/{fresh}/exit')
+    weeks_ago = datetime.utcnow() - timedelta(days=45)
+    with app.app_context():
+        db.session.query(ParkingSession).filter_by(session_id=fresh).update(
+            {'entry_time': weeks_ago, 'exit_time': weeks_ago + timedelta(hours=1)},
+            synchronize_session=False)
+        db.session.commit()
+        assert archive_sessions(days=30) == 1
+        assert archive_horizon() >= datetime.utcnow() - timedelta(days=31)
+        archive_sessions(days=90)
+        assert archive_horizon() >= datetime.utcnow() - timedelta(days=31)  # never moves back
+    assert listed('?from={}&to={}'.format((weeks_ago - timedelta(days=1)).date().isoformat(),
+                                          (weeks_ago + timedelta(days=1)).date().isoformat())) == [fresh]
+
+def test_occupancy_rollup_is_incremental_and_exact(app, client):
+    from datetime import datetime, timedelta
+    from analytics import floor_hour, refresh_hourly_rollup, rollup_watermark
+    from models import ParkingSession
+
+    created = _create_lot_with_slots(client, slot_count=2, total_slots=2)
+    base = floor_hour(datetime.utcnow()) - timedelta(days=10)
+
+    def minutes(m):
+        return base + timedelta(minutes=m)
+
+    with app.app_context():
+        # 00:30-02:30 on one slot and 01:00-01:45 on the other.
+        for slot_id, entry, exit_time in ((created['slot_ids'][0], minutes(30), minutes(150)),
+                                          (created['slot_ids'][1], minutes(60), minutes(105))):
+            db.session.add(ParkingSession(user_id=1, parking_id=created['parking_id'],
+                                          slot_id=slot_id, entry_time=entry, exit_time=exit_time,
+                                          car_number='OCC'))
+        db.session.commit()
+        refresh_hourly_rollup(now=minutes(90))
+        assert rollup_watermark() == minutes(60)
+        assert refresh_hourly_rollup(now=minutes(90)) == 0
+        refresh_hourly_rollup()  # the rest, up to the current hour
+
+    window = f"?parking_id={created['parking_id']}&from={base.isoformat()}&to={minutes(180).isoformat()}"
+    body = client.get('/analytics/occupancy' + window).get_json()
+    hourly = [(h['entries'], h['exits'], h['occupied_slots'], h['avg_dwell_minutes'])
+              for h in body['hourly']]
+    assert hourly == [(1, 0, 0.5, None), (1, 1, 1.75, 45.0), (0, 1, 0.5, 120.0)]
+    assert body['hourly'][1]['occupancy_rate'] == 0.875
+    assert body['summary'] == [{'parking_id': created['parking_id'], 'entries': 2, 'exits': 2,
+                                'avg_dwell_minutes': 82.5, 'turnover': 1.0,
+                                'avg_occupancy_rate': round(2.75 / 3 / 2, 4)}]
+
+    by_floor = client.get('/analytics/occupancy' + window + '&by=floor').get_json()
+    assert {h['floor_id'] for h in by_floor['hourly']} == {created['floor_id']}
+    assert client.get('/analytics/occupancy?from=2020-01-01&to=2021-01-01').status_code == 400
+
+def test_occupancy_refresh_on_read_is_bounded(tmp_path, monkeypatch):
+    from datetime import datetime, timedelta
+    from analytics import floor_hour, refresh_hourly_rollup
+    from config import analytics_config
+    from models import ParkingSession
+
+    assert analytics_config({}) == {'ANALYTICS_REFRESH_ON_READ': False,
+                                    'ANALYTICS_REFRESH_MAX_HOURS': 168}
+    other = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'rollup.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'ANALYTICS_REFRESH_ON_READ': True,
+        'ANALYTICS_REFRESH_MAX_HOURS': 24,
+    })
+    entry = floor_hour(datetime.utcnow()) - timedelta(days=30)
+    with other.app_context():
+        db.create_all()
+        db.session.add(ParkingSession(user_id=1, parking_id=1, slot_id=1, entry_time=entry,
+                                      exit_time=entry + timedelta(hours=2), car_number='OLD'))
+        db.session.commit()
+
+    client = other.test_client()
+    # A month of history is not backfilled by a single dashboard request.
+    assert client.get('/analytics/occupancy').get_json()['computed_until'] == (
+        entry + timedelta(hours=24)).isoformat()
+    assert client.get('/analytics/occupancy').get_json()['computed_until'] == (
+        entry + timedelta(hours=48)).isoformat()
+
+    with other.app_context():
+        monkeypatch.setattr(db.engine.dialect, 'name', 'postgresql')
+        with pytest.raises(ValueError, match='supports mysql, sqlite, not postgresql'):
+            refresh_hourly_rollup()
+    # With refresh on read, an unsupported database is refused at startup.
+    with pytest.raises(ValueError, match='not postgresql'):
+        create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'postgresql://db/parking',
+                    'ANALYTICS_REFRESH_ON_READ': True})
+
+def test_response_cache_revalidation_and_invalidation(app, client):
+    from sqlalchemy import event
+
+    created = _create_lot_with_slots(client, slot_count=2)
+    parking_id = created['parking_id']
+    url = '/parkinglots/?fields=parking_id,available_slots'
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'public, max-age=5'
+    etag = first.headers['ETag']
+
+    statements = []
+
+    def count(*args):
+        statements.append(args)
+    engine = db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        again = client.get(url)
+        assert again.get_data() == first.get_data() and again.headers['ETag'] == etag
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+        assert client.get(url, headers={
+            'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert statements == []  # answered from the cache
+
+    def available(response):
+        return {lot['parking_id']: lot['available_slots']
+                for lot in response.get_json()}[parking_id]
+
+    # Booking and exiting change available_slots and invalidate the listing.
+    user_id = client.post('/users/register', json={
+        'username': 'etag-user', 'password': 'pw', 'email': 'etag@example.com',
+        'phone': '5'}).get_json()['user_id']
+    booked = client.post('/Park_car/', json={
+        'user_id': user_id, 'parking_id': parking_id, 'slot_id': created['slot_ids'][0],
+        'car_number': 'ET1'})
+    assert booked.status_code == 201
+    after_booking = client.get(url, headers={'If-None-Match': etag})
+    assert after_booking.status_code == 200 and after_booking.headers['ETag'] != etag
+    assert available(after_booking) == available(first) - 1
+    client.put(f"/Remove_car/{booked.get_json()['session_id']}/exit")
+    assert available(client.get(url)) == available(first)
+
+    # New lots show up immediately.
+    client.post('/parkinglots/', json=_lot_payload(parking_name='Cache Buster'))
+    assert 'Cache Buster' in [lot.get('parking_name') for lot in
+                              client.get('/parkinglots/?fields=parking_name').get_json()]
+
+    # Per-user entries are private and revalidated every time.
+    user = client.get(f'/users/{user_id}')
+    assert user.headers['Cache-Control'] == 'private, no-cache'
+    assert client.get(f'/users/{user_id}',
+                      headers={'If-None-Match': user.headers['ETag']}).status_code == 304
+    assert client.get('/users/987654').status_code == 404  # misses are not cached
+    stats = app.extensions['parking'].response_cache.stats()
+    assert stats['hits'] >= 3
+
+def test_response_cache_invalidation_reaches_other_workers(app):
+    from cache import RedisCache
+    from response_cache import ResponseCache
+
+    shared = _FakeRedis()
+    worker_a, worker_b = ResponseCache(RedisCache(shared)), ResponseCache(RedisCache(shared))
+    with app.test_request_context('/parkinglots/?fields=parking_id'):
+        key = worker_b.key('lots')
+        worker_b.cache.set(key, {'body': '[]'})
+        assert worker_a.key('lots') == key
+        worker_a.invalidate('lots')  # a write handled by the other worker
+        assert worker_b.key('lots') != key
+        assert worker_b.key('user:1') == worker_a.key('user:1')
+
+def test_response_cache_generations_stay_bounded(app):
+    from cache import LRUCache
+    from response_cache import ResponseCache
+
+    responses = ResponseCache(LRUCache(maxsize=8))
+    with app.test_request_context('/parkinglots/'):
+        first = responses.key('user:0')
+        assert responses.key('user:0') == first
+        for user_id in range(1, 100):
+            responses.invalidate(f'user:{user_id}')
+        assert len(responses.cache._data) <= 8
+        # an evicted generation only starts a fresh namespace, never an old one
+        assert responses.key('user:0') != first
+
+def test_json_providers_match_flask_jsonify(app):
+    import decimal
+    import random
+    from datetime import datetime, timedelta
+    import flask
+    from formatting import HTTP_DATE_FORMAT, http_date, row_serializer
+    from json_provider import PROVIDERS, JSONProvider, create_json_provider
+
+    rng = random.Random(7)
+    for _ in range(2000):
+        value = datetime(1970, 1, 1) + timedelta(seconds=rng.randrange(4 * 10 ** 9))
+        assert http_date(value) == value.strftime(HTTP_DATE_FORMAT)
+
+    serialize = row_serializer(['slot_id', 'seen'], {'seen': http_date}, offset=1)
+    assert serialize((9, 1, None)) == {'slot_id': 1, 'seen': None}
+    assert row_serializer(['slot_id', 'seen'], {'seen': http_date}, offset=1) is serialize
+
+    document = {'b': [1, 2.5, None, True], 'a': 'Größe', 'when': datetime(2024, 2, 29, 13, 5, 9),
+                'price': decimal.Decimal('12.50'), '_id': 7}
+    with app.app_context():
+        expected = flask.jsonify(document).get_data()
+        for provider_class in PROVIDERS.values():
+            try:
+                provider = provider_class(app)
+            except ImportError:
+                continue
+            response = provider.response(document)
+            body = response.get_data()
+            assert response.mimetype == 'application/json' and body.endswith(b'\n')
+            assert json.loads(body) == json.loads(expected)
+            assert body.index(b'"_id"') < body.index(b'"a"') < body.index(b'"when"')  # sorted
+            assert provider.response(1, 2).get_json() == [1, 2]
+            assert json.loads(provider.dumps({'x': [1]})) == {'x': [1]}
+
+    assert isinstance(create_json_provider(flask.Flask('plain')), JSONProvider)
+    stdlib = flask.Flask('stdlib')
+    stdlib.config['JSON_PROVIDER'] = 'json'
+    assert type(create_json_provider(stdlib)) is JSONProvider
+    stdlib.config['JSON_PROVIDER'] = 'simplejson'
+    with pytest.raises(ValueError):
+        create_json_provider(stdlib)
+
+def test_gate_group_commit_batches_entries_and_exits(tmp_path):
+    from sqlalchemy import event
+    from gate import GateBusy, GateWriter
+    from instrumentation import MetricsRegistry
+    from models import ParkingSession, Slot
+
+    gated = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'gated.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'GATE_GROUP_COMMIT': True,
+        'GATE_BATCH_WAIT_MS': 50,
+    })
+    with gated.app_context():
+        db.create_all()
+    client = gated.test_client()
+    created = _create_lot_with_slots(client, slot_count=6)
+    user_id = client.post('/users/register', json={
+        'username': 'gate-user', 'password': 'pw', 'email': 'gate@example.com',
+        'phone': '8'}).get_json()['user_id']
+
+    def park(slot_id):
+        return lambda c: c.post('/Park_car/', json={
+            'user_id': user_id, 'parking_id': created['parking_id'], 'slot_id': slot_id,
+            'car_number': f'G{slot_id}'})
+
+    commits = []
+
+    def count_commit(conn):
+        commits.append(conn)
+    engine = db.get_engine(gated)
+    event.listen(engine, 'commit', count_commit)
+    try:
+        # Six distinct slots and a second request for the first one.
+        parked = _run_concurrently(gated, [park(s) for s in created['slot_ids']]
+                                   + [park(created['slot_ids'][0])])
+        session_ids = [r.get_json()['session_id'] for r in parked if r.status_code == 201]
+        assert sorted(r.status_code for r in parked) == [201] * 6 + [400]
+        assert len(set(session_ids)) == 6
+        assert len(commits) < len(parked)  # grouped into fewer transactions
+
+        exits = _run_concurrently(gated, [
+            lambda c, sid=sid: c.put(f'/Remove_car/{sid}/exit') for sid in session_ids])
+        assert [r.status_code for r in exits] == [200] * 6
+    finally:
+        event.remove(engine, 'commit', count_commit)
+    assert client.put('/Remove_car/999999/exit').status_code == 404
+    auto = client.post('/Park_car/auto', json={
+        'user_id': user_id, 'parking_id': created['parking_id'], 'car_number': 'AUTO'})
+    assert auto.status_code == 201 and auto.get_json()['slot_id'] in created['slot_ids']
+    with gated.app_context():
+        assert Slot.query.filter_by(is_available=False).count() == 1
+        assert ParkingSession.query.filter_by(exit_time=None).count() == 1
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'gate_queue_depth 0' in metrics
+    assert 'gate_events_total{operation="release"} 7' in metrics  # incl. the unknown id
+
+    # Backpressure: with the writer stuck, a full queue is refused at once.
+    entered, release = threading.Event(), threading.Event()
+
+    def stall(*args):
+        entered.set()
+        release.wait()
+    registry = MetricsRegistry()
+    writer = GateWriter(gated, {'book': stall}, registry, queue_size=1, timeout=5)
+    waiting = [threading.Thread(target=writer.submit, args=('book',)) for _ in range(2)]
+    waiting[0].start()
+    assert entered.wait(5)
+    waiting[1].start()
+    while writer._queue.qsize() < 1:
+        threading.Event().wait(0.001)
+    with pytest.raises(GateBusy):
+        writer.submit('book')
+    release.set()
+    for thread in waiting:
+        thread.join()
+    assert 'gate_rejected_total{reason="queue_full"} 1' in registry.render()
+
+    # Bookings rolled back with their batch leave the slot in the free index.
+    services = gated.extensions['parking']
+    with gated.app_context():
+        free = services.free_slots.free_count(created['parking_id'])
+        slot_id = Slot.query.filter_by(is_available=True).first().slot_id
+        assert services.stage_booking(slot_id, user_id, created['parking_id'], 'UNDO')
+        db.session.rollback()
+        assert services.free_slots.free_count(created['parking_id']) == free
+        assert services.stage_allocation(created['parking_id'], user_id, 'UNDO')
+        assert services.free_slots.free_count(created['parking_id']) == free - 1
+        db.session.rollback()
+        assert services.free_slots.free_count(created['parking_id']) == free
+        assert services.allocate_slot(created['parking_id'], user_id, 'KEPT')
+        db.session.rollback()  # nothing to undo once committed
+        assert services.free_slots.free_count(created['parking_id']) == free - 1
+
+def test_gate_writer_survives_callback_and_rollback_errors(tmp_path, monkeypatch):
+    from gate import GateWriter
+    from instrumentation import MetricsRegistry
+
+    gated = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'writer.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    })
+
+    def publish_fails():
+        raise ConnectionError('redis is down')
+
+    def bad_event():
+        raise ValueError('bad event')
+    writer = GateWriter(gated, {'book': lambda: ('booked', publish_fails), 'bad': bad_event,
+                                'ok': lambda: ('ok', lambda: None)},
+                        MetricsRegistry(), timeout=5)
+    assert writer.submit('book') == 'booked'  # committed, so not failed by the callback
+    with pytest.raises(ValueError):
+        writer.submit('bad')
+
+    def rollback_fails():
+        raise ConnectionError('connection lost')
+    monkeypatch.setattr(db.session, 'rollback', rollback_fails)
+    with pytest.raises(ConnectionError):
+        writer.submit('bad')
+    monkeypatch.undo()
+    assert writer.submit('ok') == 'ok'
+    assert writer._thread.is_alive()
+
+def test_exit_by_plate_and_active_session_lookups(app, client):
+    from models import ParkingSession
+
+    created = _create_lot_with_slots(client, slot_count=3)
+    user_id = client.post('/users/register', json={
+        'username': 'plate-user', 'password': 'pw', 'email': 'plate@example.com',
+        'phone': '9'}).get_json()['user_id']
+
+    def park(slot_id, car_number):
+        return client.post('/Park_car/', json={
+            'user_id': user_id, 'parking_id': created['parking_id'], 'slot_id': slot_id,
+            'car_number': car_number}).get_json()['session_id']
+
+    def active_sessions():
+        # Earlier tests park for hard-coded user ids; ignore their sessions.
+        sessions = client.get(f'/users/{user_id}/sessions/active').get_json()['sessions']
+        return [s for s in sessions if s['slot_id'] in created['slot_ids']]
+
+    first = park(created['slot_ids'][0], 'dl 01-ab 1234')
+    second = park(created['slot_ids'][1], 'HR26DK0001')
+    active = active_sessions()
+    assert [s['session_id'] for s in active] == [first, second]
+    assert active[0]['car_number'] == 'dl 01-ab 1234' and active[0]['exit_time'] is None
+    on_slot = client.get(f"/slots/{created['slot_ids'][0]}/session")
+    assert on_slot.status_code == 200 and on_slot.get_json()['session_id'] == first
+    assert client.get(f"/slots/{created['slot_ids'][2]}/session").status_code == 404
+
+    # Any spelling of the plate finds the open session.
+    response = client.put('/Remove_car/plate/DL01AB1234/exit')
+    assert response.status_code == 200 and response.get_json()['session_id'] == first
+    assert client.put('/Remove_car/plate/dl-01-ab-1234/exit').status_code == 404
+    assert client.get(f"/slots/{created['slot_ids'][0]}/session").status_code == 404
+    assert [s['session_id'] for s in active_sessions()] == [second]
+
+    # A car that entered through another worker is not in this process's
+    # map; the plate index still finds it.
+    with app.app_context():
+        other = ParkingSession(user_id=user_id, parking_id=created['parking_id'],
+                               slot_id=created['slot_ids'][2], car_number='KA 05 MN 777',
+                               car_plate='KA05MN777')
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.session_id
+    assert app.extensions['parking'].open_sessions.get('KA05MN777') is None
+    response = client.put('/Remove_car/plate/ka05mn777/exit')
+    assert response.status_code == 200 and response.get_json()['session_id'] == other_id
+
+    # Exit by session id keeps the map in step.
+    assert client.put(f'/Remove_car/{second}/exit').status_code == 200
+    assert app.extensions['parking'].open_sessions.get('HR26DK0001') is None
+    assert client.put('/Remove_car/plate/HR26DK0001/exit').status_code == 404
+
+
+def test_admission_control_throttles_and_sheds(tmp_path):
+    from admission import TokenBuckets
+
+    limited = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'limited.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'ADMISSION_CONTROL': True,
+        'ADMISSION_MAX_EXPENSIVE': 1,
+        'ADMISSION_PARK_LOT_RATE': 1, 'ADMISSION_PARK_LOT_BURST': 2,
+        'ADMISSION_LOGIN_CLIENT_RATE': 0.5, 'ADMISSION_LOGIN_CLIENT_BURST': 2,
+    })
+    with limited.app_context():
+        db.create_all()
+    now = [0.0]
+    limited.extensions['admission'].buckets = TokenBuckets(clock=lambda: now[0])
+    client = limited.test_client()
+    busy_lot = _create_lot_with_slots(client, slot_count=4)
+    quiet_lot = _create_lot_with_slots(client, slot_count=1)
+
+    def park(created, index, remote_addr='10.0.0.1'):
+        return client.post('/Park_car/', json={
+            'user_id': 1, 'parking_id': created['parking_id'],
+            'slot_id': created['slot_ids'][index], 'car_number': f'AC{index}'},
+            environ_base={'REMOTE_ADDR': remote_addr})
+
+    # Per lot: the third booking on the busy lot is throttled, from any client,
+    # while the quiet lot is unaffected.
+    assert park(busy_lot, 0).status_code == 201
+    assert park(busy_lot, 1, '10.0.0.2').status_code == 201
+    throttled = park(busy_lot, 2, '10.0.0.3')
+    assert throttled.status_code == 429 and throttled.headers['Retry-After'] == '1'
+    assert park(quiet_lot, 0).status_code == 201
+    now[0] += 1
+    assert park(busy_lot, 2, '10.0.0.3').status_code == 201
+    # A request the lot throttles does not cost its client a token.
+    assert park(busy_lot, 3, '10.0.0.4').status_code == 429
+    buckets = limited.extensions['admission'].buckets
+    assert buckets._buckets['park:client:10.0.0.4'][0] == 20  # the default burst
+
+    # Per client: logins refill at 0.5/s.
+    def login():
+        return client.post('/users/login', json={'email': 'nobody@example.com', 'password': 'x'})
+    assert [login().status_code for _ in range(3)] == [400, 400, 429]
+    assert login().headers['Retry-After'] == '2'
+    now[0] += 2
+    assert login().status_code == 400
+
+    # Expensive endpoints: one at a time; a stream holds its slot until closed.
+    stream = client.get('/sessions/export', buffered=False)
+    assert stream.status_code == 200
+    shed = client.get('/sessions/')
+    assert shed.status_code == 503 and shed.headers['Retry-After'] == '1'
+    stream.close()
+    assert client.get('/sessions/').status_code == 200
+    assert client.get('/parkinglots/').status_code == 200  # never limited
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'admission_requests_total{rule="park",scope="lot",result="throttled"} 2' in metrics
+    assert 'admission_requests_total{rule="expensive",scope="process",result="shed"} 1' in metrics
+    assert 'admission_expensive_in_flight 0' in metrics
+
+
+async def _asgi_get(asgi_app, url, method='GET'):
+    path, _, query = url.partition('?')
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app({'type': 'http', 'method': method, 'path': path,
+                    'query_string': query.encode(), 'headers': []}, receive, send)
+    headers = {k.decode(): v.decode() for k, v in messages[0]['headers']}
+    return messages[0]['status'], headers, json.loads(messages[1]['body'])
+
+
+def test_async_read_path_matches_flask_views(app, client, monkeypatch):
+    import asyncio
+    import importlib.util
+
+    from async_reads import async_database_url, create_asgi_app
+
+    assert str(async_database_url('mysql://u:p@db:3306/parking')) == \
+        'mysql+aiomysql://u:p@db:3306/parking'
+    assert str(async_database_url('sqlite:////tmp/p.db')) == 'sqlite+aiosqlite:////tmp/p.db'
+    with pytest.raises(ValueError):
+        async_database_url('postgresql://db/parking')
+    with pytest.raises(RuntimeError, match="'aiomysql' driver"):
+        if importlib.util.find_spec('aiomysql') is not None:
+            monkeypatch.setattr('async_reads.find_spec', lambda name: None)
+        create_asgi_app({'SQLALCHEMY_DATABASE_URI': 'mysql://u:p@db:3306/parking'})
+    monkeypatch.undo()
+    driver = async_database_url(app.config['SQLALCHEMY_DATABASE_URI']).get_driver_name()
+    if driver != 'aiosqlite':  # aiosqlite is in requirements.txt, aiomysql is optional
+        pytest.importorskip(driver)
+
+    created = _create_lot_with_slots(client, slot_count=3)
+    user_id = client.post('/users/register', json={
+        'username': 'async-user', 'password': 'pw', 'email': 'async@example.com',
+        'phone': '7'}).get_json()['user_id']
+    assert client.post('/Park_car/', json={
+        'user_id': user_id, 'parking_id': created['parking_id'],
+        'slot_id': created['slot_ids'][0], 'car_number': 'ASYNC1'}).status_code == 201
+
+    asgi_app = create_asgi_app({
+        'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+        'SQLALCHEMY_ENGINE_OPTIONS': app.config['SQLALCHEMY_ENGINE_OPTIONS']})
+    urls = ['/parkinglots/', '/parkinglots/?limit=1&fields=parking_id,city',
+            f"/floors/{created['parking_id']}", f"/rows/{created['floor_id']}",
+            f"/slots/{created['row_id']}", f'/users/{user_id}', '/users/999999',
+            '/parkinglots/?limit=0', '/parkinglots/?fields=password']
+
+    async def fetch():
+        try:  # concurrently, on one event loop
+            return await asyncio.gather(*[_asgi_get(asgi_app, url) for url in urls],
+                                        _asgi_get(asgi_app, '/floors/1', method='POST'),
+                                        _asgi_get(asgi_app, '/sessions/'))
+        finally:
+            await asgi_app.engine.dispose()
+
+    *responses, not_allowed, not_found = asyncio.run(fetch())
+    for url, (status, headers, body) in zip(urls, responses):
+        expected = client.get(url)
+        assert (status, body) == (expected.status_code, expected.get_json()), url
+        assert headers.get('x-next-after') == expected.headers.get('X-Next-After'), url
+    assert len(responses[4][2]) == 2  # the booked slot is not listed
+    assert not_allowed[0] == 405 and not_allowed[1]['allow'] == 'GET, HEAD'
+    assert not_found[0] == 404
+
+
+def test_lot_layout_in_constant_queries_with_cached_topology(app, client):
+    from sqlalchemy import event
+
+    parking_id = client.post('/parkinglots/', json=_lot_payload()).get_json()['parking_id']
+    floors = client.post(f'/parkinglots/{parking_id}/import', json={'floors': [
+        {'floor_number': 'G', 'rows': [{'row_number': 'A', 'slots': 3},
+                                       {'row_number': 'B', 'slots': 40}]},
+        {'floor_number': '1', 'rows': [{'row_number': 'A', 'slots': 2}]}]}).get_json()['floors']
+    first_slot = floors[0]['rows'][0]['slot_ids'][0]
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        layout = client.get(f'/parkinglots/{parking_id}/layout').get_json()
+        # lot, floors, rows, slots and the free-slot ids, however big the lot
+        assert len(statements) == 5
+        statements.clear()
+        assert client.get(f'/parkinglots/{parking_id}/layout').get_json() == layout
+        assert len(statements) == 1  # cached tree; only availability is read
+
+        assert client.post('/Park_car/', json={
+            'user_id': 1, 'parking_id': parking_id, 'slot_id': first_slot,
+            'car_number': 'LAYOUT1'}).status_code == 201
+        statements.clear()
+        layout = client.get(f'/parkinglots/{parking_id}/layout').get_json()
+        assert len(statements) == 1  # bookings keep the topology version
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    assert (layout['total_slots'], layout['available_slots']) == (45, 44)
+    assert [f['floor_number'] for f in layout['floors']] == ['G', '1']
+    assert [[r['row_number'] for r in f['rows']] for f in layout['floors']] == [['A', 'B'], ['A']]
+    row_a = layout['floors'][0]['rows'][0]
+    assert row_a['slots'][0] == {'slot_id': first_slot, 'slot_number': 'A1',
+                                 'is_available': False}
+    assert [s['slot_id'] for s in row_a['slots']] == floors[0]['rows'][0]['slot_ids']
+
+    compact = client.get(f'/parkinglots/{parking_id}/layout?format=compact').get_json()
+    assert compact['fields']['slot'] == ['slot_id', 'slot_number', 'is_available']
+    assert compact['floors'][0][:2] == [floors[0]['floor_id'], 'G']
+    compact_slots = [slot for _, _, rows in compact['floors'] for _, _, slots in rows
+                     for slot in slots]
+    assert compact_slots[:2] == [[first_slot, 'A1', 0], [first_slot + 1, 'A2', 1]]
+    assert compact_slots == [[s['slot_id'], s['slot_number'], int(s['is_available'])]
+                             for f in layout['floors'] for r in f['rows'] for s in r['slots']]
+
+    # Adding a slot starts a new topology version.
+    new_slot = client.post('/slots/', json={
+        'parking_id': parking_id, 'row_id': row_a['row_id'], 'slot_number': 'A4'}).get_json()
+    layout = client.get(f'/parkinglots/{parking_id}/layout').get_json()
+    assert layout['floors'][0]['rows'][0]['slots'][-1] == {
+        'slot_id': new_slot['slot_id'], 'slot_number': 'A4', 'is_available': True}
+    assert (layout['total_slots'], layout['available_slots']) == (46, 45)
+
+    # A slot added by another worker: this worker's cached tree does not have
+    # it yet, and the counts stay consistent with the tree.
+    from models import Slot
+    with app.app_context():
+        db.session.add(Slot(parking_id=parking_id, row_id=row_a['row_id'], slot_number='A5',
+                            is_available=True))
+        db.session.commit()
+    layout = client.get(f'/parkinglots/{parking_id}/layout').get_json()
+    assert (layout['total_slots'], layout['available_slots']) == (46, 45)
+
+    assert client.get('/parkinglots/999999/layout').status_code == 404
+    assert client.get(f'/parkinglots/{parking_id}/layout?format=xml').status_code == 400
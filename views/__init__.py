@@ -0,0 +1,15 @@
+"""HTTP views, grouped into blueprints that every app registers."""
+from views.analytics import bp as analytics
+from views.home import bp as home
+from views.lots import bp as lots
+from views.sessions import bp as sessions
+from views.status import bp as status
+from views.topology import bp as topology
+from views.users import bp as users
+
+BLUEPRINTS = (home, lots, topology, sessions, analytics, status, users)
+
+
+def register_blueprints(app):
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from flask import Blueprint, current_app, request
+
+from admission import concurrency_limited
+from analytics import (HOUR, MAX_REPORT_RANGE, floor_hour, occupancy_report,
+                       refresh_hourly_rollup, rollup_watermark)
+from json_provider import jsonify
+from pagination import QueryArgumentError, date_range_args
+
+bp = Blueprint('analytics', __name__)
+
+
+# Hourly occupancy, dwell time and turnover per lot (or floor)
+@bp.route('/analytics/occupancy', methods=['GET'])
+@concurrency_limited
+def occupancy_analytics():
+    if current_app.config['ANALYTICS_REFRESH_ON_READ']:
+        # Bounded, and skipped while another request of this process refreshes.
+        refresh_hourly_rollup(max_hours=current_app.config['ANALYTICS_REFRESH_MAX_HOURS'],
+                              wait=False)
+    start, end = date_range_args()
+    end = floor_hour(end) if end is not None else floor_hour(datetime.utcnow())
+    start = floor_hour(start) if start is not None else end - 24 * HOUR
+    if end <= start or end - start > MAX_REPORT_RANGE:
+        raise QueryArgumentError(
+            f"'from'..'to' must span between 1 hour and {MAX_REPORT_RANGE.days} days")
+    parking_id = request.args.get('parking_id', type=int)
+    by_floor = request.args.get('by') == 'floor'
+    hourly, summary = occupancy_report(start, end, parking_id, by_floor)
+    computed_until = rollup_watermark()
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'computed_until': computed_until.isoformat() if computed_until else None,
+        'summary': summary,
+        'hourly': hourly,
+    })
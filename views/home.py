@@ -0,0 +1,51 @@
+from flask import Blueprint
+
+bp = Blueprint('home', __name__)
+
+
+@bp.route('/')
+def welcome():
+    return """
+<h1>Welcome to Parking System</h1>
+<p>These are the available GET URLs for you to use:</p>
+<ul>
+    <li><a href="/parkinglots/">GET /parkinglots/</a> - List all parking lots</li>
+    <li><a href="/parkinglots/nearby?lat=28.6297&amp;lon=77.2257&amp;radius=2000">GET /parkinglots/nearby?lat=&amp;lon=&amp;radius=&amp;limit=</a> - Parking lots within radius metres, nearest first (optional available=1, vehicle_type=)</li>
+    <li><a href="/parkinglots/1/layout">GET /parkinglots/&lt;parking_id&gt;/layout</a> - Floors, rows and slots of a lot with live availability in one call (?format=compact for nested arrays)</li>
+    <li><a href="/floors/1">GET /floors/&lt;parking_id&gt;</a> - List floors for a specific parking lot (Example for parking_id = 1)</li>
+    <li><a href="/floors/">GET /floors/</a> - Get a list of all floors</li>
+    <li><a href="/rows/1">GET /rows/&lt;floor_id&gt;</a> - List rows in a specific floor (Example for floor_id = 1)</li>
+    <li><a href="/rows/">GET /rows/</a> - Get a list of all rows</li>
+    <li><a href="/slots/1">GET /slots/&lt;row_id&gt;</a> - List available slots in a specific row (Example for row_id = 1)</li>
+    <li><a href="/slots/">GET /slots/</a> - Get a list of all slots</li>
+    <li><a href="/users/">GET /users/</a> - Get a list of all users</li>
+    <li><a href="/users/5">GET /users/&lt;user_id&gt;</a> - Get details of a specific user (Example for user_id = 5)</li>
+    <li><a href="/users/5/sessions/active">GET /users/&lt;user_id&gt;/sessions/active</a> - Open parking sessions of a user</li>
+    <li><a href="/slots/1/session">GET /slots/&lt;slot_id&gt;/session</a> - The open parking session on a slot</li>
+    <li><a href="/sessions/">GET /sessions/</a> - Get a list of open and recent parking sessions (add ?from=&amp;to= dates to include archived history)</li>
+    <li><a href="/analytics/occupancy">GET /analytics/occupancy</a> - Hourly occupancy, average dwell time and turnover per lot (?parking_id=, ?by=floor, ?from=&amp;to=)</li>
+    <li><a href="/availability/">GET /availability/</a> - Live free/total slot counts per lot and floor (supports If-None-Match)</li>
+    <li><a href="/cache/stats">GET /cache/stats</a> - Topology cache hit/miss counters</li>
+    <li><a href="/metrics">GET /metrics</a> - Prometheus metrics (per-endpoint latency, SQL and response size when INSTRUMENTATION is on)</li>
+    <li><a href="/metrics/profiles">GET /metrics/profiles</a> - cProfile output of recent slow requests (when INSTRUMENTATION is on)</li>
+    <li><a href="/sessions/export">GET /sessions/export</a> - Stream all parking sessions, archived ones included, as NDJSON (optional ?from=&amp;to=)</li>
+    <li><a href="/slots/events">GET /slots/events</a> - Server-Sent Events feed of slot availability changes (filter with ?parking_id=, ?floor_id=, ?row_id=)</li>
+    <li><a href="/slots/changes">GET /slots/changes?since=&lt;id&gt;</a> - Long-poll for slot availability changes</li>
+    <li><a href="/slots/export">GET /slots/export</a> - Stream all slots as NDJSON</li>
+</ul>
+<p>The list endpoints accept <code>?limit=&lt;n&gt;&amp;after=&lt;id&gt;</code> for keyset pagination (the next cursor is sent in the <code>X-Next-After</code> header) and <code>?fields=a,b</code> to select columns.</p>
+<p>To interact with POST or PUT endpoints, use <strong>Postman</strong> or <strong>curl</strong>.</p>
+<p>Here are the available POST and PUT endpoints:</p>
+<ul>
+    <li><strong>POST /parkinglots/</strong> - Create a new parking lot</li>
+    <li><strong>POST /parkinglots/&lt;parking_id&gt;/import</strong> - Bulk import floors, rows and slots (nested JSON or CSV)</li>
+    <li><strong>POST /floors/</strong> - Create a new floor in a parking lot</li>
+    <li><strong>POST /rows/</strong> - Create a new row in a floor</li>
+    <li><strong>POST /slots/</strong> - Create a new slot in a row</li>
+    <li><strong>POST /Park_car/</strong> - Book a parking slot</li>
+    <li><strong>POST /Park_car/auto</strong> - Book the first free slot in a parking lot</li>
+    <li><strong>PUT /Remove_car/&lt;session_id&gt;/exit</strong> - Release a booked parking slot</li>
+    <li><strong>PUT /Remove_car/plate/&lt;car_number&gt;/exit</strong> - Release the slot of a car by its number plate</li>
+</ul>
+
+"""
@@ -0,0 +1,191 @@
+from flask import Blueprint, current_app, request
+
+from bulk_import import import_layout, parse_csv_layout, parse_json_layout
+from json_provider import jsonify
+from models import Floor, ParkingLot, Row, Slot, db
+from pagination import MAX_PAGE_SIZE, QueryArgumentError, list_page, page_response
+from response_cache import cached_response
+from routing import read_only
+from services import free_layout_slots, lot_search_payload, services
+
+bp = Blueprint('lots', __name__)
+
+
+def public_max_age():
+    return f"public, max-age={current_app.config['RESPONSE_CACHE_MAX_AGE']}"
+
+
+# List Parking Lots
+@bp.route('/parkinglots/', methods=['GET'])
+@cached_response('lots', public_max_age)
+@read_only
+def list_parking_lots():
+    result, next_after = list_page(
+        ParkingLot, ['parking_id', 'parking_name', 'city', 'available_slots'])
+    return page_response(result, next_after)
+
+
+# Parking lots near a point
+@bp.route('/parkinglots/nearby', methods=['GET'])
+@read_only
+def list_nearby_parking_lots():
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise QueryArgumentError("'lat' and 'lon' must be valid coordinates")
+    radius = request.args.get('radius', 5000, type=float)  # metres
+    limit = request.args.get('limit', 20, type=int)
+    if radius <= 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise QueryArgumentError(f"'radius' must be > 0 and 'limit' between 1 and {MAX_PAGE_SIZE}")
+    only_available = request.args.get('available', '').lower() in ('1', 'true', 'yes')
+    vehicle_type = request.args.get('vehicle_type', '').strip().lower()
+    availability = services().availability
+
+    def free_slots_of(parking_id, payload):
+        live = availability.lot_free(parking_id)
+        return payload['available_slots'] if live is None else live
+
+    def predicate(parking_id, payload):
+        if vehicle_type:
+            types = (payload['vehicle_types'] or '').lower().split(',')
+            if vehicle_type not in (t.strip() for t in types):
+                return False
+        if only_available and not (free_slots_of(parking_id, payload) or 0) > 0:
+            return False
+        return True
+
+    result = []
+    for distance, parking_id, payload in services().lot_locations.nearby(
+            lat, lon, radius, limit, predicate):
+        result.append({
+            'parking_id': parking_id,
+            'parking_name': payload['parking_name'],
+            'city': payload['city'],
+            'distance_m': round(distance, 1),
+            'available_slots': free_slots_of(parking_id, payload)
+        })
+    return jsonify(result)
+
+
+# Compact layouts are nested arrays; these are their columns, per level.
+COMPACT_LAYOUT_FIELDS = {'floor': ['floor_id', 'floor_number', 'rows'],
+                         'row': ['row_id', 'row_number', 'slots'],
+                         'slot': ['slot_id', 'slot_number', 'is_available']}
+
+
+def nested_layout(floors, free):
+    return [{'floor_id': floor_id, 'floor_number': floor_number,
+             'rows': [{'row_id': row_id, 'row_number': row_number,
+                       'slots': [{'slot_id': slot_id, 'slot_number': slot_number,
+                                  'is_available': slot_id in free}
+                                 for slot_id, slot_number in slots]}
+                      for row_id, row_number, slots in rows]}
+            for floor_id, floor_number, rows in floors]
+
+
+def compact_layout(floors, free):
+    return [[floor_id, floor_number,
+             [[row_id, row_number,
+               [[slot_id, slot_number, int(slot_id in free)] for slot_id, slot_number in slots]]
+              for row_id, row_number, slots in rows]]
+            for floor_id, floor_number, rows in floors]
+
+
+# Floors, rows and slots of a Parking Lot in one call
+@bp.route('/parkinglots/<int:parking_id>/layout', methods=['GET'])
+@read_only
+def get_parking_layout(parking_id):
+    layout_format = request.args.get('format', 'nested')
+    if layout_format not in ('nested', 'compact'):
+        raise QueryArgumentError("'format' must be 'nested' or 'compact'")
+    layout = services().lot_layout(parking_id)
+    if layout is None:
+        return jsonify({'message': 'Parking lot not found'}), 404
+    floors = layout['floors']
+    slot_ids = {slot[0] for _, _, rows in floors for _, _, slots in rows for slot in slots}
+    # Slots added since the tree was cached (by another worker) are left out.
+    free = free_layout_slots(parking_id) & slot_ids
+    result = {
+        'parking_id': layout['parking_id'],
+        'parking_name': layout['parking_name'],
+        'total_slots': len(slot_ids),
+        'available_slots': len(free)
+    }
+    if layout_format == 'compact':
+        result['fields'] = COMPACT_LAYOUT_FIELDS
+        result['floors'] = compact_layout(floors, free)
+    else:
+        result['floors'] = nested_layout(floors, free)
+    return jsonify(result), 200
+
+
+# Create Parking Lot
+@bp.route('/parkinglots/', methods=['POST'])
+def create_parking_lot():
+    data = request.get_json()
+    new_lot = ParkingLot(
+        parking_name=data['parking_name'],
+        city=data['city'],
+        parking_location=data['parking_location'],
+        address_1=data['address_1'],
+        address_2=data['address_2'],
+        latitude=data['latitude'],
+        longitude=data['longitude'],
+        physical_appearance=data['physical_appearance'],
+        parking_ownership=data['parking_ownership'],
+        parking_surface=data['parking_surface'],
+        has_cctv=data['has_cctv'],
+        has_boom_barrier=data['has_boom_barrier'],
+        ticket_generated=data['ticket_generated'],
+        entry_exit_gates=data['entry_exit_gates'],
+        weekly_off=data['weekly_off'],
+        parking_timing=data['parking_timing'],
+        vehicle_types=data['vehicle_types'],
+        car_capacity=data['car_capacity'],
+        two_wheeler_capacity=data['two_wheeler_capacity'],
+        parking_type=data['parking_type'],
+        payment_modes=data['payment_modes'],
+        car_parking_charge=data['car_parking_charge'],
+        two_wheeler_parking_charge=data['two_wheeler_parking_charge'],
+        allows_prepaid_passes=data['allows_prepaid_passes'],
+        provides_valet_services=data['provides_valet_services'],
+        notes=data['notes'],
+        total_slots=data['total_slots'],
+        available_slots=data['available_slots']
+    )
+    db.session.add(new_lot)
+    db.session.commit()
+    services().response_cache.invalidate('lots')
+    services().lot_locations.upsert(new_lot.parking_id, new_lot.latitude, new_lot.longitude,
+                                    lot_search_payload(new_lot))
+    return jsonify({'message': 'Parking lot created successfully', 'parking_id': new_lot.parking_id}), 201
+
+
+# Bulk import a lot layout (floors, rows and slots) in one transaction
+@bp.route('/parkinglots/<int:parking_id>/import', methods=['POST'])
+def import_parking_layout(parking_id):
+    if ParkingLot.query.get(parking_id) is None:
+        return jsonify({'message': 'Parking lot not found'}), 404
+    if request.mimetype == 'text/csv':
+        layout = parse_csv_layout(request.get_data(as_text=True))
+    else:
+        layout = parse_json_layout(request.get_json(silent=True))
+    try:
+        floors = import_layout(db.session, Floor, Row, Slot, parking_id, layout)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    state = services()
+    for floor in floors:
+        slot_count = sum(len(row['slot_ids']) for row in floor['rows'])
+        state.availability.slot_added(parking_id, floor['floor_id'], count=slot_count)
+        for row in floor['rows']:
+            for slot_id in row['slot_ids']:
+                state.free_slots.add(parking_id, slot_id)
+        state.invalidate_topology(floor_id=floor['floor_id'])
+    state.invalidate_topology(parking_id=parking_id)
+    state.topology_changed(parking_id)
+    return jsonify({'message': 'Layout imported successfully', 'parking_id': parking_id,
+                    'floors': floors}), 201
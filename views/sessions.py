@@ -0,0 +1,136 @@
+from flask import Blueprint, request
+
+from admission import concurrency_limited, rate_limited
+from archive import sessions_tiers
+from export import ndjson_tiered_export, wants_ndjson
+from formatting import http_date, row_serializer
+from json_provider import jsonify
+from models import ParkingSession
+from pagination import date_range_args, list_page, list_tiered_page, page_response
+from routing import read_only
+from services import services
+
+bp = Blueprint('sessions', __name__)
+
+SESSION_FIELDS = ['session_id', 'user_id', 'parking_id', 'slot_id', 'car_number',
+                  'entry_time', 'exit_time']
+SESSION_FORMATTERS = {'entry_time': http_date, 'exit_time': http_date}
+
+
+def entered_between(start, end):
+    """Per-table filters for sessions that entered in [start, end)."""
+    def criteria(model):
+        criteria = []
+        if start is not None:
+            criteria.append(model.entry_time >= start)
+        if end is not None:
+            criteria.append(model.entry_time < end)
+        return criteria
+    return criteria
+
+
+def sessions_ndjson():
+    # Every session, archived ones included, unless narrowed with from/to.
+    start, end = date_range_args()
+    return ndjson_tiered_export(sessions_tiers(start), SESSION_FIELDS,
+                                entered_between(start, end), SESSION_FORMATTERS)
+
+
+#All sessions details 
+@bp.route('/sessions/', methods=['GET'])
+@concurrency_limited
+@read_only
+def get_all_sessions():
+    if wants_ndjson():
+        return sessions_ndjson()
+    start, end = date_range_args()
+    if start is None and end is None:
+        # Open and recent sessions only; older history needs a date range.
+        session_list, next_after = list_page(
+            ParkingSession, SESSION_FIELDS, formatters=SESSION_FORMATTERS)
+        return page_response({'sessions': session_list}, next_after)
+
+    session_list, next_after = list_tiered_page(
+        sessions_tiers(start), SESSION_FIELDS, entered_between(start, end),
+        formatters=SESSION_FORMATTERS)
+    return page_response({'sessions': session_list}, next_after)
+
+
+# Export all sessions as NDJSON (used by the nightly billing reconciliation)
+@bp.route('/sessions/export', methods=['GET'])
+@concurrency_limited
+@read_only
+def export_sessions():
+    return sessions_ndjson()
+
+
+# Book a Parking Slot
+@bp.route('/Park_car/', methods=['POST'])
+@rate_limited('park')
+def book_parking_slot():
+    data = request.get_json()
+    session = services().park_car(data['slot_id'], data['user_id'], data['parking_id'],
+                                  data['car_number'])
+    if session:
+        return jsonify({'message': 'Parking slot booked successfully', 'session_id': session.session_id}), 201
+    else:
+        return jsonify({'message': 'Slot is unavailable'}), 400
+
+
+# Book the first free slot in a parking lot
+@bp.route('/Park_car/auto', methods=['POST'])
+@rate_limited('park')
+def book_any_parking_slot():
+    data = request.get_json()
+    session = services().park_car_anywhere(data['parking_id'], data['user_id'], data['car_number'])
+    if session:
+        return jsonify({'message': 'Parking slot booked successfully', 'session_id': session.session_id,
+                        'slot_id': session.slot_id}), 201
+    else:
+        return jsonify({'message': 'No free slot in this parking lot'}), 400
+
+
+# Release a Parking Slot
+@bp.route('/Remove_car/<int:session_id>/exit', methods=['PUT'])
+def release_parking_slot(session_id):
+    if services().exit_car(session_id):
+        return jsonify({'message': 'Parking slot released successfully'}), 200
+    else:
+        return jsonify({'message': 'Session not found'}), 404
+
+
+# Release the Parking Slot of a car by its number plate (exit gates)
+@bp.route('/Remove_car/plate/<car_number>/exit', methods=['PUT'])
+def release_parking_slot_by_plate(car_number):
+    session_id = services().exit_car_by_plate(car_number)
+    if session_id:
+        return jsonify({'message': 'Parking slot released successfully', 'session_id': session_id}), 200
+    else:
+        return jsonify({'message': 'No open session for this car'}), 404
+
+
+# Active sessions are read from the primary: a car that has just entered
+# must show up. Both lookups use the partial open-session indexes.
+def active_sessions(*criteria):
+    rows = ParkingSession.query \
+        .with_entities(*[getattr(ParkingSession, f) for f in SESSION_FIELDS]) \
+        .filter(ParkingSession.exit_time.is_(None), *criteria) \
+        .order_by(ParkingSession.session_id).all()
+    serialize = row_serializer(SESSION_FIELDS, SESSION_FORMATTERS)
+    return [serialize(row) for row in rows]
+
+
+# Open sessions of a User
+@bp.route('/users/<int:user_id>/sessions/active', methods=['GET'])
+def list_active_user_sessions(user_id):
+    return jsonify({'sessions': active_sessions(ParkingSession.user_id == user_id)}), 200
+
+
+# Open session on a Slot
+@bp.route('/slots/<int:slot_id>/session', methods=['GET'])
+def get_active_slot_session(slot_id):
+    sessions = active_sessions(ParkingSession.slot_id == slot_id)
+    if sessions:
+        return jsonify(sessions[-1]), 200
+    else:
+        return jsonify({'message': 'No open session on this slot'}), 404
@@ -0,0 +1,36 @@
+from flask import Blueprint, Response, current_app, request
+
+from json_provider import jsonify
+from services import services
+
+bp = Blueprint('status', __name__)
+
+
+# Live availability snapshot for every lot and floor
+@bp.route('/availability/', methods=['GET'])
+def availability_snapshot():
+    etag, body = services().availability.snapshot()
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+# Topology cache counters
+@bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(services().topology_cache.stats()), 200
+
+
+# Prometheus metrics
+@bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return services().metrics.response()
+
+
+@bp.route('/metrics/profiles', methods=['GET'])
+def slow_request_profiles():
+    slow_profiles = services().slow_profiles
+    if slow_profiles is None:
+        return jsonify({'message': 'Instrumentation is disabled'}), 404
+    return Response(slow_profiles.render(), content_type='text/plain; charset=utf-8')
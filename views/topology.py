@@ -0,0 +1,221 @@
+from flask import Blueprint, Response, current_app, request
+
+from admission import concurrency_limited
+from export import ndjson_export, wants_ndjson
+from formatting import row_serializer
+from json_provider import jsonify
+from models import Floor, Row, Slot, db
+from pagination import list_page, page_response
+from routing import read_only
+from services import services, slot_location
+
+bp = Blueprint('topology', __name__)
+
+SLOT_FIELDS = ['slot_id', 'slot_number', 'row_id', 'is_available']
+
+
+#ALL FLOORS
+@bp.route('/floors/', methods=['GET'])
+@read_only
+def list_all_floors():
+    result, next_after = list_page(
+        Floor, ['floor_id', 'floor_number', 'total_slots', 'available_slots',
+                'parking_id'])  # Include parking_id for context
+    return page_response(result, next_after)
+
+
+# List Floors of a Parking Lot
+@bp.route('/floors/<int:parking_id>', methods=['GET'])
+@read_only
+def list_floors(parking_id):
+    def load():
+        floors = Floor.query.filter_by(parking_id=parking_id).all()
+        result = []
+        for floor in floors:
+            result.append({
+                'floor_id': floor.floor_id,
+                'floor_number': floor.floor_number,
+                'total_slots': floor.total_slots,
+                'available_slots': floor.available_slots
+            })
+        return result
+    return jsonify(services().topology_cache.get_or_load(f'floors:{parking_id}', load))
+
+
+# Create Floor
+@bp.route('/floors/', methods=['POST'])
+def create_floor():
+    data = request.get_json()
+    new_floor = Floor(
+        parking_id=data['parking_id'],
+        floor_number=data['floor_number'],
+        total_slots=data['total_slots'],
+        available_slots=data['available_slots']
+    )
+    db.session.add(new_floor)
+    db.session.commit()
+    services().invalidate_topology(parking_id=new_floor.parking_id)
+    services().topology_changed(new_floor.parking_id)
+    return jsonify({'message': 'Floor created successfully', 'floor_id': new_floor.floor_id}), 201
+
+
+#AllRows
+@bp.route('/rows/', methods=['GET'])
+@read_only
+def list_all_rows():
+    if not request.args:
+        # Only the plain, unpaginated listing is cached.
+        return jsonify(services().topology_cache.get_or_load(
+            'rows:all', lambda: list_page(Row, ['row_id', 'row_number', 'floor_id'])[0])), 200
+    result, next_after = list_page(Row, ['row_id', 'row_number', 'floor_id'])
+    return page_response(result, next_after)
+
+
+# List Rows in a Floor
+@bp.route('/rows/<int:floor_id>', methods=['GET'])
+@read_only
+def list_rows(floor_id):
+    def load():
+        rows = Row.query.filter_by(floor_id=floor_id).all()
+        result = []
+        for row in rows:
+            result.append({
+                'row_id': row.row_id,
+                'row_number': row.row_number
+            })
+        return result
+    return jsonify(services().topology_cache.get_or_load(f'rows:{floor_id}', load))
+
+
+# Create Row
+@bp.route('/rows/', methods=['POST'])
+def create_row():
+    data = request.get_json()
+    new_row = Row(
+        parking_id=data['parking_id'],
+        floor_id=data['floor_id'],
+        row_number=data['row_number']
+    )
+    db.session.add(new_row)
+    db.session.commit()
+    services().invalidate_topology(floor_id=new_row.floor_id)
+    services().topology_changed(new_row.parking_id)
+    return jsonify({'message': 'Row created successfully', 'row_id': new_row.row_id}), 201
+
+
+#All slots
+@bp.route('/slots/', methods=['GET'])
+@read_only
+def list_all_slots():
+    if wants_ndjson():
+        return ndjson_export(Slot, SLOT_FIELDS)
+    result, next_after = list_page(Slot, SLOT_FIELDS)
+    return page_response(result, next_after)
+
+
+def slot_event_filter():
+    criteria = {}
+    for name in ('parking_id', 'floor_id', 'row_id'):
+        value = request.args.get(name, type=int)
+        if value is not None:
+            criteria[name] = value
+    return lambda event: all(event[k] == v for k, v in criteria.items())
+
+
+# Push feed of slot availability changes (Server-Sent Events)
+@bp.route('/slots/events', methods=['GET'])
+def stream_slot_events():
+    slot_events = services().slot_events
+    matches = slot_event_filter()
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('since', slot_events.last_id, type=int)
+    heartbeat = current_app.config['SLOT_EVENTS_HEARTBEAT']
+
+    def stream(last_id):
+        yield 'retry: 3000\n\n'
+        while True:
+            events, reset = slot_events.wait(last_id, heartbeat)
+            if reset:
+                yield 'event: reset\ndata: {}\n\n'
+            elif not events:
+                yield ': keep-alive\n\n'
+            for event_id, event, data in events:
+                if matches(event):
+                    yield f'id: {event_id}\nevent: slot\ndata: {data}\n\n'
+            if events:
+                last_id = events[-1][0]
+            elif reset:  # our id is from another feed; follow this one from now on
+                last_id = slot_events.last_id
+
+    slot_events.subscribe()  # the stream holds this thread until the client leaves
+    response = Response(stream(last_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(slot_events.unsubscribe)
+    return response
+
+
+# Long-poll variant of the slot change feed
+@bp.route('/slots/changes', methods=['GET'])
+def poll_slot_changes():
+    slot_events = services().slot_events
+    matches = slot_event_filter()
+    since = request.args.get('since', type=int)
+    if since is None:
+        events, reset = [], False
+    else:
+        timeout = min(request.args.get('timeout', 25, type=float), 60)
+        slot_events.subscribe()
+        try:
+            events, reset = slot_events.wait(since, timeout)
+        finally:
+            slot_events.unsubscribe()
+    if events:
+        last_id = events[-1][0]
+    elif since is None or reset:
+        last_id = slot_events.last_id
+    else:
+        last_id = since
+    # Payloads were encoded once at publish time; splice them in as-is.
+    body = '{"last_id":%d,"reset":%s,"events":[%s]}' % (
+        last_id, 'true' if reset else 'false',
+        ','.join(data for _, event, data in events if matches(event)))
+    return current_app.response_class(body, mimetype='application/json')
+
+
+# Export all slots as NDJSON
+@bp.route('/slots/export', methods=['GET'])
+@concurrency_limited
+@read_only
+def export_slots():
+    return ndjson_export(Slot, SLOT_FIELDS)
+
+
+# List Available Slots in a Row
+@bp.route('/slots/<int:row_id>', methods=['GET'])
+@read_only
+def list_slots(row_id):
+    slots = Slot.query.with_entities(Slot.slot_id, Slot.slot_number) \
+        .filter(Slot.row_id == row_id, Slot.is_available == db.true()).all()
+    serialize = row_serializer(['slot_id', 'slot_number'])
+    return jsonify([serialize(slot) for slot in slots])
+
+
+# Create Slot
+@bp.route('/slots/', methods=['POST'])
+def create_slot():
+    data = request.get_json()
+    new_slot = Slot(
+        parking_id=data['parking_id'],
+        row_id=data['row_id'],
+        slot_number=data['slot_number']
+    )
+    db.session.add(new_slot)
+    db.session.commit()
+    state = services()
+    state.free_slots.add(new_slot.parking_id, new_slot.slot_id)
+    location = slot_location(new_slot.slot_id)
+    state.availability.slot_added(location.parking_id, location.floor_id)
+    state.invalidate_topology(parking_id=new_slot.parking_id)
+    state.topology_changed(new_slot.parking_id)
+    return jsonify({'message': 'Slot created successfully', 'slot_id': new_slot.slot_id}), 201
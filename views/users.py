@@ -0,0 +1,76 @@
+from flask import Blueprint, request
+
+from admission import rate_limited
+from formatting import http_date
+from json_provider import jsonify
+from models import User, db
+from pagination import list_page, page_response
+from response_cache import cached_response
+from routing import read_only
+from services import services
+
+bp = Blueprint('users', __name__)
+
+
+# User Registration
+@bp.route('/users/register', methods=['POST'])
+def register_user():
+    data = request.get_json()
+    new_user = User(
+        username=data['username'],
+        password=services().password_hasher.hash(data['password']),
+        email=data['email'],
+        phone=data['phone']
+    )
+    db.session.add(new_user)
+    db.session.commit()
+    services().response_cache.invalidate(f'user:{new_user.user_id}')
+    return jsonify({'message': 'User registered successfully', 'user_id': new_user.user_id}), 201
+
+
+# User Login
+@bp.route('/users/login', methods=['POST'])
+@rate_limited('login')
+def login_user():
+    data = request.get_json()
+    password_hasher = services().password_hasher
+    user = User.query.filter_by(email=data['email']).first()
+    ok, needs_rehash = password_hasher.verify(data['password'], user.password) if user else (False, False)
+    if ok:
+        if needs_rehash:
+            # Legacy plaintext or outdated cost: upgrade transparently.
+            user.password = password_hasher.hash(data['password'])
+            db.session.commit()
+        return jsonify({'message': 'Login successful', 'user_id': user.user_id}), 200
+    else:
+        return jsonify({'message': 'Invalid credentials'}), 400
+
+
+#GET particular USER details relace user_id on your choice 
+@bp.route('/users/<int:user_id>', methods=['GET'])
+@cached_response(lambda user_id: f'user:{user_id}', 'private, no-cache')
+@read_only
+def get_user(user_id):
+    user = User.query.get(user_id)
+    if user:
+        user_data = {
+        'user_id': user.user_id,
+        'username': user.username,
+        'email': user.email,
+        'phone': user.phone,
+        'created_at': http_date(user.created_at)
+        }
+        return jsonify(user_data), 200
+    else:
+        return jsonify({'message': 'User not found'}), 404
+
+
+# Get all User Details
+@bp.route('/users/', methods=['GET'])
+@read_only
+def get_all_users():
+    user_list, next_after = list_page(
+        User, ['user_id', 'username', 'email', 'phone', 'created_at'],
+        formatters={'created_at': http_date},  # Formatting the created_at field
+        exclude=['password'])
+    return page_response({'users': user_list}, next_after)